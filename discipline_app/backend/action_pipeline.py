@@ -0,0 +1,134 @@
+"""
+Action pipeline for the desktop monitor.
+
+After a detection the monitor loop used to play the warning, then open
+a SQLite connection and log it, all inline, so nothing else was noticed
+until both were done. Now the loop submit()s the detection and moves on.
+Each stage (playback, local logging, cloud sync) has its own bounded
+queue and worker thread, so a slow stage never holds up detection or
+the other stages:
+
+    pipeline = ActionPipeline([
+        Stage("playback", play),
+        Stage("log", write_rows, max_batch=100),
+    ])
+    pipeline.start()
+    pipeline.submit(detection)
+
+A stage handler gets a list of items: up to `max_batch` that were
+waiting when the worker picked them up (1 by default), so a stage like
+logging can write a burst in one transaction. When a stage's queue is
+full the item is dropped for that stage and counted, submit() never
+blocks.
+"""
+
+import os
+import queue
+import threading
+import time
+
+ACTION_QUEUE_SIZE = int(os.environ.get("ACTION_QUEUE_SIZE", 1000))
+
+
+class Stage:
+    def __init__(self, name, handler, max_batch=1, queue_size=ACTION_QUEUE_SIZE):
+        self.name = name
+        self.handler = handler          # handler(items), raises on failure
+        self.max_batch = max_batch
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            start = time.perf_counter()
+            try:
+                self.handler(batch)
+                self.processed += len(batch)
+            except Exception as e:
+                print(f"❌ {self.name} stage failed: {e}")
+                self.failed += len(batch)
+            finally:
+                self.busy_seconds += time.perf_counter() - start
+                for _ in range(len(batch) + stop):
+                    self.queue.task_done()
+            if stop:
+                return
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+class ActionPipeline:
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.submitted = 0
+
+    def start(self):
+        for stage in self.stages:
+            if stage.thread is None:
+                stage.thread = threading.Thread(target=stage.run, name=f"action-{stage.name}",
+                                                daemon=True)
+                stage.thread.start()
+        return self
+
+    def submit(self, item):
+        """Hand `item` to every stage. Never blocks."""
+        self.submitted += 1
+        for stage in self.stages:
+            try:
+                stage.queue.put_nowait(item)
+            except queue.Full:
+                stage.dropped += 1
+                print(f"⚠️  {stage.name} queue full, dropped an action")
+
+    def join(self, timeout=None):
+        """Wait until every stage has drained its queue (tests, shutdown)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(stage.queue.unfinished_tasks for stage in self.stages):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout=5.0):
+        self.join(timeout)
+        for stage in self.stages:
+            if stage.thread is not None:
+                stage.queue.put(None)
+        for stage in self.stages:
+            if stage.thread is not None:
+                stage.thread.join(timeout=1)
+                stage.thread = None
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "stages": {stage.name: stage.stats() for stage in self.stages},
+        }
@@ -12,19 +12,19 @@ FEATURES:
 """
 
 import time
-import sqlite3
+import uuid
 from datetime import datetime
-import psutil
-import win32gui
-import win32process
 from urllib.parse import urlparse
 import tts
-import pygame
+from action_pipeline import ActionPipeline, Stage
+from sound_bank import SoundBank
+import database
+from sync_agent import BlockSyncAgent
+from audio_service import audio_service, WARNING
+from url_classifier import default_classifier
+from window_monitor import foreground_window, make_monitor
 import os
 
-# Initialize pygame for custom audio
-pygame.mixer.init()
-
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -39,6 +39,9 @@ CUSTOM_AUDIO_FILES = {
     'gaming': 'gaming_warning.mp3',
 }
 
+# Decoded once and kept in memory, reloaded when a file is swapped
+custom_sounds = SoundBank(CUSTOM_AUDIO_DIR, CUSTOM_AUDIO_FILES.values())
+
 # Set to True to use custom MP3, False to use AI voice
 USE_CUSTOM_AUDIO = {
     'porn': True,        # Will play custom_audio/porn_warning.mp3
@@ -47,21 +50,8 @@ USE_CUSTOM_AUDIO = {
     'gaming': False,     # Will use AI voice
 }
 
-# Blocked URL patterns
-PORN_PATTERNS = [
-    'pornhub', 'xvideos', 'xnxx', 'redtube', 'youporn',
-    'xhamster', 'tube8', 'spankwire', 'keezmovies',
-    'porn', 'xxx', 'sex', 'adult', 'nsfw',
-    'onlyfans', 'chaturbate', 'stripchat', 'cam4',
-    'livejasmin', 'bongacams', 'myfreecams'
-]
-
-GAMBLING_PATTERNS = [
-    'casino', 'poker', 'betting', 'bet365', 'pokerstars',
-    'gamble', 'slots', 'blackjack', 'roulette',
-    'sportbet', 'bwin', '888casino', 'draftkings',
-    'fanduel', 'bovada', 'stake.com'
-]
+# Blocked URL patterns live in url_classifier.py (shared with backend_api)
+classifier = default_classifier()
 
 # AI voice warning messages (used when custom audio is disabled)
 AI_WARNINGS = {
@@ -84,6 +74,12 @@ WARNING_COOLDOWN = 30
 MONITOR_PORN = True        # Set to True to monitor porn sites
 MONITOR_GAMBLING = True    # Set to True to monitor gambling
 
+# Cloud API that gets a copy of every block (empty = local only),
+# synced in the background by sync_agent.py
+CLOUD_API_URL = os.environ.get("CLOUD_API_URL", "").rstrip("/")
+MONITOR_USER_ID = os.environ.get("MONITOR_USER_ID", "default")
+sync_agent = None
+
 # Use custom MP3 or AI voice
 use_custom_audio = {
     'porn': True,          # True = use MP3, False = use AI voice
@@ -95,30 +91,17 @@ use_custom_audio = {
 # ============================================================================
 
 def play_custom_audio(audio_file):
-    """Play a custom MP3 file"""
-    try:
-        file_path = os.path.join(CUSTOM_AUDIO_DIR, audio_file)
-        
-        if not os.path.exists(file_path):
-            print(f"⚠️  Custom audio not found: {file_path}")
-            print(f"   Create folder: {CUSTOM_AUDIO_DIR}/")
-            print(f"   Add file: {audio_file}")
-            return False
-        
-        print(f"🔊 Playing custom audio: {audio_file}")
-        pygame.mixer.music.load(file_path)
-        pygame.mixer.music.play()
-        
-        # Wait for audio to finish
-        while pygame.mixer.music.get_busy():
-            time.sleep(0.1)
-        
-        print(f"✅ Custom audio finished")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error playing custom audio: {e}")
-        return False
+    """Queue a preloaded custom MP3 ahead of any reminder (see audio_service.py)"""
+    sound = custom_sounds.get(audio_file)
+
+    if sound is None:
+        print(f"⚠️  Custom audio not found or unreadable: {os.path.join(CUSTOM_AUDIO_DIR, audio_file)}")
+        print(f"   Create folder: {CUSTOM_AUDIO_DIR}/")
+        print(f"   Add file: {audio_file}")
+        return None
+
+    print(f"🔊 Playing custom audio: {audio_file}")
+    return audio_service.play(sound, WARNING, label=audio_file)
 
 def play_warning(category, personality='strict'):
     """Play warning - either custom MP3 or AI voice"""
@@ -130,93 +113,50 @@ def play_warning(category, personality='strict'):
         # Try to play custom audio
         audio_file = CUSTOM_AUDIO_FILES.get(category)
         if audio_file:
-            success = play_custom_audio(audio_file)
-            if success:
+            played = play_custom_audio(audio_file)
+            if played is not None:
+                # A file that exists but won't decode still gets the AI voice
+                played.add_done_callback(
+                    lambda f: f.result() or play_ai_warning(category, personality, fallback=True)
+                )
                 return
-            else:
-                print(f"⚠️  Falling back to AI voice")
+            print(f"⚠️  Falling back to AI voice")
     
     # Use AI voice (either by choice or as fallback)
+    play_ai_warning(category, personality)
+
+
+def play_ai_warning(category, personality='strict', fallback=False):
+    if fallback:
+        print(f"⚠️  Custom audio failed, falling back to AI voice")
     warnings = AI_WARNINGS.get(category, ["Stop! Close this now!"])
     message = warnings[0]  # Use first warning (can randomize later)
     
     print(f"🔊 Playing AI voice warning")
-    tts.speak_background(message, personality)
+    tts.speak_background(message, personality, priority=WARNING)
 
 # ============================================================================
 # DATABASE
 # ============================================================================
 
 def init_addiction_db():
-    """Initialize database tables"""
-    conn = sqlite3.connect('discipline.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS block_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT NOT NULL,
-            url TEXT,
-            title TEXT,
-            timestamp TEXT NOT NULL,
-            audio_type TEXT
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS block_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            category TEXT NOT NULL,
-            blocks_count INTEGER DEFAULT 0,
-            UNIQUE(date, category)
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+    """Initialize database tables (same schema as the API, see migrations.py)"""
+    database.init_db()
 
 def log_block_attempt(category, url, title, audio_type):
     """Log blocked attempt to database"""
     try:
-        conn = sqlite3.connect('discipline.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO block_logs (category, url, title, timestamp, audio_type)
-            VALUES (?, ?, ?, ?, ?)
-        """, (category, url, title, datetime.now().isoformat(), audio_type))
-        
-        # Update daily stats
-        today = datetime.now().strftime('%Y-%m-%d')
-        cursor.execute("""
-            INSERT INTO block_stats (date, category, blocks_count)
-            VALUES (?, ?, 1)
-            ON CONFLICT(date, category)
-            DO UPDATE SET blocks_count = blocks_count + 1
-        """, (today, category))
-        
-        conn.commit()
-        conn.close()
+        log_block_attempts([block_detection(category, url, title, audio_type)])
     except Exception as e:
         print(f"Error logging: {e}")
 
+def log_block_attempts(detections):
+    """Log a batch of detections (and the daily/weekly/monthly counts) in one transaction"""
+    return database.log_blocks(detections, MONITOR_USER_ID)
+
 def get_block_stats(days=7):
     """Get blocking statistics for last N days"""
-    conn = sqlite3.connect('discipline.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT date, category, blocks_count
-        FROM block_stats
-        WHERE date >= date('now', '-' || ? || ' days')
-        ORDER BY date DESC
-    """, (days,))
-    
-    results = cursor.fetchall()
-    conn.close()
-    
-    return results
+    return database.get_block_stats_rows(days, MONITOR_USER_ID)
 
 # ============================================================================
 # BROWSER MONITORING
@@ -224,24 +164,7 @@ def get_block_stats(days=7):
 
 def get_active_window_info():
     """Get info about currently active window"""
-    try:
-        hwnd = win32gui.GetForegroundWindow()
-        title = win32gui.GetWindowText(hwnd)
-        _, pid = win32process.GetWindowThreadProcessId(hwnd)
-        
-        try:
-            process = psutil.Process(pid)
-            process_name = process.name().lower()
-        except:
-            process_name = ""
-        
-        return {
-            'title': title,
-            'process': process_name,
-            'pid': pid
-        }
-    except:
-        return None
+    return foreground_window()
 
 def is_browser(process_name):
     """Check if process is a browser"""
@@ -250,97 +173,128 @@ def is_browser(process_name):
 
 def check_url_category(text):
     """Check if URL/title contains blocked patterns"""
-    if not text:
-        return None
-    
-    text_lower = text.lower()
-    
-    # Check porn patterns
-    if MONITOR_PORN:
-        for pattern in PORN_PATTERNS:
-            if pattern in text_lower:
-                return 'porn'
-    
-    # Check gambling patterns
-    if MONITOR_GAMBLING:
-        for pattern in GAMBLING_PATTERNS:
-            if pattern in text_lower:
-                return 'gambling'
-    
-    return None
+    monitored = [category for category, enabled in
+                 (('porn', MONITOR_PORN), ('gambling', MONITOR_GAMBLING)) if enabled]
+    return classifier.first(text, monitored)
+
+# ============================================================================
+# ACTIONS (playback, logging and cloud sync run off the monitor loop)
+# ============================================================================
+
+def block_detection(category, url, title, audio_type):
+    return {
+        'category': category,
+        'url': url,
+        'title': title,
+        'audio_type': audio_type,
+        'timestamp': datetime.now().isoformat(),
+        'event_id': uuid.uuid4().hex,
+    }
+
+def play_detections(detections):
+    for detection in detections:
+        play_warning(detection['category'])
+
+def log_and_sync(detections):
+    log_block_attempts(detections)
+    if sync_agent:
+        sync_agent.nudge()
+
+def make_action_pipeline():
+    return ActionPipeline([
+        Stage('playback', play_detections),
+        Stage('log', log_and_sync, max_batch=100),
+    ])
 
 # ============================================================================
 # MAIN MONITORING LOOP
 # ============================================================================
 
-def addiction_monitor_loop():
-    """Main monitoring loop - runs forever"""
+def handle_window(window_info, last_warning_time, actions):
+    """Hand a blocked page in the foreground window to the action pipeline"""
+    # Only monitor browsers
+    if not is_browser(window_info['process']):
+        return
+    
+    # Check if URL contains harmful patterns
+    category = check_url_category(window_info['title'])
+    if not category:
+        return
+    
+    # Check cooldown
+    now = time.time()
+    last_time = last_warning_time.get(category, 0)
+    if now - last_time <= WARNING_COOLDOWN:
+        return
+    
+    print(f"\n{'='*60}")
+    print(f"⚠️  BLOCKED: {category.upper()}")
+    print(f"Title: {window_info['title'][:80]}")
+    print(f"{'='*60}")
+    
+    # Determine audio type
+    audio_type = 'custom_mp3' if USE_CUSTOM_AUDIO.get(category) else 'ai_voice'
+    
+    # Play the warning, log it (and sync it) in the background
+    actions.submit(block_detection(
+        category,
+        window_info['title'],
+        window_info['title'],
+        audio_type
+    ))
+    
+    # Update cooldown
+    last_warning_time[category] = now
+    
+    print(f"✅ Warning queued ({audio_type})")
+    print(f"Next warning in {WARNING_COOLDOWN}s")
+    print("="*60 + "\n")
+
+def addiction_monitor_loop(monitor=None):
+    """Main monitoring loop - runs until the window monitor stops"""
+    # The current window is re-checked a few times per cooldown while it
+    # doesn't change, so staying on a blocked page still repeats the warning
+    monitor = monitor or make_monitor(heartbeat=WARNING_COOLDOWN / 3)
     
     print("\n" + "="*60)
     print("🛡️  ADDICTION MONITOR STARTED")
     print("="*60)
     print(f"Monitoring: {', '.join([k for k,v in {'Porn': MONITOR_PORN, 'Gambling': MONITOR_GAMBLING}.items() if v])}")
+    print(f"Window events: {monitor.name}")
     print(f"Custom audio folder: {CUSTOM_AUDIO_DIR}/")
     print(f"Cooldown: {WARNING_COOLDOWN} seconds")
+    print(f"Cloud sync: {CLOUD_API_URL or 'off'}")
     print("="*60 + "\n")
     
+    global sync_agent
+    if CLOUD_API_URL and sync_agent is None:
+        sync_agent = BlockSyncAgent(CLOUD_API_URL, MONITOR_USER_ID).start()
+    
     last_warning_time = {}
+    actions = make_action_pipeline().start()
     
-    while True:
-        try:
-            # Get active window
-            window_info = get_active_window_info()
-            
-            if not window_info:
-                time.sleep(2)
-                continue
-            
-            # Only monitor browsers
-            if not is_browser(window_info['process']):
-                time.sleep(2)
-                continue
-            
-            # Check if URL contains harmful patterns
-            category = check_url_category(window_info['title'])
-            
-            if category:
-                # Check cooldown
-                now = time.time()
-                last_time = last_warning_time.get(category, 0)
-                
-                if now - last_time > WARNING_COOLDOWN:
-                    print(f"\n{'='*60}")
-                    print(f"⚠️  BLOCKED: {category.upper()}")
-                    print(f"Title: {window_info['title'][:80]}")
-                    print(f"{'='*60}")
-                    
-                    # Determine audio type
-                    audio_type = 'custom_mp3' if USE_CUSTOM_AUDIO.get(category) else 'ai_voice'
-                    
-                    # Play warning
-                    play_warning(category)
-                    
-                    # Log it
-                    log_block_attempt(
-                        category,
-                        window_info['title'],
-                        window_info['title'],
-                        audio_type
-                    )
-                    
-                    # Update cooldown
-                    last_warning_time[category] = now
-                    
-                    print(f"✅ Warning played ({audio_type})")
-                    print(f"Next warning in {WARNING_COOLDOWN}s")
-                    print("="*60 + "\n")
-            
-            # Check every 2 seconds
-            time.sleep(2)
-            
-        except Exception as e:
-            print(f"Monitor error: {e}")
-            time.sleep(5)
+    # Decode the custom MP3s now, not when the first warning fires
+    audio_service.start()
+    custom_sounds.load_all()
+    custom_sounds.start_watching()
+    
+    # Called on every foreground/title change (and a heartbeat every
+    # WARNING_COOLDOWN seconds), see window_monitor.py
+    try:
+        monitor.run(lambda window_info: handle_window(window_info, last_warning_time, actions))
+    finally:
+        custom_sounds.stop()
+        actions.stop()
+        if sync_agent:
+            # One last round for what was logged since the previous one;
+            # whatever is left goes out on the next start
+            sync_agent.stop()
+            try:
+                sync_agent.sync_once()
+            except Exception as e:
+                print(f"⚠️  Final block log sync failed ({e})")
+            sync_agent = None
+    return monitor
 
 # ============================================================================
 # UTILITY FUNCTIONS
@@ -0,0 +1,375 @@
+"""
+Async twin of database.py for the FastAPI handlers.
+
+- PostgreSQL -> asyncpg pool (when DATABASE_URL is set)
+- SQLite     -> a few aiosqlite connections (WAL) handed out round-robin
+                through a queue
+
+The SQL, row mapping and parameter building are imported from
+database.py so both layers always agree on the schema. Scripts and
+background threads (scheduler, create_routine_now.py, ...) keep using
+the sync functions in database.py.
+
+Call open_pool() on startup and close_pool() on shutdown.
+"""
+
+import asyncio
+import os
+import re
+from contextlib import asynccontextmanager
+
+from database import (
+    DB_NAME,
+    DATABASE_URL,
+    USE_POSTGRES,
+    ROUTINE_COLUMNS,
+    INSERT_ROUTINE_COLUMNS,
+    UPDATE_ROUTINE_IF_UNCHANGED_SQL,
+    COMPLETE_ROUTINE_SQL,
+    ROUTINE_CHANGES_SQL,
+    _routine_params,
+    _routine_guarded_update_params,
+    _row_to_routine,
+    _routine_details_update,
+    _routine_changes,
+    _routine_changes_params,
+    _block_timestamp,
+)
+from block_events import (
+    block_log_row, block_stats_increments, new_event_id, INSERT_BLOCK_LOG_SQL
+)
+from block_rollups import rollup_upserts, block_stats_queries, combine_block_stats
+
+
+def _pg(query: str) -> str:
+    """Convert '?' placeholders to asyncpg's numbered $1, $2, ..."""
+    counter = iter(range(1, 10_000))
+    return re.sub(r"\?", lambda _: f"${next(counter)}", query)
+
+
+# ============================================================
+# CONNECTION ADAPTERS
+# ============================================================
+
+class _PostgresConnection:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def fetchall(self, sql, params=()):
+        rows = await self.conn.fetch(_pg(sql), *params)
+        return [tuple(row) for row in rows]
+
+    async def fetchone(self, sql, params=()):
+        row = await self.conn.fetchrow(_pg(sql), *params)
+        return tuple(row) if row is not None else None
+
+    async def execute(self, sql, params=()):
+        """Run a statement and return the affected row count."""
+        status = await self.conn.execute(_pg(sql), *params)
+        # asyncpg returns the command tag, e.g. "UPDATE 3"
+        last = status.rsplit(" ", 1)[-1]
+        return int(last) if last.isdigit() else 0
+
+    async def executemany(self, sql, seq):
+        await self.conn.executemany(_pg(sql), seq)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.conn.transaction():
+            yield self
+
+
+class _SQLiteConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self._in_transaction = False
+
+    async def fetchall(self, sql, params=()):
+        async with self.conn.execute(sql, params) as cursor:
+            return await cursor.fetchall()
+
+    async def fetchone(self, sql, params=()):
+        async with self.conn.execute(sql, params) as cursor:
+            return await cursor.fetchone()
+
+    async def execute(self, sql, params=()):
+        async with self.conn.execute(sql, params) as cursor:
+            rowcount = cursor.rowcount
+        if not self._in_transaction:
+            await self.conn.commit()
+        return rowcount
+
+    async def executemany(self, sql, seq):
+        await self.conn.executemany(sql, seq)
+        if not self._in_transaction:
+            await self.conn.commit()
+
+    async def insert(self, sql, params=()):
+        """Run an INSERT and return the new rowid."""
+        async with self.conn.execute(sql, params) as cursor:
+            rowid = cursor.lastrowid
+        if not self._in_transaction:
+            await self.conn.commit()
+        return rowid
+
+    @asynccontextmanager
+    async def transaction(self):
+        self._in_transaction = True
+        try:
+            yield self
+            await self.conn.commit()
+        except BaseException:
+            await self.conn.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+
+
+class _SQLitePool:
+    """A handful of aiosqlite connections; each is used by one task at a time."""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._queue = asyncio.Queue()
+        self._all = []
+
+    async def open(self):
+        import aiosqlite
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(self.path, timeout=5.0)
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await conn.execute("PRAGMA synchronous=NORMAL")
+            self._all.append(conn)
+            self._queue.put_nowait(conn)
+
+    @asynccontextmanager
+    async def acquire(self):
+        conn = await self._queue.get()
+        try:
+            yield _SQLiteConnection(conn)
+        finally:
+            if conn.in_transaction:
+                await conn.rollback()
+            self._queue.put_nowait(conn)
+
+    def stats(self):
+        return {"backend": "aiosqlite", "size": self.size, "idle": self._queue.qsize()}
+
+    async def close(self):
+        for conn in self._all:
+            await conn.close()
+        self._all = []
+
+
+class _PostgresPool:
+    def __init__(self, dsn, minconn, maxconn):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._pool = None
+
+    async def open(self):
+        import asyncpg
+        self._pool = await asyncpg.create_pool(
+            self.dsn, min_size=self.minconn, max_size=self.maxconn,
+            max_inactive_connection_lifetime=float(os.environ.get("DB_POOL_IDLE_TIMEOUT", 300)),
+        )
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._pool.acquire() as conn:
+            yield _PostgresConnection(conn)
+
+    def stats(self):
+        return {
+            "backend": "asyncpg",
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "min": self.minconn,
+            "max": self.maxconn,
+        }
+
+    async def close(self):
+        await self._pool.close()
+
+
+_pool = None
+
+
+async def open_pool():
+    global _pool
+    if _pool is not None:
+        return _pool
+    if USE_POSTGRES:
+        pool = _PostgresPool(
+            DATABASE_URL,
+            minconn=int(os.environ.get("DB_POOL_MIN", 1)),
+            maxconn=int(os.environ.get("DB_POOL_MAX", 10)),
+        )
+    else:
+        pool = _SQLitePool(DB_NAME, size=int(os.environ.get("SQLITE_ASYNC_CONNECTIONS", 4)))
+    await pool.open()
+    _pool = pool
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+def pool_stats():
+    return _pool.stats() if _pool is not None else None
+
+
+@asynccontextmanager
+async def connection():
+    pool = _pool or await open_pool()
+    async with pool.acquire() as conn:
+        yield conn
+
+
+# ============================================================
+# ROUTINES
+# ============================================================
+
+async def insert_routines(routines) -> list:
+    """Async insert_routines: one transaction, returns ids in input order."""
+    rows = [_routine_params(r) for r in routines]
+    if not rows:
+        return []
+
+    async with connection() as conn:
+        if USE_POSTGRES:
+            # One round trip: unnest column arrays into rows
+            columns = list(zip(*rows))
+            result = await conn.fetchall(
+                f"INSERT INTO routines ({INSERT_ROUTINE_COLUMNS}) "
+                "SELECT * FROM unnest(?::text[], ?::text[], ?::text[], ?::text[], "
+                "?::int[], ?::text[], ?::int[], ?::int[], ?::text[]) "
+                "RETURNING id",
+                [list(column) for column in columns]
+            )
+            return sorted(row[0] for row in result)
+
+        ids = []
+        async with conn.transaction():
+            for row in rows:
+                ids.append(await conn.insert(
+                    f"INSERT INTO routines ({INSERT_ROUTINE_COLUMNS}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                ))
+        return ids
+
+
+async def get_all_routines(user_id: str = None):
+    async with connection() as conn:
+        if user_id:
+            rows = await conn.fetchall(
+                f"SELECT {ROUTINE_COLUMNS} FROM routines WHERE user_id = ?", (user_id,)
+            )
+        else:
+            rows = await conn.fetchall(f"SELECT {ROUTINE_COLUMNS} FROM routines")
+    return [_row_to_routine(row) for row in rows]
+
+
+async def get_routine_by_id(routine_id: int):
+    async with connection() as conn:
+        row = await conn.fetchone(
+            f"SELECT {ROUTINE_COLUMNS} FROM routines WHERE id = ?", (routine_id,)
+        )
+    return _row_to_routine(row) if row else None
+
+
+async def update_routines(routines) -> list:
+    """Async update_routines: only dirty rows, one transaction, returns the ones written."""
+    dirty = [r for r in routines if r.id is not None and r.is_dirty()]
+    if not dirty:
+        return []
+
+    written = []
+    dirty.sort(key=lambda r: (r.user_id or "", r.id))  # lock order, see database.py
+    async with connection() as conn:
+        async with conn.transaction():
+            for routine in dirty:
+                params = _routine_guarded_update_params(routine)
+                if await conn.execute(UPDATE_ROUTINE_IF_UNCHANGED_SQL, params):
+                    written.append(routine)
+
+    for routine in written:
+        routine.mark_clean()
+    return written
+
+
+async def complete_routine(routine_id: int):
+    async with connection() as conn:
+        async with conn.transaction():
+            row = await conn.fetchone(COMPLETE_ROUTINE_SQL, (routine_id,))
+    return _row_to_routine(row) if row else None
+
+
+async def update_routine_details(routine_id: int, title=None, routine_date=None,
+                                 routine_time=None, personality=None):
+    update = _routine_details_update(routine_id, title, routine_date,
+                                     routine_time, personality)
+    if update is None:
+        return False
+
+    sql, values = update
+    async with connection() as conn:
+        return await conn.execute(sql, values) > 0
+
+
+async def delete_routine_by_id(routine_id: int):
+    async with connection() as conn:
+        return await conn.execute("DELETE FROM routines WHERE id = ?", (routine_id,)) > 0
+
+
+async def get_routine_changes(user_id: str, since: int = 0, limit: int = 500):
+    async with connection() as conn:
+        rows = await conn.fetchall(ROUTINE_CHANGES_SQL,
+                                   _routine_changes_params(user_id, since, limit))
+    return _routine_changes(rows, since, limit)
+
+
+# ============================================================
+# ADDICTION MONITORING
+# ============================================================
+
+async def log_block(user_id: str, category: str, url: str = "",
+                    title: str = "", audio_type: str = "warning",
+                    timestamp: str = None):
+    ts = _block_timestamp(timestamp)
+    async with connection() as conn:
+        async with conn.transaction():
+            row = (user_id, category, url, title, ts, audio_type, new_event_id())
+            await conn.execute(INSERT_BLOCK_LOG_SQL, row)
+            for sql, params in rollup_upserts([(user_id, ts[:10], category, 1)]):
+                await conn.execute(sql, params[0])
+
+
+async def log_blocks(events, user_id: str = "default") -> int:
+    """Async log_blocks: insert (skipping known event_ids) + one UPSERT per rollup key."""
+    rows = [block_log_row(event, user_id) for event in events]
+    if not rows:
+        return 0
+
+    async with connection() as conn:
+        async with conn.transaction():
+            inserted = [row for row in rows if await conn.execute(INSERT_BLOCK_LOG_SQL, row)]
+            for sql, params in rollup_upserts(block_stats_increments(inserted)):
+                await conn.executemany(sql, params)
+    return len(inserted)
+
+
+async def get_block_stats(start, end, granularity: str = "day", user_id: str = None):
+    """Async database.get_block_stats: (rows, totals) for [start, end]."""
+    results = []
+    async with connection() as conn:
+        for sql, params in block_stats_queries(start, end, granularity, user_id):
+            results.append(await conn.fetchall(sql, params))
+    return combine_block_stats(results, granularity)
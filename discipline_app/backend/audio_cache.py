@@ -0,0 +1,121 @@
+"""
+Content-addressed on-disk cache for synthesized speech.
+
+The same lines are spoken over and over ("Yo! Gym is coming up...", the
+AI_WARNINGS in addiction_monitor.py), so each (voice, text) pair is
+synthesized once and stored as <sha256>.mp3 in TTS_CACHE_DIR. A file's
+mtime is bumped whenever it's used, and once the directory grows past
+TTS_CACHE_MAX_MB the least recently used files are deleted.
+
+Files are written to a temporary name and renamed into place, so a
+reader never sees a half-written MP3 and a crash leaves no partial
+entry behind.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_MB = float(os.environ.get("TTS_CACHE_MAX_MB", 50))
+
+
+class AudioCache:
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=int(TTS_CACHE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(text, voice):
+        return hashlib.sha256(f"{voice}\0{text}".encode("utf-8")).hexdigest()
+
+    def path_for(self, text, voice):
+        return os.path.join(self.directory, self.key(text, voice) + ".mp3")
+
+    def get(self, text, voice):
+        """Path of the cached audio (marked as recently used), or None."""
+        path = self.path_for(text, voice)
+        try:
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def temp_path(self, text, voice):
+        """Where to synthesize before put() (same directory, so the rename is atomic)."""
+        os.makedirs(self.directory, exist_ok=True)
+        return f"{self.path_for(text, voice)}.{os.getpid()}.{threading.get_ident()}.part"
+
+    def put(self, temp_path, text, voice):
+        """Move a freshly synthesized file into the cache. Returns its path."""
+        if not os.path.exists(temp_path) or os.path.getsize(temp_path) == 0:
+            raise ValueError(f"no audio was written to {temp_path}")
+        path = self.path_for(text, voice)
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".mp3"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def evict(self):
+        """Delete least recently used files until the cache fits max_bytes."""
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return 0
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            # Never evict the newest file, it's the one about to be played
+            for _, size, name in entries[:-1]:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            self.evictions += removed
+            return removed
+
+    def clean_partials(self, older_than=3600):
+        """Remove .part files left by a crash mid-synthesis."""
+        if not os.path.isdir(self.directory):
+            return
+        cutoff = time.time() - older_than
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".part"):
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        entries = self._entries() if os.path.isdir(self.directory) else []
+        return {
+            "files": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,175 @@
+"""
+Single audio playback service for the PC.
+
+Every spoken reminder used to get its own thread and event loop
+(tts.speak_background), and tts.py and addiction_monitor.py both drove
+the global pygame.mixer.music and polled get_busy() every 100ms, so two
+messages at once cut each other off. Now one long-lived thread owns the
+mixer and one asyncio loop, and everything that makes a sound goes
+through play():
+
+- Items wait in a priority queue. A block warning (WARNING) preempts a
+  routine reminder (REMINDER) that is playing or still being
+  synthesized; the reminder is put back and played again afterwards.
+- Synthesis runs on the same loop, started as soon as an item is queued,
+  so the next clip is usually ready when the current one ends.
+- Clips play on a single reserved mixer channel. Completion is awaited
+  on the loop (clip length or a preempt, whichever comes first), nothing
+  polls the mixer.
+
+A source can also be an already decoded pygame Sound (see sound_bank.py),
+which starts without touching the disk.
+
+play() returns a concurrent.futures.Future that resolves to True once
+the clip played to the end, or False if it couldn't be played.
+"""
+
+import asyncio
+import concurrent.futures
+import itertools
+import os
+import threading
+
+import pygame
+
+WARNING = 0
+REMINDER = 10
+
+
+class _Item:
+    def __init__(self, source, label):
+        self.source = source      # file path / Sound, or async callable returning one
+        self.label = label
+        self.task = None          # synthesis task for callable sources
+        self.future = concurrent.futures.Future()
+
+
+class AudioService:
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+        self._seq = itertools.count()
+
+        # Created on the service loop
+        self._queue = None
+        self._channel = None
+        self._current = None      # (priority, seq, item) being handled
+        self._interrupt = None
+
+        self.played = 0
+        self.preempted = 0
+        self.failed = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audio", daemon=True)
+                self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.PriorityQueue()
+        try:
+            pygame.mixer.init()
+            self._channel = pygame.mixer.Channel(0)
+            pygame.mixer.set_reserved(1)
+        except Exception as e:
+            print(f"[AUDIO ERROR] Mixer not available: {e}")
+        self._ready.set()
+        self._loop.run_until_complete(self._worker())
+
+    # --------------------------------------------------------
+    # Called from any thread
+    # --------------------------------------------------------
+
+    def play(self, source, priority=REMINDER, label=""):
+        """
+        Queue a clip. `source` is an audio file path, a pygame Sound or
+        a coroutine function returning a path (synthesized on the
+        service loop).
+        """
+        self.start()
+        item = _Item(source, label or str(source))
+        self._loop.call_soon_threadsafe(self._enqueue, priority, next(self._seq), item)
+        return item.future
+
+    def run(self, coro):
+        """Run a coroutine (e.g. synthesis) on the service loop."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    # --------------------------------------------------------
+    # Service loop
+    # --------------------------------------------------------
+
+    def _enqueue(self, priority, seq, item):
+        if callable(item.source):
+            item.task = self._loop.create_task(item.source())
+        self._queue.put_nowait((priority, seq, item))
+        if (self._current is not None and priority < self._current[0]
+                and not self._interrupt.done()):
+            self._interrupt.set_result(True)
+
+    async def _worker(self):
+        while True:
+            entry = await self._queue.get()
+            item = entry[2]
+            self._current = entry
+            self._interrupt = self._loop.create_future()
+            try:
+                finished = await self._handle(item)
+            except Exception as e:
+                print(f"[AUDIO ERROR] {item.label}: {e}")
+                self.failed += 1
+                item.future.set_result(False)
+            else:
+                if finished:
+                    self.played += 1
+                    item.future.set_result(True)
+                else:
+                    # Preempted: play it again once the warning is done
+                    print(f"[AUDIO] Preempted: {item.label}")
+                    self.preempted += 1
+                    self._queue.put_nowait(entry)
+            finally:
+                self._current = None
+
+    async def _handle(self, item):
+        """Play one item. False if it was preempted before finishing."""
+        interrupt = self._interrupt
+        if item.task is not None:
+            await asyncio.wait({item.task, interrupt}, return_when=asyncio.FIRST_COMPLETED)
+            if not item.task.done():
+                return False
+            path = item.task.result()
+        else:
+            path = item.source
+
+        if self._channel is None:
+            raise RuntimeError("mixer not available")
+        sound = pygame.mixer.Sound(path) if isinstance(path, (str, os.PathLike)) else path
+        print(f"[AUDIO] Playing: {item.label}")
+        self._channel.play(sound)
+        await asyncio.wait({interrupt}, timeout=sound.get_length())
+        if interrupt.done():
+            self._channel.stop()
+            return False
+        print(f"[AUDIO] Finished playing")
+        return True
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "playing": self._current[2].label if self._current else None,
+            "played": self.played,
+            "preempted": self.preempted,
+            "failed": self.failed,
+        }
+
+
+audio_service = AudioService()
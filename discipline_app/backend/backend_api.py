@@ -4,12 +4,18 @@ Handles routine reminders, logging, and statistics
 This version is deployable to cloud (no Windows-specific code)
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+import json
 from flask_cors import CORS
-import sqlite3
 from datetime import datetime, timedelta
 import os
 from apscheduler.schedulers.background import BackgroundScheduler
+from url_classifier import default_classifier
+from response_cache import ResponseCache
+from notifications import Notification, get_dispatcher, reminder_text
+import database
+from block_rollups import GRANULARITIES, resolve_range
+from models import RecurringRoutine
 
 app = Flask(__name__)
 CORS(app)  # Allow Flutter app to connect
@@ -18,89 +24,22 @@ CORS(app)  # Allow Flutter app to connect
 # CONFIGURATION
 # ============================================================================
 
-DATABASE = 'discipline.db'
+# Block lists live in url_classifier.py (shared with the desktop monitor)
+classifier = default_classifier()
 
-PORN_PATTERNS = [
-    'pornhub', 'xvideos', 'xnxx', 'redtube', 'youporn',
-    'xhamster', 'tube8', 'spankwire', 'keezmovies',
-    'porn', 'xxx', 'sex', 'adult', 'nsfw',
-    'onlyfans', 'chaturbate', 'stripchat', 'cam4',
-    'livejasmin', 'bongacams', 'myfreecams'
-]
+# Max URLs in one JSON /api/check-urls request (use NDJSON for more)
+MAX_BATCH_URLS = 10000
 
-GAMBLING_PATTERNS = [
-    'casino', 'poker', 'betting', 'bet365', 'pokerstars',
-    'gamble', 'slots', 'blackjack', 'roulette',
-    'sportbet', 'bwin', '888casino', 'draftkings',
-    'fanduel', 'bovada', 'stake.com'
-]
+# Per-user cache for /api/stats and /api/routines/completions
+response_cache = ResponseCache()
 
 # ============================================================================
 # DATABASE FUNCTIONS
 # ============================================================================
 
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 def init_db():
-    """Initialize all database tables"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    # Block logs table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS block_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            category TEXT NOT NULL,
-            url TEXT,
-            title TEXT,
-            timestamp TEXT NOT NULL,
-            audio_type TEXT
-        )
-    """)
-    
-    # Block stats table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS block_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            date TEXT NOT NULL,
-            category TEXT NOT NULL,
-            blocks_count INTEGER DEFAULT 0,
-            UNIQUE(user_id, date, category)
-        )
-    """)
-    
-    # Routines table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS routines (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            title TEXT NOT NULL,
-            description TEXT,
-            time TEXT NOT NULL,
-            days TEXT NOT NULL,
-            active INTEGER DEFAULT 1,
-            created_at TEXT NOT NULL
-        )
-    """)
-    
-    # Routine completions table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS routine_completions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            routine_id INTEGER NOT NULL,
-            completed_at TEXT NOT NULL,
-            FOREIGN KEY (routine_id) REFERENCES routines (id)
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+    """Initialize all database tables (shared schema, see database.py)"""
+    database.init_db()
     print("✅ Database initialized")
 
 # ============================================================================
@@ -111,30 +50,85 @@ def init_db():
 def check_url():
     """Check if a URL should trigger a warning"""
     data = request.json
-    url = data.get('url', '').lower()
-    
-    # Check against patterns
-    category = None
-    for pattern in PORN_PATTERNS:
-        if pattern in url:
-            category = 'porn'
-            break
+    url = data.get('url', '')
     
-    if not category:
-        for pattern in GAMBLING_PATTERNS:
-            if pattern in url:
-                category = 'gambling'
-                break
+    # One pass over the URL finds every matching category
+    categories = classifier.classify(url)
     
-    if category:
+    if categories:
+        category = categories[0]
         return jsonify({
             'blocked': True,
             'category': category,
+            'categories': categories,
             'message': f'Warning: {category} content detected'
         })
     
     return jsonify({'blocked': False})
 
+def _url_verdict(url):
+    categories = classifier.classify(url)
+    return {
+        'url': url,
+        'blocked': bool(categories),
+        'category': categories[0] if categories else None,
+        'categories': categories
+    }
+
+def _ndjson_urls(stream):
+    """URLs from an NDJSON body: each line is a JSON string or {"url": ...}"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield item.get('url', '') if isinstance(item, dict) else str(item)
+
+@app.route('/api/check-urls', methods=['POST'])
+def check_urls():
+    """
+    Classify many URLs in one request.
+
+    JSON:   {"urls": ["https://...", ...]} (or a bare array)
+            -> {"results": [{url, blocked, category, categories}, ...]}
+    NDJSON: Content-Type: application/x-ndjson, one URL per line
+            -> streamed back as one verdict per line
+    """
+    if request.mimetype == 'application/x-ndjson':
+        stream = request.stream
+
+        def generate():
+            for url in _ndjson_urls(stream):
+                if url is None:
+                    verdict = {'error': 'invalid JSON line'}
+                elif not isinstance(url, str):
+                    verdict = {'error': 'invalid url'}
+                else:
+                    verdict = _url_verdict(url)
+                yield json.dumps(verdict) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    data = request.get_json(silent=True)
+    urls = data.get('urls') if isinstance(data, dict) else data
+    if not isinstance(urls, list):
+        return jsonify({'error': 'Expected {"urls": [...]} or a JSON array'}), 400
+    if len(urls) > MAX_BATCH_URLS:
+        return jsonify({
+            'error': f'Too many URLs ({len(urls)}), max {MAX_BATCH_URLS} per request. '
+                     'Use application/x-ndjson to stream larger batches.'
+        }), 413
+    
+    results = [_url_verdict(url if isinstance(url, str) else '') for url in urls]
+    return jsonify({
+        'results': results,
+        'blocked_count': sum(1 for r in results if r['blocked'])
+    })
+
 @app.route('/api/log-block', methods=['POST'])
 def log_block():
     """Log a blocked attempt from the mobile app"""
@@ -146,70 +140,72 @@ def log_block():
         title = data.get('title', '')
         audio_type = data.get('audio_type', 'warning')
         
-        conn = get_db()
-        cursor = conn.cursor()
+        database.log_block(user_id, category, url, title, audio_type)
+        response_cache.invalidate('stats', user_id)
         
-        # Log the block
-        cursor.execute("""
-            INSERT INTO block_logs (user_id, category, url, title, timestamp, audio_type)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_id, category, url, title, datetime.now().isoformat(), audio_type))
-        
-        # Update stats
-        today = datetime.now().strftime('%Y-%m-%d')
-        cursor.execute("""
-            INSERT INTO block_stats (user_id, date, category, blocks_count)
-            VALUES (?, ?, ?, 1)
-            ON CONFLICT(user_id, date, category)
-            DO UPDATE SET blocks_count = blocks_count + 1
-        """, (user_id, today, category))
+        return jsonify({'success': True, 'message': 'Block logged'})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/log-blocks', methods=['POST'])
+def log_blocks():
+    """
+    Log a batch of block attempts in one transaction.
+    Body: {"user_id": "...", "events": [{"category", "url", "title",
+           "audio_type", "timestamp", "event_id"}, ...]}
+    """
+    try:
+        data = request.json or {}
+        user_id = data.get('user_id', 'default')
+        events = data.get('events', [])
         
-        conn.commit()
-        conn.close()
+        # Events whose event_id is already logged are skipped
+        inserted = database.log_blocks(events, user_id)
+        if inserted:
+            response_cache.invalidate('stats', {event.get('user_id') or user_id for event in events})
         
-        return jsonify({'success': True, 'message': 'Block logged'})
+        return jsonify({'success': True, 'logged': inserted})
     
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
-    """Get blocking statistics"""
+    """
+    Get blocking statistics
+    Query: user_id, days (default 7) or from/to (YYYY-MM-DD),
+           granularity (day, week, month)
+    """
     user_id = request.args.get('user_id', 'default')
-    days = int(request.args.get('days', 7))
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
     
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT date, category, blocks_count
-        FROM block_stats
-        WHERE user_id = ? AND date >= date('now', '-' || ? || ' days')
-        ORDER BY date DESC
-    """, (user_id, days))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    stats = []
-    total_by_category = {}
-    
-    for row in rows:
-        stats.append({
-            'date': row['date'],
-            'category': row['category'],
-            'count': row['blocks_count']
-        })
+    try:
+        start, end = resolve_range(int(request.args.get('days', 7)),
+                                   request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def load():
+        # Whole weeks/months come from the rollup tables, only the edges from block_stats
+        rows, total_by_category = database.get_block_stats(start, end, granularity, user_id)
+        stats = [{'date': bucket, 'category': category, 'count': count}
+                 for bucket, category, count in rows]
         
-        category = row['category']
-        if category not in total_by_category:
-            total_by_category[category] = 0
-        total_by_category[category] += row['blocks_count']
-    
-    return jsonify({
-        'daily_stats': stats,
-        'totals': total_by_category
-    })
+        return {
+            'daily_stats': stats,
+            'totals': total_by_category,
+            'granularity': granularity,
+            'from': start.isoformat(),
+            'to': end.isoformat()
+        }
+    
+    params = {'from': start, 'to': end, 'granularity': granularity}
+    return jsonify(response_cache.get_or_compute('stats', user_id, params, load))
 
 # ============================================================================
 # API ENDPOINTS - ROUTINES
@@ -220,28 +216,9 @@ def get_routines():
     """Get all routines for a user"""
     user_id = request.args.get('user_id', 'default')
     
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT * FROM routines
-        WHERE user_id = ? AND active = 1
-        ORDER BY time
-    """, (user_id,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    routines = []
-    for row in rows:
-        routines.append({
-            'id': row['id'],
-            'title': row['title'],
-            'description': row['description'],
-            'time': row['time'],
-            'days': row['days'],
-            'created_at': row['created_at']
-        })
+    fields = {'id', 'title', 'description', 'time', 'days', 'created_at'}
+    routines = [routine.model_dump(include=fields)
+                for routine in database.get_recurring_routines(user_id)]
     
     return jsonify(routines)
 
@@ -256,17 +233,9 @@ def create_routine():
         time = data['time']  # Format: "14:30"
         days = data['days']  # Format: "Mon,Wed,Fri" or "Daily"
         
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO routines (user_id, title, description, time, days, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_id, title, description, time, days, datetime.now().isoformat()))
-        
-        routine_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        routine_id = database.insert_recurring_routine(RecurringRoutine(
+            user_id=user_id, title=title, description=description or '', time=time, days=days
+        ))
         
         return jsonify({
             'success': True,
@@ -281,13 +250,7 @@ def create_routine():
 def delete_routine(routine_id):
     """Delete a routine"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("UPDATE routines SET active = 0 WHERE id = ?", (routine_id,))
-        
-        conn.commit()
-        conn.close()
+        database.deactivate_recurring_routine(routine_id)
         
         return jsonify({'success': True, 'message': 'Routine deleted'})
     
@@ -298,16 +261,8 @@ def delete_routine(routine_id):
 def complete_routine(routine_id):
     """Mark a routine as completed"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO routine_completions (routine_id, completed_at)
-            VALUES (?, ?)
-        """, (routine_id, datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
+        owner = database.complete_recurring_routine(routine_id)
+        response_cache.invalidate('completions', owner)
         
         return jsonify({'success': True, 'message': 'Routine marked complete'})
     
@@ -320,28 +275,12 @@ def get_completions():
     user_id = request.args.get('user_id', 'default')
     days = int(request.args.get('days', 7))
     
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT r.title, rc.completed_at
-        FROM routine_completions rc
-        JOIN routines r ON rc.routine_id = r.id
-        WHERE r.user_id = ? AND rc.completed_at >= datetime('now', '-' || ? || ' days')
-        ORDER BY rc.completed_at DESC
-    """, (user_id, days))
-    
-    rows = cursor.fetchall()
-    conn.close()
+    def load():
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        return [completion.model_dump(include={'title', 'completed_at'})
+                for completion in database.get_routine_completions(user_id, since)]
     
-    completions = []
-    for row in rows:
-        completions.append({
-            'title': row['title'],
-            'completed_at': row['completed_at']
-        })
-    
-    return jsonify(completions)
+    return jsonify(response_cache.get_or_compute('completions', user_id, {'days': days}, load))
 
 # ============================================================================
 # HEALTH CHECK
@@ -352,7 +291,9 @@ def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'response_cache': response_cache.stats(),
+        'notifications': get_dispatcher().stats()
     })
 
 @app.route('/', methods=['GET'])
@@ -365,14 +306,55 @@ def home():
     })
 
 # ============================================================================
-# SCHEDULED TASKS (Optional - for future reminder notifications)
+# SCHEDULED TASKS
 # ============================================================================
 
+REMINDER_MINUTES_BEFORE = int(os.environ.get('REMINDER_MINUTES_BEFORE', 5))
+
+# (routine_id, date) pairs already reminded, so each routine fires once a day
+_reminded = set()
+
+def _scheduled_on(days, day):
+    """days is "Daily" or a list like "Mon,Wed,Fri"."""
+    days = (days or '').strip()
+    if not days or days.lower() in ('daily', 'every day', 'everyday'):
+        return True
+    return day.strftime('%a') in {d.strip()[:3].title() for d in days.split(',')}
+
 def check_reminders():
-    """Check if any routines need reminders (runs every minute)"""
-    # This would send push notifications to mobile devices
-    # You can implement this later with Firebase Cloud Messaging
-    pass
+    """
+    Queue reminders for routines starting in the next
+    REMINDER_MINUTES_BEFORE minutes (runs every minute). Delivery happens
+    on the notification dispatcher's workers, so a slow sink never holds
+    up this job.
+    """
+    now = datetime.now()
+    today = now.date()
+    
+    routines = database.get_open_recurring_routines(today.isoformat())
+    
+    for key in [k for k in _reminded if k[1] != today]:
+        _reminded.discard(key)
+    
+    dispatcher = get_dispatcher()
+    for routine in routines:
+        try:
+            hour, minute = (int(part) for part in routine.time.split(':')[:2])
+            starts_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        except ValueError:
+            continue
+        
+        key = (routine.id, today)
+        if key in _reminded or not _scheduled_on(routine.days, today):
+            continue
+        if now <= starts_at <= now + timedelta(minutes=REMINDER_MINUTES_BEFORE):
+            _reminded.add(key)
+            dispatcher.submit(Notification('reminder', routine.user_id, routine.title,
+                                           reminder_text(routine.title),
+                                           data={'routine_id': routine.id}))
+
+# Notification workers (check_reminders only queues)
+get_dispatcher().start()
 
 # Initialize scheduler for reminders
 scheduler = BackgroundScheduler()
@@ -394,7 +376,9 @@ if __name__ == '__main__':
     print("\n📋 Available API Endpoints:")
     print("  GET  /health                        - Health check")
     print("  POST /api/check-url                 - Check if URL is blocked")
+    print("  POST /api/check-urls                - Check many URLs (JSON or NDJSON)")
     print("  POST /api/log-block                 - Log a blocked attempt")
+    print("  POST /api/log-blocks                - Log a batch of blocked attempts")
     print("  GET  /api/stats                     - Get blocking statistics")
     print("  GET  /api/routines                  - Get all routines")
     print("  POST /api/routines                  - Create new routine")
@@ -0,0 +1,99 @@
+"""
+URL Classifier Benchmark
+Compares the old nested `for pattern in ... if pattern in url` scan with
+the compiled classifier in url_classifier.py as block lists grow.
+
+Usage: python bench_url_classifier.py [number_of_urls]
+"""
+import random
+import string
+import sys
+import time
+
+from url_classifier import URLClassifier, CATEGORY_PATTERNS, NATIVE_AUTOMATON
+
+LIST_SIZES = [37, 1_000, 10_000, 50_000]
+NUM_URLS = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+
+
+def random_domain(rng):
+    name = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 14)))
+    return f"{name}.{rng.choice(['com', 'net', 'org', 'io', 'tv'])}"
+
+
+def build_lists(size, rng):
+    """Default patterns padded with synthetic domains up to `size` entries."""
+    lists = {c: list(p) for c, p in CATEGORY_PATTERNS.items()}
+    categories = list(lists)
+    total = sum(len(p) for p in lists.values())
+    while total < size:
+        lists[categories[total % len(categories)]].append(random_domain(rng))
+        total += 1
+    return lists
+
+
+def build_urls(lists, count, rng):
+    blocked = [p for patterns in lists.values() for p in patterns]
+    urls = []
+    for i in range(count):
+        if i % 10 == 0:
+            host = rng.choice(blocked)
+            host = host if '.' in host else f"www.{host}.com"
+        else:
+            host = random_domain(rng)
+        path = '/'.join(rng.choice(['watch', 'news', 'a', 'item', '2024', 'v']) for _ in range(3))
+        urls.append(f"https://{host}/{path}?id={rng.randint(1, 99999)}")
+    return urls
+
+
+def naive_classify(lists, url):
+    url = url.lower()
+    for category, patterns in lists.items():
+        for pattern in patterns:
+            if pattern in url:
+                return category
+    return None
+
+
+def rate(count, seconds):
+    return f"{count / seconds:>12,.0f} urls/s" if seconds > 0 else "           inf"
+
+
+if __name__ == "__main__":
+    rng = random.Random(42)
+
+    print("=" * 66)
+    print("URL CLASSIFIER BENCHMARK")
+    print("=" * 66)
+    print(f"URLs per run: {NUM_URLS:,}")
+    print(f"Automaton:    {'pyahocorasick' if NATIVE_AUTOMATON else 'pure Python'}")
+    print()
+    print(f"{'patterns':>10} | {'build':>8} | {'naive scan':>19} | {'classifier':>19}")
+    print("-" * 66)
+
+    for size in LIST_SIZES:
+        lists = build_lists(size, rng)
+        urls = build_urls(lists, NUM_URLS, rng)
+
+        start = time.perf_counter()
+        classifier = URLClassifier(lists)
+        build_time = time.perf_counter() - start
+
+        # The naive scan gets slow fast - time a sample and extrapolate
+        sample = urls[:max(50, NUM_URLS * 37 // size)]
+        start = time.perf_counter()
+        for url in sample:
+            naive_classify(lists, url)
+        naive_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        blocked = 0
+        for url in urls:
+            if classifier.classify(url):
+                blocked += 1
+        classifier_time = time.perf_counter() - start
+
+        print(f"{classifier.pattern_count:>10,} | {build_time:>7.2f}s | "
+              f"{rate(len(sample), naive_time)} | {rate(len(urls), classifier_time)}")
+
+    print("=" * 66)
@@ -0,0 +1,117 @@
+"""
+Window Monitor Benchmark
+Replays a synthetic desktop session (window_monitor.synthetic_events)
+through the old 2-second polling loop and through the event-driven
+backend, and compares how long it takes to notice a blocked page, how
+often the monitor wakes up and how many process-name lookups it does.
+
+The session is replayed SPEED times faster than real time; latencies
+are reported in real seconds.
+
+Usage: python bench_window_monitor.py [number_of_window_switches] [speed]
+"""
+import bisect
+import sys
+import threading
+import time
+
+from url_classifier import default_classifier
+from window_monitor import PollingMonitor, ProcessNameCache, ReplayMonitor, synthetic_events
+
+NUM_EVENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+SPEED = float(sys.argv[2]) if len(sys.argv) > 2 else 200
+POLL_INTERVAL = 2.0
+CATEGORIES = ['porn', 'gambling']
+
+classifier = default_classifier()
+
+
+class Timeline:
+    """What the foreground window is at a given moment of the replay."""
+
+    def __init__(self, events, start, cached):
+        self.events = events
+        self.times = [start + event['at'] / SPEED for event in events]
+        self.lookups = 0
+        self.names = ProcessNameCache(lookup=self._lookup) if cached else None
+
+    def _lookup(self, pid):
+        self.lookups += 1
+        return next(event['process'] for event in self.events if event['pid'] == pid)
+
+    def current(self):
+        i = bisect.bisect_right(self.times, time.monotonic()) - 1
+        if i < 0:
+            return None
+        event = self.events[i]
+        if self.names:
+            process = self.names.name(event['pid'])
+        else:
+            process = self._lookup(event['pid'])
+        return {'title': event['title'], 'process': process, 'pid': event['pid'],
+                'time': self.times[i]}
+
+
+def run(monitor, duration=None):
+    latencies = []
+    seen = set()
+
+    def on_window(info):
+        if 'chrome' not in info['process']:
+            return
+        if classifier.first(info['title'], CATEGORIES) and info['time'] not in seen:
+            seen.add(info['time'])
+            latencies.append((time.monotonic() - info['time']) * SPEED)
+
+    cpu = time.process_time()
+    if duration:
+        # The replay ends by itself, a poller runs until stopped
+        threading.Timer(duration, monitor.stop).start()
+    monitor.run(on_window)
+    return latencies, time.process_time() - cpu
+
+
+def summarize(name, latencies, wakeups, lookups, cpu):
+    latencies.sort()
+    avg = sum(latencies) / len(latencies) if latencies else 0
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(f"{name:<16} | {len(latencies):>8} | {avg:>9.2f}s | {p95:>9.2f}s | {wakeups:>8,} | "
+          f"{lookups:>8,} | {cpu * 1000:>7.0f} ms")
+
+
+if __name__ == "__main__":
+    events = synthetic_events(NUM_EVENTS)
+    duration = events[-1]['at'] / SPEED + 0.05
+
+    print("=" * 84)
+    print("WINDOW MONITOR BENCHMARK")
+    print("=" * 84)
+    blocked = sum(1 for event in events if classifier.first(event['title'], CATEGORIES))
+    print(f"Window switches: {NUM_EVENTS:,}   blocked pages: {blocked}   "
+          f"session: {events[-1]['at'] / 60:.0f} min   replayed {SPEED:.0f}x")
+    print()
+    print(f"{'backend':<16} | {'detected':>8} | {'avg delay':>10} | {'p95 delay':>10} | "
+          f"{'wake-ups':>8} | {'lookups':>8} | {'cpu':>10}")
+    print("-" * 84)
+
+    # Old loop: poll every 2s, psutil lookup on every poll
+    timeline = Timeline(events, time.monotonic(), cached=False)
+    poller = PollingMonitor(get_window=timeline.current, interval=POLL_INTERVAL / SPEED,
+                            heartbeat=30 / SPEED)
+    latencies, cpu = run(poller, duration)
+    summarize("poll 2s", latencies, poller.events, timeline.lookups, cpu)
+
+    # Polling, but with the pid -> name cache
+    timeline = Timeline(events, time.monotonic(), cached=True)
+    poller = PollingMonitor(get_window=timeline.current, interval=POLL_INTERVAL / SPEED,
+                            heartbeat=30 / SPEED)
+    latencies, cpu = run(poller, duration)
+    summarize("poll 2s + cache", latencies, poller.events, timeline.lookups, cpu)
+
+    # Event-driven: one wake-up per window/title change
+    timeline = Timeline(events, time.monotonic(), cached=True)
+    replay = ReplayMonitor(events, speed=SPEED, names=timeline.names)
+    latencies, cpu = run(replay)
+    summarize("events + cache", latencies, replay.events, timeline.lookups, cpu)
+
+    print("=" * 84)
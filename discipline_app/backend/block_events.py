@@ -0,0 +1,77 @@
+"""
+Helpers for block events shared by every logging path
+(database.py, async_database.py and backend_api.py).
+
+A block event is a dict like the /log-block parameters:
+    {"user_id": ..., "category": ..., "url": ..., "title": ...,
+     "audio_type": ..., "timestamp": "2025-01-31T22:15:03",
+     "event_id": "..."}
+Only "category" is required. The timestamp is the client's time, so
+events recorded while a phone was offline land on the right day. It is
+parsed once here (ISO 8601, ValueError otherwise) and stored
+normalised, so the rollup code downstream only ever sees valid dates.
+
+"event_id" is the idempotency key. Clients that may send an event
+again (the desktop sync agent, see sync_agent.py) set their own;
+every other event gets a random one here, so every block_logs row has
+a key and can be synced on safely. block_logs has a unique index
+on it and INSERT_BLOCK_LOG_SQL skips rows whose key is already there,
+so a batch that is sent again after a lost response is only counted
+once. Callers bump block_stats only for the rows actually inserted.
+"""
+
+import uuid
+from collections import Counter
+from datetime import datetime
+
+BLOCK_LOG_FIELDS = ("user_id", "category", "url", "title", "timestamp", "audio_type", "event_id")
+
+INSERT_BLOCK_LOG_SQL = """
+    INSERT INTO block_logs (user_id, category, url, title, timestamp, audio_type, event_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (event_id) DO NOTHING
+"""
+
+
+def new_event_id():
+    return uuid.uuid4().hex
+
+
+def normalize_timestamp(timestamp):
+    """ISO 8601 timestamp -> datetime.isoformat() text. ValueError if it isn't one."""
+    if not timestamp:
+        return datetime.now().isoformat()
+    if not isinstance(timestamp, str):
+        raise ValueError(f"block event 'timestamp' must be an ISO 8601 string, got {timestamp!r}")
+    try:
+        return datetime.fromisoformat(timestamp).isoformat()
+    except ValueError:
+        raise ValueError(f"block event has an invalid 'timestamp': {timestamp!r}") from None
+
+
+def block_log_row(event, default_user_id="default"):
+    """Turn one event dict into a block_logs row tuple (BLOCK_LOG_FIELDS order)."""
+    category = event.get("category")
+    if not category:
+        raise ValueError("block event is missing 'category'")
+    return (
+        event.get("user_id") or default_user_id,
+        category,
+        event.get("url") or "",
+        event.get("title") or "",
+        normalize_timestamp(event.get("timestamp")),
+        event.get("audio_type") or "warning",
+        event.get("event_id") or new_event_id(),
+    )
+
+
+def block_stats_increments(rows):
+    """
+    Collapse block_logs rows into one (user_id, date, category, count)
+    per day and category, so a batch needs one UPSERT per key instead
+    of one per event.
+    """
+    counts = Counter((user_id, timestamp[:10], category)
+                     for user_id, category, _, _, timestamp, _, _ in rows)
+    return [(user_id, day, category, count)
+            for (user_id, day, category), count in counts.items()]
@@ -0,0 +1,309 @@
+"""
+Write-behind buffer for block events.
+
+/log-block used to commit to the database inside the request. Now the
+request only appends the event to a local spool file and an in-memory
+list, and a background thread writes batches with database.log_blocks()
+once BLOCK_BUFFER_MAX_BATCH events are waiting or BLOCK_BUFFER_MAX_DELAY
+seconds have passed, whichever comes first.
+
+Durability: every event is in the spool (one JSON line each) before
+submit() returns. The spool is rotated at each flush and the rotated
+segment is deleted only after the batch is committed, so events that
+were accepted but not yet written survive a crash and are replayed on
+the next start. Delivery is at-least-once: a crash between the commit
+and the delete replays that batch. BLOCK_SPOOL_FSYNC=1 also fsyncs
+each append (survives power loss, costs latency).
+
+Bad data: submit() validates each event (block_events.block_log_row)
+and raises ValueError before anything is spooled, so the client gets an
+error. If a batch still fails, it is retried one event at a time: events
+that fail on their data (ValueError, integrity errors) are moved to the
+dead-letter file block_events.dead instead of blocking everyone else's,
+and only when the database itself fails are the events put back and
+retried.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+
+from block_events import block_log_row, BLOCK_LOG_FIELDS
+
+BLOCK_SPOOL_DIR = os.environ.get("BLOCK_SPOOL_DIR", "spool")
+MAX_BATCH = int(os.environ.get("BLOCK_BUFFER_MAX_BATCH", 500))
+MAX_DELAY = float(os.environ.get("BLOCK_BUFFER_MAX_DELAY", 1.0))
+SPOOL_FSYNC = os.environ.get("BLOCK_SPOOL_FSYNC", "0") == "1"
+
+
+def _is_data_error(error):
+    """True if writing failed because of the event itself, not the database."""
+    return (isinstance(error, (ValueError, TypeError, KeyError))
+            or type(error).__name__ in ("IntegrityError", "DataError"))
+
+
+class BlockLogBuffer:
+    def __init__(self, writer, spool_dir=BLOCK_SPOOL_DIR, max_batch=MAX_BATCH,
+                 max_delay=MAX_DELAY, fsync=SPOOL_FSYNC):
+        # writer(events) -> persists a list of event dicts (database.log_blocks)
+        self.writer = writer
+        self.spool_dir = spool_dir
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.fsync = fsync
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._oldest = None           # monotonic time of the oldest pending event
+        self._segments = []           # rotated spool files holding _pending
+        self._spool = None
+        self._segment_seq = 0
+        self._thread = None
+        self._stopping = False
+        self._listeners = []
+
+        self.submitted = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.dead_lettered = 0
+
+    # --------------------------------------------------------
+    # Spool files
+    # --------------------------------------------------------
+
+    def _spool_path(self):
+        return os.path.join(self.spool_dir, "block_events.spool")
+
+    def _dead_letter(self, event, error):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        with open(os.path.join(self.spool_dir, "block_events.dead"), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"event": event, "error": str(error)}) + "\n")
+        print(f"☠️  Block event {event.get('event_id')} moved to dead letters: {error}")
+
+    def _open_spool(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._spool = open(self._spool_path(), "a", encoding="utf-8")
+
+    def _rotate_spool(self):
+        """Close the live spool and return its rotated name (caller holds the lock)."""
+        if self._spool is None:
+            return None
+        self._spool.close()
+        self._spool = None
+        path = self._spool_path()
+        if os.path.getsize(path) == 0:
+            os.remove(path)
+            return None
+        self._segment_seq += 1
+        segment = os.path.join(
+            self.spool_dir, f"block_events.{int(time.time() * 1000)}.{self._segment_seq}.flushing"
+        )
+        os.replace(path, segment)
+        return segment
+
+    def _replay(self):
+        """Load events left over from a previous run into the pending list."""
+        if not os.path.isdir(self.spool_dir):
+            return 0
+        files = sorted(glob.glob(os.path.join(self.spool_dir, "block_events.*.flushing")))
+        live = self._spool_path()
+        if os.path.exists(live):
+            self._segment_seq += 1
+            rotated = os.path.join(self.spool_dir, f"block_events.0.{self._segment_seq}.flushing")
+            os.replace(live, rotated)
+            files.append(rotated)
+
+        replayed = 0
+        for path in files:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._pending.append(json.loads(line))
+                        replayed += 1
+                    except ValueError:
+                        # A torn last line from a crash mid-write
+                        print(f"⚠️  Skipping corrupt spool line in {path}")
+            self._segments.append(path)
+        if replayed:
+            self._oldest = time.monotonic()
+            print(f"♻️  Replaying {replayed} spooled block events")
+        return replayed
+
+    # --------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------
+
+    def add_flush_listener(self, callback):
+        """callback(user_ids) runs after each committed batch."""
+        self._listeners.append(callback)
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._replay()
+            self._open_spool()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def submit(self, event, user_id="default"):
+        """
+        Accept one event (dict with block_logs fields). Returns
+        immediately; raises ValueError for an invalid event.
+        """
+        self.submit_many([event], user_id)
+
+    def submit_many(self, events, user_id="default"):
+        """Accept a batch: all events are validated first, so it's all or nothing."""
+        records = [dict(zip(BLOCK_LOG_FIELDS, block_log_row(event, user_id))) for event in events]
+        if not records:
+            return
+
+        with self._cond:
+            if self._spool is None:
+                self._open_spool()
+            self._spool.write("".join(json.dumps(record) + "\n" for record in records))
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+
+            first = not self._pending
+            if first:
+                self._oldest = time.monotonic()
+            self._pending.extend(records)
+            self.submitted += len(records)
+            # Wake the flusher to start the delay clock, or when the batch is full
+            if first or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def flush(self):
+        """Write everything pending now. Returns the number of events written."""
+        with self._cond:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            self._oldest = None
+            segment = self._rotate_spool()
+            if segment:
+                self._segments.append(segment)
+            segments, self._segments = self._segments, []
+            if not self._stopping:
+                self._open_spool()
+
+        try:
+            self.writer(batch)
+            written, rest, error = batch, [], None
+        except Exception:
+            written, rest, error = self._write_each(batch)
+
+        if rest:
+            with self._cond:
+                # Put them back in front, the spool segments stay on disk
+                # (replaying the ones already written is a no-op, event_id)
+                self._pending = rest + self._pending
+                self._segments = segments + self._segments
+                self._oldest = time.monotonic()
+                self.failures += 1
+        else:
+            for path in segments:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        with self._cond:
+            self.flushed += len(written)
+            self.batches += 1
+
+        user_ids = {event["user_id"] for event in written}
+        if user_ids:
+            for callback in self._listeners:
+                try:
+                    callback(user_ids)
+                except Exception as e:
+                    print(f"Block buffer listener error: {e}")
+        if error is not None:
+            raise error
+        return len(written)
+
+    def _write_each(self, batch):
+        """
+        Write a batch that failed one event at a time. Returns (written,
+        rest, error): `rest` starts at the first event the database
+        itself failed on, events that failed on their data are dead-lettered.
+        """
+        written = []
+        for i, event in enumerate(batch):
+            try:
+                self.writer([event])
+            except Exception as e:
+                if not _is_data_error(e):
+                    return written, batch[i:], e
+                self._dead_letter(event, e)
+                with self._cond:
+                    self.dead_lettered += 1
+            else:
+                written.append(event)
+        return written, [], None
+
+    def _due_in(self):
+        """Seconds until the next flush is due (caller holds the lock)."""
+        if not self._pending:
+            return None
+        if len(self._pending) >= self.max_batch:
+            return 0
+        return max(0.0, self.max_delay - (time.monotonic() - self._oldest))
+
+    def _run(self):
+        retry_delay = 1.0
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    due_in = self._due_in()
+                    if due_in == 0:
+                        break
+                    self._cond.wait(due_in)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+                retry_delay = 1.0
+            except Exception as e:
+                print(f"⚠️  Block log flush failed, retrying in {retry_delay:.0f}s: {e}")
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 60.0)
+
+    def stop(self):
+        """Stop the flusher and write what's left (called on shutdown)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=10)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️  Could not flush block events on shutdown (kept in spool): {e}")
+        with self._cond:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "failures": self.failures,
+                "dead_lettered": self.dead_lettered,
+            }
@@ -0,0 +1,175 @@
+"""
+Weekly / monthly rollups of block_stats.
+
+block_stats has one row per (user, day, category). Two more tables keep
+the same counts per ISO week (keyed by the Monday) and per month
+("YYYY-MM"). Every logging path bumps all three in the same transaction
+(rollup_upserts), so a dashboard over months of history reads a few
+dozen rows instead of re-adding every day in Python.
+
+Queries for an arbitrary [start, end] range are planned here once and
+run by whichever driver the caller uses (sqlite3, psycopg2, asyncpg):
+- block_stats_queries() splits the range into whole buckets, read from
+  the rollup table, plus at most two partial edges read from the daily
+  table;
+- combine_block_stats() folds the result rows into buckets and totals.
+
+All SQL uses '?' placeholders; callers convert them for their driver.
+"""
+
+from collections import Counter
+from datetime import date, timedelta
+
+GRANULARITIES = ("day", "week", "month")
+
+# Same statement shape for all three tables; works on SQLite and Postgres
+_UPSERT_SQL = """
+    INSERT INTO {table} (user_id, {key}, category, blocks_count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id, {key}, category)
+    DO UPDATE SET blocks_count = {table}.blocks_count + excluded.blocks_count
+"""
+
+BUMP_DAILY_SQL = _UPSERT_SQL.format(table="block_stats", key="date")
+BUMP_WEEKLY_SQL = _UPSERT_SQL.format(table="block_stats_weekly", key="week_start")
+BUMP_MONTHLY_SQL = _UPSERT_SQL.format(table="block_stats_monthly", key="month")
+
+_TABLES = {
+    "day": ("block_stats", "date"),
+    "week": ("block_stats_weekly", "week_start"),
+    "month": ("block_stats_monthly", "month"),
+}
+
+
+# ============================================================
+# BUCKETS
+# ============================================================
+
+def week_start(day: str) -> str:
+    """Monday of the ISO week containing `day` (YYYY-MM-DD)."""
+    d = date.fromisoformat(day[:10])
+    return (d - timedelta(days=d.weekday())).isoformat()
+
+
+def month_key(day: str) -> str:
+    return day[:7]
+
+
+def bucket_key(granularity: str, day: str) -> str:
+    if granularity == "week":
+        return week_start(day)
+    if granularity == "month":
+        return month_key(day)
+    return day[:10]
+
+
+def rollup_upserts(daily_increments):
+    """
+    (sql, params_list) pairs that apply (user_id, date, category, count)
+    increments to the daily, weekly and monthly tables.
+    """
+    weekly = Counter()
+    monthly = Counter()
+    for user_id, day, category, count in daily_increments:
+        weekly[(user_id, week_start(day), category)] += count
+        monthly[(user_id, month_key(day), category)] += count
+    return [
+        (BUMP_DAILY_SQL, list(daily_increments)),
+        (BUMP_WEEKLY_SQL, [key + (count,) for key, count in weekly.items()]),
+        (BUMP_MONTHLY_SQL, [key + (count,) for key, count in monthly.items()]),
+    ]
+
+
+# ============================================================
+# RANGE QUERIES
+# ============================================================
+
+def _first_of_next_month(d: date) -> date:
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def _split_range(start: date, end: date, granularity: str):
+    """
+    -> ((first_key, last_key) of whole buckets or None, [(day_from, day_to), ...])
+    """
+    if granularity == "day":
+        return None, [(start, end)]
+
+    if granularity == "week":
+        full_start = start + timedelta(days=(7 - start.weekday()) % 7)
+        full_end = end - timedelta(days=(end.weekday() + 1) % 7)
+        keys = (full_start.isoformat(), (full_end - timedelta(days=6)).isoformat())
+    else:
+        full_start = start if start.day == 1 else _first_of_next_month(start)
+        next_month = _first_of_next_month(end)
+        full_end = end if next_month - timedelta(days=1) == end else end.replace(day=1) - timedelta(days=1)
+        keys = (full_start.isoformat()[:7], full_end.isoformat()[:7])
+
+    if full_start > full_end:
+        return None, [(start, end)]
+
+    edges = []
+    if start < full_start:
+        edges.append((start, full_start - timedelta(days=1)))
+    if full_end < end:
+        edges.append((full_end + timedelta(days=1), end))
+    return keys, edges
+
+
+def block_stats_queries(start: date, end: date, granularity: str = "day",
+                        user_id: str = None):
+    """List of (sql, params) whose rows are (key_or_date, category, blocks_count)."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if start > end:
+        start, end = end, start
+
+    user_filter = " AND user_id = ?" if user_id else ""
+    user_params = [user_id] if user_id else []
+
+    full, edges = _split_range(start, end, granularity)
+    queries = []
+    if full:
+        table, key = _TABLES[granularity]
+        queries.append((
+            f"SELECT {key}, category, SUM(blocks_count) FROM {table} "
+            f"WHERE {key} BETWEEN ? AND ?{user_filter} GROUP BY {key}, category",
+            [full[0], full[1]] + user_params
+        ))
+    for day_from, day_to in edges:
+        queries.append((
+            "SELECT date, category, SUM(blocks_count) FROM block_stats "
+            f"WHERE date BETWEEN ? AND ?{user_filter} GROUP BY date, category",
+            [day_from.isoformat(), day_to.isoformat()] + user_params
+        ))
+    return queries
+
+
+def combine_block_stats(results, granularity: str = "day"):
+    """
+    Fold the row lists returned for block_stats_queries() into
+    (rows, totals): rows = [(bucket, category, count)] newest first,
+    totals = {category: count}.
+    """
+    buckets = Counter()
+    for rows in results:
+        for key, category, count in rows:
+            buckets[(bucket_key(granularity, key), category)] += int(count or 0)
+
+    totals = Counter()
+    for (_, category), count in buckets.items():
+        totals[category] += count
+
+    rows = sorted(((bucket, category, count) for (bucket, category), count in buckets.items()),
+                  key=lambda row: (row[0], row[1]), reverse=True)
+    return rows, dict(totals)
+
+
+def resolve_range(days: int = 7, date_from: str = None, date_to: str = None):
+    """(start, end) dates from either ?days=N or ?from=&to= (ISO dates)."""
+    end = date.fromisoformat(date_to) if date_to else date.today()
+    if date_from:
+        start = date.fromisoformat(date_from)
+    else:
+        start = end - timedelta(days=days)
+    return start, end
@@ -0,0 +1,354 @@
+"""
+Connection pooling for the database layer.
+
+- PostgresPool keeps a bounded set of psycopg2 connections open so a
+  request doesn't pay a fresh TLS handshake to Neon every time.
+  Connections that sat idle for a while are health-checked on checkout,
+  and idle connections above the minimum are closed by a reaper thread.
+
+- SQLitePool keeps a few sqlite3 connections (WAL journal, so readers
+  don't block the writer) that threads check out and hand back.
+
+Both hand out PooledConnection wrappers. Calling close() on the wrapper
+returns the connection to the pool instead of closing it, so the usual
+`conn = get_connection() ... conn.close()` pattern keeps working.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became available within the checkout timeout."""
+
+
+# ============================================================
+# CONNECTION WRAPPER
+# ============================================================
+
+class PooledConnection:
+    """Proxy around a DB-API connection that releases instead of closing."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise AttributeError(f"connection already returned to pool ({name})")
+        return getattr(raw, name)
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def close(self):
+        """Give the connection back to the pool. Safe to call twice."""
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Unlike sqlite3's own context manager this also hands the
+        # connection back, so `with get_connection() as conn:` is a
+        # complete unit of work.
+        try:
+            if self._raw is not None:
+                if exc_type is None:
+                    self._raw.commit()
+                else:
+                    self._raw.rollback()
+        finally:
+            self.close()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# ============================================================
+# POSTGRES
+# ============================================================
+
+class PostgresPool:
+    """
+    Thread-safe bounded pool of psycopg2 connections.
+
+    minconn connections are kept open even when idle, at most maxconn
+    exist at once. A checkout waits up to checkout_timeout seconds for
+    a free connection before raising PoolTimeout.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, idle_timeout=300,
+                 checkout_timeout=30, healthcheck_after=30):
+        import psycopg2
+
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"invalid pool size min={minconn} max={maxconn}")
+
+        self._psycopg2 = psycopg2
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.healthcheck_after = healthcheck_after
+
+        # Idle connections as (conn, last_used). Used LIFO so hot
+        # connections get reused and cold ones sink to the left where
+        # the reaper finds them.
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.created = 0
+        self.discarded = 0
+        self.checkouts = 0
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        self._reaper.start()
+
+    def _connect(self):
+        conn = self._psycopg2.connect(self.dsn)
+        self.created += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.healthcheck_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def connection(self):
+        deadline = time.monotonic() + self.checkout_timeout
+
+        while True:
+            conn = None
+            last_used = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("connection pool is closed")
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"no database connection free after {self.checkout_timeout}s "
+                            f"(max {self.maxconn})"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                # We reserved a slot above, open the connection outside the lock
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn, time.monotonic() - last_used):
+                self._discard(conn)
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                continue
+
+            self.checkouts += 1
+            return PooledConnection(self, conn)
+
+    def release(self, conn):
+        healthy = not conn.closed
+        if healthy:
+            try:
+                # Never hand out a connection with a transaction left open
+                conn.rollback()
+            except Exception:
+                healthy = False
+
+        with self._cond:
+            if healthy and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._size -= 1
+                self._discard(conn)
+            self._cond.notify()
+
+    def _reap_loop(self):
+        interval = max(1.0, self.idle_timeout / 2)
+        while True:
+            time.sleep(interval)
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                expired = []
+                while (self._idle and self._size > self.minconn
+                       and now - self._idle[0][1] >= self.idle_timeout):
+                    expired.append(self._idle.popleft()[0])
+                    self._size -= 1
+            for conn in expired:
+                self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "backend": "postgres",
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min": self.minconn,
+                "max": self.maxconn,
+                "created": self.created,
+                "discarded": self.discarded,
+                "checkouts": self.checkouts,
+            }
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+
+# ============================================================
+# SQLITE
+# ============================================================
+
+class SQLitePool:
+    """
+    Reusable sqlite3 connections, checked out and returned.
+
+    A thread gets a connection from the idle stack (or a new one) on its
+    outermost checkout and hands it back on the matching release, so
+    short-lived threads (Flask's dev server runs every request on a new
+    one) don't each leave a connection behind. At most `max_idle`
+    connections are kept open between checkouts, extra ones are closed.
+    WAL lets the watcher thread write while API threads read.
+
+    Nested checkouts on one thread share the outer connection and its
+    transaction: an inner commit() also commits whatever the outer
+    caller wrote so far, and only the outermost release rolls back an
+    unfinished transaction.
+    """
+
+    def __init__(self, path, busy_timeout=5.0, max_idle=4):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._idle = deque()
+        self._in_use = 0
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.opened = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self.opened += 1
+        return conn
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+                self._in_use += 1
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._in_use -= 1
+                    raise
+            self._local.conn = conn
+            self._local.depth = 0
+        self._local.depth += 1
+        self.checkouts += 1
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        if getattr(self._local, "conn", None) is not conn:
+            return  # not this thread's checkout (e.g. a wrapper collected elsewhere)
+        depth = self._local.depth - 1
+        self._local.depth = max(depth, 0)
+        if depth > 0:
+            return
+        self._local.conn = None
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            conn.close()
+            conn = None
+        with self._lock:
+            self._in_use -= 1
+            if conn is not None and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            idle, in_use = len(self._idle), self._in_use
+        return {
+            "backend": "sqlite",
+            "size": idle + in_use,
+            "idle": idle,
+            "in_use": in_use,
+            "journal_mode": "wal",
+            "checkouts": self.checkouts,
+            "opened": self.opened,
+        }
+
+    def closeall(self):
+        with self._lock:
+            conns, self._idle = list(self._idle), deque()
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
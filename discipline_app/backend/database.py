@@ -10,19 +10,40 @@ Database layer with dual support:
 
 All queries are written once with '?' placeholders and converted
 to '%s' automatically for Postgres.
+
+This is the one data layer for main.py, backend_api.py and the
+desktop monitor (addiction_monitor.py / sync_agent.py): one schema
+(migrations.py), rows mapped to the models in models.py, and every
+statement kept as a constant here, so a query or its index is tuned in
+one place. Repeated statements hit each connection's prepared
+statement cache (sqlite3 keeps one per connection).
+
+Connections come from a pool (see connection_pool.py), so
+get_connection() is cheap and conn.close() just hands it back.
+Pool size is tuned with DB_POOL_MIN / DB_POOL_MAX /
+DB_POOL_IDLE_TIMEOUT / DB_POOL_CHECKOUT_TIMEOUT /
+DB_POOL_HEALTHCHECK_AFTER (seconds).
 """
 
 import os
-import sqlite3
+import threading
 from datetime import date, time
-from models import Routine
+from models import BlockEvent, RecurringRoutine, RoutineCompletion, Routine
+from connection_pool import PostgresPool, SQLitePool
+from migrations import migrate
+from block_events import (
+    block_log_row, block_stats_increments, new_event_id, normalize_timestamp,
+    INSERT_BLOCK_LOG_SQL,
+)
+from block_rollups import (
+    BUMP_DAILY_SQL, rollup_upserts, block_stats_queries, combine_block_stats, resolve_range
+)
 
 DB_NAME = "discipline.db"
 DATABASE_URL = os.environ.get("DATABASE_URL")
 USE_POSTGRES = bool(DATABASE_URL)
 
 if USE_POSTGRES:
-    import psycopg2
     print("🐘 Database: PostgreSQL (persistent cloud storage)")
 else:
     print("📁 Database: SQLite (local development)")
@@ -32,10 +53,42 @@ else:
 # CONNECTION HELPERS
 # ============================================================
 
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Create the connection pool on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if USE_POSTGRES:
+                    _pool = PostgresPool(
+                        DATABASE_URL,
+                        minconn=int(os.environ.get("DB_POOL_MIN", 1)),
+                        maxconn=int(os.environ.get("DB_POOL_MAX", 10)),
+                        idle_timeout=float(os.environ.get("DB_POOL_IDLE_TIMEOUT", 300)),
+                        checkout_timeout=float(os.environ.get("DB_POOL_CHECKOUT_TIMEOUT", 30)),
+                        healthcheck_after=float(os.environ.get("DB_POOL_HEALTHCHECK_AFTER", 30)),
+                    )
+                else:
+                    _pool = SQLitePool(DB_NAME)
+    return _pool
+
+
 def get_connection():
-    if USE_POSTGRES:
-        return psycopg2.connect(DATABASE_URL)
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
+    """Check a connection out of the pool. close() returns it."""
+    return get_pool().connection()
+
+
+def close_pool():
+    """Close every pooled connection (called on app shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
 
 
 def _q(query: str) -> str:
@@ -48,60 +101,12 @@ def _q(query: str) -> str:
 # ============================================================
 
 def init_db():
+    """Bring the schema up to date (see migrations.py)."""
     conn = get_connection()
-    cursor = conn.cursor()
-
-    id_column = "SERIAL PRIMARY KEY" if USE_POSTGRES else "INTEGER PRIMARY KEY"
-
-    cursor.execute(f"""
-    CREATE TABLE IF NOT EXISTS routines (
-        id {id_column},
-        title TEXT,
-        routine_date TEXT,
-        routine_time TEXT,
-        status TEXT,
-        reminder_sent INTEGER,
-        personality TEXT,
-        streak INTEGER,
-        failures INTEGER,
-        user_id TEXT DEFAULT 'default'
-    )
-    """)
-
-    cursor.execute(f"""
-    CREATE TABLE IF NOT EXISTS block_logs (
-        id {id_column},
-        user_id TEXT,
-        category TEXT NOT NULL,
-        url TEXT,
-        title TEXT,
-        timestamp TEXT NOT NULL,
-        audio_type TEXT
-    )
-    """)
-
-    cursor.execute(f"""
-    CREATE TABLE IF NOT EXISTS block_stats (
-        id {id_column},
-        user_id TEXT,
-        date TEXT NOT NULL,
-        category TEXT NOT NULL,
-        blocks_count INTEGER DEFAULT 0,
-        UNIQUE(user_id, date, category)
-    )
-    """)
-
-    # SQLite migration: add user_id to old local databases if missing
-    if not USE_POSTGRES:
-        try:
-            cursor.execute("ALTER TABLE routines ADD COLUMN user_id TEXT DEFAULT 'default'")
-            print("✅ Added user_id column to routines table")
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" not in str(e):
-                print(f"⚠️  Migration note: {e}")
-
-    conn.commit()
-    conn.close()
+    try:
+        migrate(conn, USE_POSTGRES)
+    finally:
+        conn.close()
     print("✅ Database tables ready")
 
 
@@ -109,16 +114,14 @@ def init_db():
 # ROUTINES
 # ============================================================
 
-def insert_routine(routine: Routine):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(_q("""
-        INSERT INTO routines (
-            title, routine_date, routine_time, status,
-            reminder_sent, personality, streak, failures, user_id
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """), (
+INSERT_ROUTINE_COLUMNS = (
+    "title, routine_date, routine_time, status, "
+    "reminder_sent, personality, streak, failures, user_id"
+)
+
+
+def _routine_params(routine: Routine):
+    return (
         routine.title,
         routine.routine_date.isoformat(),
         routine.routine_time.strftime("%H:%M"),
@@ -128,9 +131,77 @@ def insert_routine(routine: Routine):
         routine.streak,
         routine.failures,
         routine.user_id if hasattr(routine, 'user_id') else 'default'
-    ))
-    conn.commit()
-    conn.close()
+    )
+
+
+def insert_routine(routine: Routine) -> int:
+    """Insert a routine and return its new id."""
+    return insert_routines([routine])[0]
+
+
+def insert_routines(routines) -> list:
+    """
+    Insert many routines in one transaction and return their new ids,
+    in the same order as the input.
+
+    Postgres sends them as multi-row INSERT ... VALUES statements
+    (execute_values, 500 rows per statement); SQLite runs the inserts
+    on one connection and commits once.
+    """
+    rows = [_routine_params(r) for r in routines]
+    if not rows:
+        return []
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        if USE_POSTGRES:
+            from psycopg2.extras import execute_values
+            returned = execute_values(
+                cursor,
+                f"INSERT INTO routines ({INSERT_ROUTINE_COLUMNS}) VALUES %s RETURNING id",
+                rows,
+                page_size=500,
+                fetch=True,
+            )
+            # SERIAL hands out ids in row order within a statement
+            ids = sorted(row[0] for row in returned)
+        else:
+            ids = []
+            for row in rows:
+                cursor.execute(
+                    f"INSERT INTO routines ({INSERT_ROUTINE_COLUMNS}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+                ids.append(cursor.lastrowid)
+        conn.commit()
+    finally:
+        conn.close()
+    return ids
+
+
+ROUTINE_COLUMNS = (
+    "id, title, routine_date, routine_time, status, "
+    "reminder_sent, personality, streak, failures, user_id"
+)
+
+
+def _row_to_routine(row) -> Routine:
+    routine = Routine(
+        id=row[0],
+        title=row[1],
+        routine_date=date.fromisoformat(row[2]),
+        routine_time=time.fromisoformat(row[3]),
+        status=row[4],
+        reminder_sent=bool(row[5]),
+        personality=row[6],
+        streak=row[7],
+        failures=row[8],
+        user_id=row[9] if row[9] else "default"
+    )
+    routine.mark_clean()
+    return routine
 
 
 def get_all_routines(user_id: str = None):
@@ -139,60 +210,155 @@ def get_all_routines(user_id: str = None):
 
     if user_id:
         cursor.execute(_q(
-            "SELECT id, title, routine_date, routine_time, status, "
-            "reminder_sent, personality, streak, failures, user_id "
-            "FROM routines WHERE user_id = ?"
+            f"SELECT {ROUTINE_COLUMNS} FROM routines WHERE user_id = ?"
         ), (user_id,))
     else:
-        cursor.execute(
-            "SELECT id, title, routine_date, routine_time, status, "
-            "reminder_sent, personality, streak, failures, user_id "
-            "FROM routines"
-        )
+        cursor.execute(f"SELECT {ROUTINE_COLUMNS} FROM routines")
 
     rows = cursor.fetchall()
     conn.close()
 
-    routines = []
-    for row in rows:
-        routines.append(
-            Routine(
-                id=row[0],
-                title=row[1],
-                routine_date=date.fromisoformat(row[2]),
-                routine_time=time.fromisoformat(row[3]),
-                status=row[4],
-                reminder_sent=bool(row[5]),
-                personality=row[6],
-                streak=row[7],
-                failures=row[8],
-                user_id=row[9] if row[9] else "default"
-            )
-        )
-    return routines
+    return [_row_to_routine(row) for row in rows]
 
 
-def update_routine(routine: Routine):
+def get_pending_routines():
+    """All routines still waiting for a reminder or a miss (used by the scheduler)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {ROUTINE_COLUMNS} FROM routines WHERE status = 'pending'")
+    rows = cursor.fetchall()
+    conn.close()
+    return [_row_to_routine(row) for row in rows]
+
+
+def get_routine_by_id(routine_id: int):
+    """Primary-key lookup. Returns None if the routine doesn't exist."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q(f"SELECT {ROUTINE_COLUMNS} FROM routines WHERE id = ?"), (routine_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return _row_to_routine(row) if row else None
+
+
+def get_routines_by_ids(routine_ids):
+    """Load just the given routines. Missing ids are silently skipped."""
+    routine_ids = list(routine_ids)
+    if not routine_ids:
+        return []
+
+    placeholders = ", ".join("?" for _ in routine_ids)
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute(_q("""
-        UPDATE routines
-        SET status = ?, reminder_sent = ?, streak = ?, failures = ?
-        WHERE id = ?
-    """), (
+    cursor.execute(_q(
+        f"SELECT {ROUTINE_COLUMNS} FROM routines WHERE id IN ({placeholders})"
+    ), routine_ids)
+    rows = cursor.fetchall()
+    conn.close()
+    return [_row_to_routine(row) for row in rows]
+
+
+UPDATE_ROUTINE_SQL = """
+    UPDATE routines
+    SET status = ?, reminder_sent = ?, streak = ?, failures = ?
+    WHERE id = ?
+"""
+
+
+def _routine_update_params(routine: Routine):
+    return (
         routine.status,
         int(routine.reminder_sent),
         routine.streak,
         routine.failures,
         routine.id
-    ))
+    )
+
+
+def update_routine(routine: Routine):
+    """Write a routine's status fields back, whether or not they changed."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q(UPDATE_ROUTINE_SQL), _routine_update_params(routine))
     conn.commit()
     conn.close()
+    routine.mark_clean()
 
 
-def update_routine_details(routine_id: int, title=None, routine_date=None,
-                           routine_time=None, personality=None):
-    """Update the editable fields of a routine. Returns True if a row changed."""
+# Only applies if nobody changed the status or sent the reminder since we
+# loaded the row, so the watcher can't turn a routine that was just
+# completed into "missed", and two readers can't both announce a reminder
+UPDATE_ROUTINE_IF_UNCHANGED_SQL = UPDATE_ROUTINE_SQL + " AND status = ? AND reminder_sent = ?"
+
+
+def _routine_guarded_update_params(routine: Routine):
+    return _routine_update_params(routine) + (
+        routine.saved_status,
+        int(bool(routine.saved_reminder_sent)),
+    )
+
+
+def update_routines(routines) -> list:
+    """
+    Persist only the routines whose status fields changed since they were
+    loaded, all in one transaction. Rows whose status or reminder flag
+    was changed by someone else in the meantime are left alone. Returns the routines
+    that were actually written; only those are marked clean, so callers
+    announce nothing the database didn't accept.
+    """
+    dirty = [r for r in routines if r.id is not None and r.is_dirty()]
+    if not dirty:
+        return []
+
+    # One statement per row (same connection and transaction) so each
+    # row's rowcount tells whether the guard matched. Sorted by user so
+    # concurrent batches lock the per-user change counters (migration 9)
+    # in the same order
+    dirty.sort(key=lambda r: (r.user_id or "", r.id))
+    written = []
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        for routine in dirty:
+            cursor.execute(_q(UPDATE_ROUTINE_IF_UNCHANGED_SQL),
+                           _routine_guarded_update_params(routine))
+            if cursor.rowcount:
+                written.append(routine)
+        conn.commit()
+    finally:
+        conn.close()
+
+    for routine in written:
+        routine.mark_clean()
+    return written
+
+
+COMPLETE_ROUTINE_SQL = f"""
+    UPDATE routines
+    SET status = 'done', streak = streak + 1
+    WHERE id = ? AND status <> 'missed'
+    RETURNING {ROUTINE_COLUMNS}
+"""
+
+
+def complete_routine(routine_id: int):
+    """
+    Mark a routine done and bump its streak in a single statement, unless
+    it was already missed. Returns the updated routine, or None if it
+    doesn't exist or is missed (use get_routine_by_id to tell which).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q(COMPLETE_ROUTINE_SQL), (routine_id,))
+    row = cursor.fetchone()
+    conn.commit()
+    conn.close()
+    return _row_to_routine(row) if row else None
+
+
+def _routine_details_update(routine_id: int, title=None, routine_date=None,
+                            routine_time=None, personality=None):
+    """Build the UPDATE for update_routine_details, or None if nothing to set."""
     fields = []
     values = []
     if title is not None:
@@ -209,12 +375,24 @@ def update_routine_details(routine_id: int, title=None, routine_date=None,
         values.append(personality)
 
     if not fields:
-        return False
+        return None
 
     values.append(routine_id)
+    return f"UPDATE routines SET {', '.join(fields)} WHERE id = ?", values
+
+
+def update_routine_details(routine_id: int, title=None, routine_date=None,
+                           routine_time=None, personality=None):
+    """Update the editable fields of a routine. Returns True if a row changed."""
+    update = _routine_details_update(routine_id, title, routine_date,
+                                     routine_time, personality)
+    if update is None:
+        return False
+
+    sql, values = update
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute(_q(f"UPDATE routines SET {', '.join(fields)} WHERE id = ?"), values)
+    cursor.execute(_q(sql), values)
     conn.commit()
     changed = cursor.rowcount > 0
     conn.close()
@@ -232,79 +410,330 @@ def delete_routine_by_id(routine_id: int):
     return deleted
 
 
+# Delta sync: routines changed and deleted after a client's cursor,
+# oldest first. change_seq and the tombstones are maintained by
+# triggers (migration 5). One UNION ALL statement so both halves come
+# from the same snapshot; tombstone rows are padded with NULLs.
+_TOMBSTONE_PADDING = ", ".join(["routine_id"] + ["NULL"] * (len(ROUTINE_COLUMNS.split(",")) - 1))
+
+ROUTINE_CHANGES_SQL = f"""
+    SELECT change_seq, 0, {ROUTINE_COLUMNS} FROM routines
+    WHERE user_id = ? AND change_seq > ?
+    UNION ALL
+    SELECT change_seq, 1, {_TOMBSTONE_PADDING} FROM routine_tombstones
+    WHERE user_id = ? AND change_seq > ?
+    ORDER BY 1 LIMIT ?
+"""
+
+
+def _routine_changes_params(user_id: str, since: int, limit: int):
+    # One extra row tells us whether there's another page
+    return (user_id, since, user_id, since, limit + 1)
+
+
+def _routine_changes(rows, since: int, limit: int):
+    """
+    Page of ROUTINE_CHANGES_SQL rows ->
+    {"changed": [Routine], "deleted": [id], "cursor": int, "has_more": bool}
+    """
+    page = [tuple(row) for row in rows[:limit]]
+    return {
+        "changed": [_row_to_routine(row[2:]) for row in page if not row[1]],
+        "deleted": [row[2] for row in page if row[1]],
+        "cursor": page[-1][0] if page else since,
+        "has_more": len(rows) > limit,
+    }
+
+
+def get_routine_changes(user_id: str, since: int = 0, limit: int = 500):
+    """Routines created/modified and ids deleted after `since` (a change_seq cursor)."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(_q(ROUTINE_CHANGES_SQL), _routine_changes_params(user_id, since, limit))
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+    return _routine_changes(rows, since, limit)
+
+
 # ============================================================
 # ADDICTION MONITORING (cloud logging from mobile)
 # ============================================================
 
+# Daily counter upsert (block_rollups.py also keeps the weekly and
+# monthly tables in step; SQLite accepts the table-qualified column too)
+BUMP_BLOCK_STATS_SQL = BUMP_DAILY_SQL
+
+
+def _block_timestamp(timestamp: str = None) -> str:
+    return normalize_timestamp(timestamp)
+
+
 def log_block(user_id: str, category: str, url: str = "",
               title: str = "", audio_type: str = "warning",
               timestamp: str = None):
-    """Log a block attempt and bump the daily counter."""
-    from datetime import datetime
-    ts = timestamp or datetime.now().isoformat()
+    """Log a block attempt and bump the daily/weekly/monthly counters."""
+    ts = _block_timestamp(timestamp)
     today = ts[:10]  # YYYY-MM-DD
 
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute(_q("""
-        INSERT INTO block_logs (user_id, category, url, title, timestamp, audio_type)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """), (user_id, category, url, title, ts, audio_type))
-
-    if USE_POSTGRES:
-        cursor.execute("""
-            INSERT INTO block_stats (user_id, date, category, blocks_count)
-            VALUES (%s, %s, %s, 1)
-            ON CONFLICT (user_id, date, category)
-            DO UPDATE SET blocks_count = block_stats.blocks_count + 1
-        """, (user_id, today, category))
-    else:
-        cursor.execute("""
-            INSERT INTO block_stats (user_id, date, category, blocks_count)
-            VALUES (?, ?, ?, 1)
-            ON CONFLICT(user_id, date, category)
-            DO UPDATE SET blocks_count = blocks_count + 1
-        """, (user_id, today, category))
+    row = (user_id, category, url, title, ts, audio_type, new_event_id())
+    cursor.execute(_q(INSERT_BLOCK_LOG_SQL), row)
+    for sql, params in rollup_upserts([(user_id, today, category, 1)]):
+        cursor.execute(_q(sql), params[0])
 
     conn.commit()
     conn.close()
 
 
+def log_blocks(events, user_id: str = "default") -> int:
+    """
+    Log a batch of block events (e.g. flushed by a phone that was
+    offline) in one transaction: one multi-row INSERT into block_logs,
+    then one UPSERT per (user, date, category) with the summed count,
+    and the same for the weekly and monthly rollups.
+    `user_id` is used for events that don't carry their own. Events
+    whose event_id was already logged are skipped (see block_events.py).
+    Returns the number of events written.
+    """
+    rows = [block_log_row(event, user_id) for event in events]
+    if not rows:
+        return 0
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        if USE_POSTGRES:
+            from psycopg2.extras import execute_values, execute_batch
+            inserted = execute_values(
+                cursor,
+                "INSERT INTO block_logs (user_id, category, url, title, timestamp, audio_type, event_id) "
+                "VALUES %s ON CONFLICT (event_id) DO NOTHING "
+                "RETURNING user_id, category, url, title, timestamp, audio_type, event_id",
+                rows,
+                page_size=1000,
+                fetch=True,
+            )
+            for sql, params in rollup_upserts(block_stats_increments(inserted)):
+                execute_batch(cursor, _q(sql), params, page_size=200)
+        else:
+            inserted = []
+            for row in rows:
+                cursor.execute(INSERT_BLOCK_LOG_SQL, row)
+                if cursor.rowcount:
+                    inserted.append(row)
+            for sql, params in rollup_upserts(block_stats_increments(inserted)):
+                cursor.executemany(sql, params)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(inserted)
+
+
+def get_block_stats(start, end, granularity: str = "day", user_id: str = None):
+    """
+    Block counts for [start, end] (dates) bucketed by day, week or month:
+    (rows [(bucket, category, count)] newest first, totals {category: count}).
+    Whole weeks/months come from the rollup tables, only the edges from
+    the daily table.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        results = []
+        for sql, params in block_stats_queries(start, end, granularity, user_id):
+            cursor.execute(_q(sql), params)
+            results.append(cursor.fetchall())
+    finally:
+        conn.close()
+    return combine_block_stats(results, granularity)
+
+
 def get_block_stats_rows(days: int = 7, user_id: str = None):
     """Return (date, category, blocks_count) rows for the last N days."""
+    start, end = resolve_range(days)
+    rows, _ = get_block_stats(start, end, "day", user_id)
+    return rows
+
+
+# ============================================================
+# RECURRING ROUTINES (weekly routines of backend_api.py)
+# ============================================================
+
+RECURRING_ROUTINE_COLUMNS = "id, user_id, title, description, time, days, active, created_at"
+
+GET_RECURRING_ROUTINES_SQL = f"""
+    SELECT {RECURRING_ROUTINE_COLUMNS} FROM recurring_routines
+    WHERE user_id = ? AND active = 1
+    ORDER BY time
+"""
+
+INSERT_RECURRING_ROUTINE_SQL = """
+    INSERT INTO recurring_routines (user_id, title, description, time, days, active, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    RETURNING id
+"""
+
+# Active routines nobody completed since `since` (the reminder job)
+OPEN_RECURRING_ROUTINES_SQL = f"""
+    SELECT {RECURRING_ROUTINE_COLUMNS} FROM recurring_routines
+    WHERE active = 1 AND id NOT IN (
+        SELECT routine_id FROM routine_completions WHERE completed_at >= ?
+    )
+"""
+
+ROUTINE_COMPLETIONS_SQL = """
+    SELECT rc.routine_id, r.title, rc.completed_at
+    FROM routine_completions rc
+    JOIN recurring_routines r ON rc.routine_id = r.id
+    WHERE r.user_id = ? AND rc.completed_at >= ?
+    ORDER BY rc.completed_at DESC
+"""
+
+
+def _row_to_recurring_routine(row) -> RecurringRoutine:
+    return RecurringRoutine(
+        id=row[0],
+        user_id=row[1],
+        title=row[2],
+        description=row[3] or "",
+        time=row[4],
+        days=row[5],
+        active=bool(row[6]),
+        created_at=row[7]
+    )
+
+
+def get_recurring_routines(user_id: str = "default"):
     conn = get_connection()
     cursor = conn.cursor()
+    cursor.execute(_q(GET_RECURRING_ROUTINES_SQL), (user_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [_row_to_recurring_routine(row) for row in rows]
 
-    if USE_POSTGRES:
-        if user_id:
-            cursor.execute("""
-                SELECT date, category, blocks_count FROM block_stats
-                WHERE date >= (CURRENT_DATE - %s * INTERVAL '1 day')::date::text
-                  AND user_id = %s
-                ORDER BY date DESC
-            """, (days, user_id))
-        else:
-            cursor.execute("""
-                SELECT date, category, blocks_count FROM block_stats
-                WHERE date >= (CURRENT_DATE - %s * INTERVAL '1 day')::date::text
-                ORDER BY date DESC
-            """, (days,))
-    else:
-        if user_id:
-            cursor.execute("""
-                SELECT date, category, blocks_count FROM block_stats
-                WHERE date >= date('now', '-' || ? || ' days')
-                  AND user_id = ?
-                ORDER BY date DESC
-            """, (days, user_id))
-        else:
-            cursor.execute("""
-                SELECT date, category, blocks_count FROM block_stats
-                WHERE date >= date('now', '-' || ? || ' days')
-                ORDER BY date DESC
-            """, (days,))
 
-    results = cursor.fetchall()
+def get_open_recurring_routines(since: str):
+    """Active recurring routines without a completion at or after `since`."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q(OPEN_RECURRING_ROUTINES_SQL), (since,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [_row_to_recurring_routine(row) for row in rows]
+
+
+def insert_recurring_routine(routine: RecurringRoutine) -> int:
+    """Insert a recurring routine and return its new id."""
+    from datetime import datetime
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q(INSERT_RECURRING_ROUTINE_SQL), (
+        routine.user_id, routine.title, routine.description, routine.time,
+        routine.days, int(routine.active), routine.created_at or datetime.now().isoformat()
+    ))
+    routine_id = cursor.fetchone()[0]
+    conn.commit()
+    conn.close()
+    return routine_id
+
+
+def deactivate_recurring_routine(routine_id: int) -> bool:
+    """Soft delete (completion history keeps pointing at it)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q("UPDATE recurring_routines SET active = 0 WHERE id = ?"), (routine_id,))
+    conn.commit()
+    updated = cursor.rowcount > 0
+    conn.close()
+    return updated
+
+
+def complete_recurring_routine(routine_id: int, completed_at: str = None):
+    """Record a completion. Returns the routine's user_id (None if it doesn't exist)."""
+    from datetime import datetime
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q("INSERT INTO routine_completions (routine_id, completed_at) VALUES (?, ?)"),
+                   (routine_id, completed_at or datetime.now().isoformat()))
+    cursor.execute(_q("SELECT user_id FROM recurring_routines WHERE id = ?"), (routine_id,))
+    owner = cursor.fetchone()
+    conn.commit()
+    conn.close()
+    return owner[0] if owner else None
+
+
+def get_routine_completions(user_id: str, since: str):
+    """Completions of the user's recurring routines at or after `since`, newest first."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q(ROUTINE_COMPLETIONS_SQL), (user_id, since))
+    rows = cursor.fetchall()
+    conn.close()
+    return [RoutineCompletion(routine_id=row[0], title=row[1], completed_at=row[2])
+            for row in rows]
+
+
+# ============================================================
+# CLOUD SYNC STATE (desktop monitor, see sync_agent.py)
+# ============================================================
+
+BLOCK_LOGS_AFTER_SQL = """
+    SELECT id, category, url, title, timestamp, audio_type, event_id
+    FROM block_logs
+    WHERE user_id = ? AND id > ?
+    ORDER BY id
+    LIMIT ?
+"""
+
+SET_SYNC_MARK_SQL = """
+    INSERT INTO sync_state (name, value) VALUES (?, ?)
+    ON CONFLICT (name) DO UPDATE SET value = excluded.value
+"""
+
+
+def get_block_events_after(user_id: str, after_id: int, limit: int):
+    """
+    The user's next `limit` block_logs rows after `after_id` as
+    (id, BlockEvent) pairs. Other users' rows in a shared database
+    (e.g. logged through a local backend_api) are not the monitor's to sync.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q(BLOCK_LOGS_AFTER_SQL), (user_id, after_id, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [(row[0], BlockEvent(category=row[1], url=row[2] or "", title=row[3] or "",
+                                timestamp=row[4], audio_type=row[5] or "warning",
+                                event_id=row[6]))
+            for row in rows]
+
+
+def count_block_logs_after(user_id: str, after_id: int) -> int:
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q("SELECT COUNT(*) FROM block_logs WHERE user_id = ? AND id > ?"),
+                   (user_id, after_id))
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+
+def get_sync_mark(name: str) -> int:
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q("SELECT value FROM sync_state WHERE name = ?"), (name,))
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+
+def set_sync_mark(name: str, value: int):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(_q(SET_SYNC_MARK_SQL), (name, value))
+    conn.commit()
     conn.close()
-    return results
\ No newline at end of file
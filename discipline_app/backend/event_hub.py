@@ -0,0 +1,110 @@
+"""
+In-process pub/sub for pushing routine events to connected clients
+(the /ws WebSocket and /events SSE endpoints in main.py).
+
+Each connection subscribes for one user_id and gets its own bounded
+asyncio.Queue; publish() fans an event out to that user's queues only.
+publish() is safe to call from any thread (the reminder scheduler runs
+in its own), it hops onto the event loop with call_soon_threadsafe.
+
+Every event gets an increasing id and the last EVENT_REPLAY_SIZE events
+per user are kept, so a client that reconnects with Last-Event-ID (SSE)
+or ?last_event_id= (WebSocket) gets what it missed while offline.
+A client too slow to drain its queue loses the oldest events rather
+than blocking everyone else.
+"""
+
+import asyncio
+import itertools
+import os
+from collections import deque
+from datetime import datetime
+
+QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", 100))
+REPLAY_SIZE = int(os.environ.get("EVENT_REPLAY_SIZE", 50))
+
+
+class EventHub:
+    def __init__(self, queue_size=QUEUE_SIZE, replay_size=REPLAY_SIZE):
+        self.queue_size = queue_size
+        self.replay_size = replay_size
+        self._loop = None
+        self._subscribers = {}    # user_id -> set of queues
+        self._recent = {}         # user_id -> deque of recent events
+        self._ids = itertools.count(1)
+
+        self.published = 0
+        self.dropped = 0
+
+    def bind(self, loop=None):
+        """Remember the loop subscribers live on (call at startup)."""
+        self._loop = loop or asyncio.get_running_loop()
+
+    # --------------------------------------------------------
+    # Publishing
+    # --------------------------------------------------------
+
+    def publish(self, user_id, event_type, data=None):
+        """Queue an event for every connection of `user_id`. Any thread."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        event = {
+            "type": event_type,
+            "user_id": user_id or "default",
+            "data": data or {},
+            "time": datetime.now().isoformat(),
+        }
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(event)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event):
+        event["id"] = next(self._ids)
+        user_id = event["user_id"]
+        recent = self._recent.setdefault(user_id, deque(maxlen=self.replay_size))
+        recent.append(event)
+        self.published += 1
+
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    # --------------------------------------------------------
+    # Subscribing (on the event loop)
+    # --------------------------------------------------------
+
+    def subscribe(self, user_id, last_event_id=None):
+        """New queue for `user_id`, pre-filled with events after last_event_id."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if last_event_id is not None:
+            for event in self._recent.get(user_id, ()):
+                if event["id"] > last_event_id and not queue.full():
+                    queue.put_nowait(event)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def stats(self):
+        return {
+            "users": len(self._subscribers),
+            "connections": sum(len(q) for q in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+event_hub = EventHub()
@@ -1,32 +1,5 @@
 import threading
-import time
 from datetime import datetime, timedelta
-from database import get_all_routines
-from database import update_routine
-import platform
-
-# Only import TTS on Windows (for PC monitoring)
-# On cloud servers, reminders will be handled by push notifications
-IS_WINDOWS = platform.system() == 'Windows'
-
-if IS_WINDOWS:
-    try:
-        from tts import speak_background
-        TTS_AVAILABLE = True
-        print("✅ TTS available (Windows)")
-    except ImportError:
-        print("⚠️  TTS not available")
-        TTS_AVAILABLE = False
-        def speak_background(text, personality='default'):
-            """Dummy function for when TTS is not available"""
-            print(f"[TTS MOCK] Would speak: {text}")
-else:
-    TTS_AVAILABLE = False
-    print("ℹ️  TTS disabled (cloud deployment - use push notifications)")
-    def speak_background(text, personality='default'):
-        """Dummy function for cloud deployment"""
-        print(f"[TTS MOCK - Cloud] Would speak: {text}")
-        # TODO: Send push notification to mobile app instead
 
 
 def routine_datetime_local(routine):
@@ -35,10 +8,26 @@ def routine_datetime_local(routine):
     return datetime.combine(routine.routine_date, routine.routine_time)
 
 
+def next_deadline(routine, now=None):
+    """
+    When does this routine next need evaluate_routine_status()?
+    Returns the reminder time while a reminder can still be sent, then
+    the miss time, or None once the routine is no longer pending.
+    """
+    if routine.status != "pending":
+        return None
+    now = now or datetime.now()
+    routine_time = routine_datetime_local(routine)
+    if not routine.reminder_sent and now < routine_time:
+        return routine_time - timedelta(minutes=routine.reminder_minutes_before)
+    return routine_time + timedelta(minutes=routine.grace_minutes_after)
+
+
 def evaluate_routine_status(routine):
     """
     Evaluate and update routine status based on current time.
-    Returns the updated routine object.
+    Returns the updated routine object. Nothing is written here: callers
+    persist the changed ones with database.update_routines().
     """
     now = datetime.now()
     routine_time = datetime.combine(routine.routine_date, routine.routine_time)
@@ -54,17 +43,10 @@ def evaluate_routine_status(routine):
     ):
         print(f"!!! TRIGGERING REMINDER FOR {routine.title} !!!")
         
-        # Play TTS if available (Windows), otherwise just log
-        if TTS_AVAILABLE:
-            text = f"Yo! {routine.title} is coming up. Don't forget!"
-            speak_background(text, routine.personality)
-        else:
-            # On cloud, this should trigger a push notification to the mobile app
-            # For now, just log it
-            print(f"[REMINDER] {routine.title} - Push notification should be sent here")
-        
+        # Delivery (TTS on the PC, push/webhook on the cloud) happens once
+        # the change is saved: see main._announce_status_changes and
+        # notifications.py
         routine.reminder_sent = True
-        update_routine(routine)
     
     # Check if routine should be marked as missed
     elif routine.status == "pending" and now >= miss_time:
@@ -72,23 +54,15 @@ def evaluate_routine_status(routine):
         routine.status = "missed"
         routine.failures += 1
         routine.streak = 0
-        
-        update_routine(routine)
     
     # Always return the routine object
     return routine
 
 
 def background_time_watcher():
-    """This stays! It checks every second."""
-    while True:
-        try:
-            routines = get_all_routines()
-            for routine in routines:
-                evaluate_routine_status(routine)
-        except Exception as e:
-            print(f"Watcher Error: {e}")
-        time.sleep(1)
+    """Runs the reminder scheduler forever (see scheduler.py)."""
+    from scheduler import reminder_scheduler
+    reminder_scheduler.run()
 
 
 def start_background_thread():
@@ -1,25 +1,61 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 from pydantic import BaseModel as PydanticBaseModel
-from models import Routine
+from models import Routine, BlockEventBatch
 from logic import evaluate_routine_status, background_time_watcher
-from database import (
-    init_db,
-    insert_routine,
-    get_all_routines,
-    update_routine,
-    update_routine_details,
-    delete_routine_by_id,
-    log_block,
-    get_block_stats_rows,
-)
+from scheduler import reminder_scheduler
+from database import init_db, get_pool, close_pool, log_blocks
+from block_log_buffer import BlockLogBuffer
+from block_rollups import resolve_range
+from response_cache import ResponseCache
+from event_hub import event_hub
+from notifications import get_dispatcher, routine_notification
+import async_database as db
+import asyncio
+import json
 import threading
 import platform
 import os
 
 app = FastAPI(title="Discipline App")
 
+# Block events are spooled and written in batches by a background thread
+block_buffer = BlockLogBuffer(log_blocks)
+
+# Per-user cache for the polled read endpoints; writes bump the version
+# of what they touched (see response_cache.py)
+response_cache = ResponseCache()
+block_buffer.add_flush_listener(lambda user_ids: response_cache.invalidate("stats", user_ids))
+reminder_scheduler.add_listener(
+    lambda routines: response_cache.invalidate("routines", {r.user_id for r in routines})
+)
+
+
+def _announce_status_changes(routines):
+    """
+    Reminders and misses (found by the scheduler or a read), once saved:
+    pushed to connected clients and handed to the notification sinks.
+    """
+    for routine in routines:
+        if routine.status == "missed":
+            kind = "missed"
+        elif routine.status == "pending" and routine.reminder_sent:
+            kind = "reminder"
+        else:
+            continue
+        event_hub.publish(routine.user_id, kind, jsonable_encoder(routine))
+        get_dispatcher().submit(routine_notification(routine, kind))
+
+
+reminder_scheduler.add_listener(_announce_status_changes)
+
+# When reminders are spoken on this machine, render their audio ahead of
+# time so playback doesn't wait on edge-tts (see presynth.py)
+prerenderer = None
+
 # Add CORS middleware for Flutter app
 app.add_middleware(
     CORSMiddleware,
@@ -51,12 +87,27 @@ else:
         pass
 
 
+def _start_prerenderer(dispatcher):
+    global prerenderer
+    if prerenderer is not None or not any(sink.name == "tts" for sink in dispatcher.sinks):
+        return
+    from presynth import ReminderPrerenderer
+    prerenderer = ReminderPrerenderer().start()
+    reminder_scheduler.add_schedule_listener(prerenderer.schedule)
+
+
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     print("🚀 FastAPI startup event triggered")
 
+    event_hub.bind()
     init_db()
     init_addiction_db()
+    await db.open_pool()
+    block_buffer.start()
+    dispatcher = get_dispatcher()
+    dispatcher.start()
+    _start_prerenderer(dispatcher)
 
     watcher = threading.Thread(
         target=background_time_watcher,
@@ -72,34 +123,101 @@ def startup_event():
         monitor.start()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    block_buffer.stop()
+    get_dispatcher().stop()
+    await db.close_pool()
+    close_pool()
+
+
 @app.get("/")
-def root():
+async def root():
     return {
         "status": "Backend running successfully",
         "platform": platform.system(),
         "database": "postgres" if os.environ.get("DATABASE_URL") else "sqlite",
-        "addiction_monitor": "active" if ADDICTION_MONITOR_AVAILABLE else "mobile-only"
+        "addiction_monitor": "active" if ADDICTION_MONITOR_AVAILABLE else "mobile-only",
+        "db_pool": db.pool_stats(),
+        "sync_db_pool": get_pool().stats(),
+        "scheduler": reminder_scheduler.stats(),
+        "block_buffer": block_buffer.stats(),
+        "response_cache": response_cache.stats(),
+        "push": event_hub.stats(),
+        "notifications": get_dispatcher().stats(),
+        "presynth": prerenderer.stats() if prerenderer else None,
     }
 
 
 @app.post("/routines")
-def create_routines(routines: List[Routine]):
-    for routine in routines:
-        insert_routine(routine)
-    return {"created": len(routines)}
+async def create_routines(routines: List[Routine]):
+    ids = await db.insert_routines(routines)
+    for routine_id in ids:
+        reminder_scheduler.notify_changed(routine_id)
+    response_cache.invalidate("routines", {r.user_id for r in routines})
+    for routine_id, routine in zip(ids, routines):
+        event_hub.publish(routine.user_id, "routine_created",
+                          jsonable_encoder(routine.model_copy(update={"id": routine_id})))
+    return {"created": len(ids), "ids": ids}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison (RFC 9110): W/"x" and "x" are the same tag
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+async def _cached_response(request: Request, scope: str, user_id, params: dict, load):
+    """
+    Serve `load()` through the response cache with an ETag from the
+    (scope, user) data version; a matching If-None-Match gets a 304
+    without touching the database.
+    """
+    etag = response_cache.etag(scope, user_id, params)
+    headers = {"Cache-Control": "no-cache"}
+    if etag:
+        headers["ETag"] = etag
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+    content = await response_cache.get_or_compute_async(scope, user_id, params, load)
+    return JSONResponse(content, headers=headers)
 
 
 @app.get("/routines")
-def list_routines(user_id: str = "default"):
-    # Filter directly in SQL (much faster than fetching everything)
-    user_routines = get_all_routines(user_id)
-
-    updated = []
-    for routine in user_routines:
-        updated_routine = evaluate_routine_status(routine)
-        update_routine(updated_routine)
-        updated.append(updated_routine)
-    return updated
+async def list_routines(request: Request, user_id: str = "default"):
+    async def load():
+        # Filter directly in SQL (much faster than fetching everything)
+        user_routines = await db.get_all_routines(user_id)
+
+        for routine in user_routines:
+            evaluate_routine_status(routine)
+        changed = [routine for routine in user_routines if routine.is_dirty()]
+        # Only rows whose status actually changed are written, in one batch
+        written = await db.update_routines(changed)
+        if written:
+            response_cache.invalidate("routines", user_id)
+            _announce_status_changes(written)
+        # Rows someone else changed meanwhile weren't written: return what
+        # the database has for them, not our rejected evaluation
+        for index, routine in enumerate(user_routines):
+            if routine.is_dirty():
+                user_routines[index] = await db.get_routine_by_id(routine.id) or routine
+        return jsonable_encoder(user_routines)
+
+    return await _cached_response(request, "routines", user_id, {}, load)
+
+
+@app.get("/routines/changes")
+async def routine_changes(user_id: str = "default", since: int = 0,
+                          limit: int = Query(500, ge=1, le=5000)):
+    """
+    Delta sync: routines created/modified and ids deleted after `since`.
+    Start with since=0 (full list), then pass back the returned cursor;
+    keep going while has_more is true.
+    """
+    return await db.get_routine_changes(user_id, since, limit)
 
 
 class RoutineUpdate(PydanticBaseModel):
@@ -110,9 +228,9 @@ class RoutineUpdate(PydanticBaseModel):
 
 
 @app.put("/routines/{routine_id}")
-def edit_routine(routine_id: int, updates: RoutineUpdate):
+async def edit_routine(routine_id: int, updates: RoutineUpdate):
     """Update a routine's editable fields (title, date, time, personality)"""
-    changed = update_routine_details(
+    changed = await db.update_routine_details(
         routine_id,
         title=updates.title,
         routine_date=updates.routine_date,
@@ -120,58 +238,137 @@ def edit_routine(routine_id: int, updates: RoutineUpdate):
         personality=updates.personality,
     )
     if changed:
+        reminder_scheduler.notify_changed(routine_id)
+        routine = await db.get_routine_by_id(routine_id)
+        if routine:
+            response_cache.invalidate("routines", routine.user_id)
+            event_hub.publish(routine.user_id, "routine_updated", jsonable_encoder(routine))
         return {"updated": routine_id, "message": "Routine updated successfully"}
     return {"error": "Routine not found or nothing to update"}
 
 
 @app.post("/routines/{routine_id}/complete")
-def complete_routine(routine_id: int):
-    routines = get_all_routines()
-    routine = next((r for r in routines if r.id == routine_id), None)
+async def complete_routine(routine_id: int):
+    routine = await db.complete_routine(routine_id)
     if not routine:
-        return {"error": "Routine not found"}
-    if routine.status == "missed":
+        if await db.get_routine_by_id(routine_id) is None:
+            return {"error": "Routine not found"}
         return {"error": "Routine already missed"}
-    routine.status = "done"
-    routine.streak += 1
-    update_routine(routine)
+    reminder_scheduler.notify_changed(routine_id)
+    response_cache.invalidate("routines", routine.user_id)
+    event_hub.publish(routine.user_id, "done", jsonable_encoder(routine))
     return routine
 
 
 @app.delete("/routines/{routine_id}")
-def delete_routine(routine_id: int):
+async def delete_routine(routine_id: int):
     """Delete a routine by ID"""
-    if delete_routine_by_id(routine_id):
+    routine = await db.get_routine_by_id(routine_id)
+    if await db.delete_routine_by_id(routine_id):
+        reminder_scheduler.notify_deleted(routine_id)
+        owner = routine.user_id if routine else None
+        response_cache.invalidate("routines", owner)
+        event_hub.publish(owner, "routine_deleted", {"id": routine_id})
         return {"deleted": routine_id, "message": "Routine deleted successfully"}
     return {"error": "Routine not found"}
 
 
-@app.get("/addiction-stats")
-def get_addiction_stats(user_id: str = None):
-    """Get addiction blocking statistics"""
-    stats = get_block_stats_rows(7, user_id)
+# ============================================================
+# PUSH (reminders, misses and routine changes as they happen)
+# ============================================================
 
-    # Format for API response
-    by_category = {}
-    by_date = {}
+SSE_HEARTBEAT = float(os.environ.get("SSE_HEARTBEAT", 15))
 
-    for date_str, category, count in stats:
-        if category not in by_category:
-            by_category[category] = 0
-        by_category[category] += count
 
-        if date_str not in by_date:
-            by_date[date_str] = {}
-        by_date[date_str][category] = count
+@app.websocket("/ws")
+async def events_websocket(websocket: WebSocket, user_id: str = "default",
+                           last_event_id: Optional[int] = None):
+    """Push channel: one JSON message per event for `user_id`."""
+    await websocket.accept()
+    queue = event_hub.subscribe(user_id, last_event_id)
 
-    return {
-        "total_by_category": by_category,
-        "by_date": by_date
-    }
+    async def forward():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    sender = asyncio.create_task(forward())
+    try:
+        # Nothing is expected from the client; reading just notices the close
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        event_hub.unsubscribe(user_id, queue)
+
+
+@app.get("/events")
+async def events_stream(request: Request, user_id: str = "default",
+                        last_event_id: Optional[int] = Header(None)):
+    """Same events as /ws as Server-Sent Events (EventSource reconnects itself)."""
+    queue = event_hub.subscribe(user_id, last_event_id)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            event_hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/addiction-stats")
+async def get_addiction_stats(request: Request, user_id: str = None, days: int = 7,
+                              date_from: str = Query(None, alias="from"),
+                              date_to: str = Query(None, alias="to"),
+                              granularity: str = "day"):
+    """
+    Get addiction blocking statistics.
+    Range: last `days` days (default 7) or from=YYYY-MM-DD&to=YYYY-MM-DD;
+    granularity: day, week (keyed by Monday) or month (YYYY-MM).
+    """
+    try:
+        start, end = resolve_range(days, date_from, date_to)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    async def load():
+        stats, by_category = await db.get_block_stats(start, end, granularity, user_id)
+
+        # Format for API response
+        by_date = {}
+        for bucket, category, count in stats:
+            by_date.setdefault(bucket, {})[category] = count
+
+        return {
+            "total_by_category": by_category,
+            "by_date": by_date,
+            "granularity": granularity,
+            "from": start.isoformat(),
+            "to": end.isoformat()
+        }
+
+    try:
+        return await _cached_response(
+            request, "stats", user_id, {"from": start, "to": end, "granularity": granularity}, load
+        )
+    except ValueError as e:
+        return {"error": str(e)}
 
 
 @app.post("/log-block")
-def log_block_from_mobile(
+async def log_block_from_mobile(
     user_id: str = "default",
     category: str = None,
     url: str = "",
@@ -180,8 +377,28 @@ def log_block_from_mobile(
 ):
     """Log a block attempt from mobile app"""
     try:
-        log_block(user_id, category, url, title, audio_type)
+        block_buffer.submit({
+            "category": category,
+            "url": url,
+            "title": title,
+            "audio_type": audio_type,
+        }, user_id)
         return {"success": True, "message": "Block logged"}
+    except ValueError as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+@app.post("/log-blocks")
+async def log_blocks_from_mobile(batch: BlockEventBatch):
+    """Log many block attempts at once (e.g. queued while the phone was offline)"""
+    try:
+        events = [event.model_dump() for event in batch.events]
+        block_buffer.submit_many(events, batch.user_id)
+        return {"success": True, "logged": len(events)}
+    except ValueError as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=400)
     except Exception as e:
         return {"success": False, "error": str(e)}
 
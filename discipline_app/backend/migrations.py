@@ -0,0 +1,549 @@
+"""
+Versioned schema migrations for database.py.
+
+Each migration has a version number, a name and the statements to run
+on SQLite and on Postgres (or a function for the ones that need to look
+at the existing schema first). Applied versions are recorded in the
+schema_version table, so init_db() only runs what's missing, in order,
+each migration in its own transaction.
+
+To change the schema, append a new Migration at the end of MIGRATIONS.
+Never edit one that has already shipped.
+"""
+
+
+class Migration:
+    def __init__(self, version, name, sqlite=(), postgres=(), apply=None):
+        self.version = version
+        self.name = name
+        self.sqlite = list(sqlite)
+        self.postgres = list(postgres)
+        # Optional callable(cursor, use_postgres) for migrations that
+        # can't be plain SQL
+        self.apply = apply
+
+    def run(self, cursor, use_postgres):
+        for statement in (self.postgres if use_postgres else self.sqlite):
+            cursor.execute(statement)
+        if self.apply:
+            self.apply(cursor, use_postgres)
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def _table_columns(cursor, table, use_postgres):
+    if use_postgres:
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = %s",
+            (table,)
+        )
+        return {row[0] for row in cursor.fetchall()}
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _add_user_id_columns(cursor, use_postgres):
+    # Old local databases (and ones created by the desktop monitor)
+    # predate multi-user support
+    for table in ("routines", "block_logs", "block_stats"):
+        if "user_id" not in _table_columns(cursor, table, use_postgres):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN user_id TEXT DEFAULT 'default'")
+            print(f"✅ Added user_id column to {table} table")
+
+
+def _base_tables(id_column):
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS routines (
+            id {id_column},
+            title TEXT,
+            routine_date TEXT,
+            routine_time TEXT,
+            status TEXT,
+            reminder_sent INTEGER,
+            personality TEXT,
+            streak INTEGER,
+            failures INTEGER,
+            user_id TEXT DEFAULT 'default'
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS block_logs (
+            id {id_column},
+            user_id TEXT,
+            category TEXT NOT NULL,
+            url TEXT,
+            title TEXT,
+            timestamp TEXT NOT NULL,
+            audio_type TEXT
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS block_stats (
+            id {id_column},
+            user_id TEXT,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            blocks_count INTEGER DEFAULT 0,
+            UNIQUE(user_id, date, category)
+        )
+        """,
+    ]
+
+
+_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_routines_user_date_time "
+    "ON routines (user_id, routine_date, routine_time)",
+    "CREATE INDEX IF NOT EXISTS idx_routines_status_date "
+    "ON routines (status, routine_date)",
+    "CREATE INDEX IF NOT EXISTS idx_block_logs_user_timestamp "
+    "ON block_logs (user_id, timestamp)",
+    # block_stats already has UNIQUE(user_id, date, category) for per-user
+    # lookups, this one serves the "all users, last N days" query
+    "CREATE INDEX IF NOT EXISTS idx_block_stats_date "
+    "ON block_stats (date)",
+]
+
+
+def _rollup_tables(id_column):
+    # Same counts as block_stats per ISO week (Monday) and per month
+    # ("YYYY-MM"), kept in step by block_rollups.rollup_upserts()
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS block_stats_weekly (
+            id {id_column},
+            user_id TEXT,
+            week_start TEXT NOT NULL,
+            category TEXT NOT NULL,
+            blocks_count INTEGER DEFAULT 0,
+            UNIQUE(user_id, week_start, category)
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS block_stats_monthly (
+            id {id_column},
+            user_id TEXT,
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            blocks_count INTEGER DEFAULT 0,
+            UNIQUE(user_id, month, category)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_block_stats_weekly_week "
+        "ON block_stats_weekly (week_start)",
+        "CREATE INDEX IF NOT EXISTS idx_block_stats_monthly_month "
+        "ON block_stats_monthly (month)",
+    ]
+
+
+def _rollup_backfill(week_expr):
+    return [
+        f"""
+        INSERT INTO block_stats_weekly (user_id, week_start, category, blocks_count)
+        SELECT user_id, {week_expr}, category, SUM(blocks_count)
+        FROM block_stats GROUP BY user_id, {week_expr}, category
+        """,
+        """
+        INSERT INTO block_stats_monthly (user_id, month, category, blocks_count)
+        SELECT user_id, substr(date, 1, 7), category, SUM(blocks_count)
+        FROM block_stats GROUP BY user_id, substr(date, 1, 7), category
+        """,
+    ]
+
+
+# Monday of the row's week, as YYYY-MM-DD text
+_SQLITE_WEEK = "date(date, 'weekday 0', '-6 days')"
+_PG_WEEK = "to_char(date_trunc('week', date::date), 'YYYY-MM-DD')"
+
+
+# Change tracking for GET /routines/changes: every insert/update of a
+# routine takes the next value of a single-row counter as its change_seq
+# and every delete leaves a tombstone with one. The counter row is locked
+# until commit, so sequence order is also commit order and a client
+# cursor can never skip a change that commits late.
+_SQLITE_CHANGE_TRACKING = [
+    "ALTER TABLE routines ADD COLUMN change_seq INTEGER",
+    "UPDATE routines SET change_seq = id",
+    "CREATE TABLE IF NOT EXISTS routine_change_counter "
+    "(id INTEGER PRIMARY KEY, value INTEGER NOT NULL)",
+    "INSERT INTO routine_change_counter (id, value) "
+    "SELECT 1, COALESCE(MAX(change_seq), 0) FROM routines",
+    """
+    CREATE TABLE IF NOT EXISTS routine_tombstones (
+        routine_id INTEGER PRIMARY KEY,
+        user_id TEXT,
+        change_seq INTEGER NOT NULL,
+        deleted_at TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_routines_user_change ON routines (user_id, change_seq)",
+    "CREATE INDEX IF NOT EXISTS idx_routine_tombstones_user_change "
+    "ON routine_tombstones (user_id, change_seq)",
+    """
+    CREATE TRIGGER IF NOT EXISTS routines_change_insert AFTER INSERT ON routines
+    BEGIN
+        UPDATE routine_change_counter SET value = value + 1 WHERE id = 1;
+        UPDATE routines SET change_seq = (SELECT value FROM routine_change_counter WHERE id = 1)
+        WHERE id = NEW.id;
+        DELETE FROM routine_tombstones WHERE routine_id = NEW.id;
+    END
+    """,
+    # The WHEN skips the change_seq writes made by these triggers
+    """
+    CREATE TRIGGER IF NOT EXISTS routines_change_update AFTER UPDATE ON routines
+    WHEN NEW.change_seq IS OLD.change_seq
+    BEGIN
+        UPDATE routine_change_counter SET value = value + 1 WHERE id = 1;
+        UPDATE routines SET change_seq = (SELECT value FROM routine_change_counter WHERE id = 1)
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS routines_change_delete AFTER DELETE ON routines
+    BEGIN
+        UPDATE routine_change_counter SET value = value + 1 WHERE id = 1;
+        INSERT OR REPLACE INTO routine_tombstones (routine_id, user_id, change_seq, deleted_at)
+        VALUES (OLD.id, OLD.user_id,
+                (SELECT value FROM routine_change_counter WHERE id = 1), CURRENT_TIMESTAMP);
+    END
+    """,
+]
+
+_PG_CHANGE_TRACKING = [
+    "ALTER TABLE routines ADD COLUMN IF NOT EXISTS change_seq BIGINT",
+    "UPDATE routines SET change_seq = id",
+    "CREATE TABLE IF NOT EXISTS routine_change_counter "
+    "(id INTEGER PRIMARY KEY, value BIGINT NOT NULL)",
+    "INSERT INTO routine_change_counter (id, value) "
+    "SELECT 1, COALESCE(MAX(change_seq), 0) FROM routines",
+    """
+    CREATE TABLE IF NOT EXISTS routine_tombstones (
+        routine_id INTEGER PRIMARY KEY,
+        user_id TEXT,
+        change_seq BIGINT NOT NULL,
+        deleted_at TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_routines_user_change ON routines (user_id, change_seq)",
+    "CREATE INDEX IF NOT EXISTS idx_routine_tombstones_user_change "
+    "ON routine_tombstones (user_id, change_seq)",
+    """
+    CREATE OR REPLACE FUNCTION routines_next_change() RETURNS BIGINT AS $$
+        UPDATE routine_change_counter SET value = value + 1 WHERE id = 1 RETURNING value
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION routines_track_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO routine_tombstones (routine_id, user_id, change_seq, deleted_at)
+            VALUES (OLD.id, OLD.user_id, routines_next_change(), now()::text)
+            ON CONFLICT (routine_id) DO UPDATE
+            SET user_id = excluded.user_id, change_seq = excluded.change_seq,
+                deleted_at = excluded.deleted_at;
+            RETURN OLD;
+        END IF;
+        IF TG_OP = 'INSERT' THEN
+            DELETE FROM routine_tombstones WHERE routine_id = NEW.id;
+        END IF;
+        NEW.change_seq := routines_next_change();
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS routines_change_write ON routines",
+    "CREATE TRIGGER routines_change_write BEFORE INSERT OR UPDATE ON routines "
+    "FOR EACH ROW EXECUTE FUNCTION routines_track_change()",
+    "DROP TRIGGER IF EXISTS routines_change_delete ON routines",
+    "CREATE TRIGGER routines_change_delete AFTER DELETE ON routines "
+    "FOR EACH ROW EXECUTE FUNCTION routines_track_change()",
+]
+
+
+# Postgres runs writes for different users concurrently, and the single
+# counter row above made every routine write in the database wait for the
+# previous one to commit. GET /routines/changes only ever reads one user's
+# changes, so commit order only has to hold per user: each user gets a
+# counter row of their own. A plain SEQUENCE isn't enough, nextval()
+# doesn't wait for commit, so a client cursor could skip a late change.
+# Counters start at the global value so cursors clients already hold stay
+# valid. (SQLite has a single writer anyway and keeps the global row.)
+_PG_PER_USER_CHANGE_COUNTERS = [
+    """
+    CREATE TABLE IF NOT EXISTS routine_change_counters (
+        user_id TEXT PRIMARY KEY,
+        value BIGINT NOT NULL
+    )
+    """,
+    """
+    INSERT INTO routine_change_counters (user_id, value)
+    SELECT owners.user_id, counter.value
+    FROM (SELECT user_id FROM routines UNION SELECT user_id FROM routine_tombstones) owners
+    CROSS JOIN routine_change_counter counter
+    WHERE counter.id = 1 AND owners.user_id IS NOT NULL
+    ON CONFLICT (user_id) DO NOTHING
+    """,
+    """
+    CREATE OR REPLACE FUNCTION routines_next_change(owner TEXT) RETURNS BIGINT AS $$
+        INSERT INTO routine_change_counters AS counters (user_id, value)
+        VALUES (COALESCE(owner, ''),
+                (SELECT value FROM routine_change_counter WHERE id = 1) + 1)
+        ON CONFLICT (user_id) DO UPDATE SET value = counters.value + 1
+        RETURNING value
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION routines_track_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO routine_tombstones (routine_id, user_id, change_seq, deleted_at)
+            VALUES (OLD.id, OLD.user_id, routines_next_change(OLD.user_id), now()::text)
+            ON CONFLICT (routine_id) DO UPDATE
+            SET user_id = excluded.user_id, change_seq = excluded.change_seq,
+                deleted_at = excluded.deleted_at;
+            RETURN OLD;
+        END IF;
+        IF TG_OP = 'INSERT' THEN
+            DELETE FROM routine_tombstones WHERE routine_id = NEW.id;
+        END IF;
+        NEW.change_seq := routines_next_change(NEW.user_id);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP FUNCTION IF EXISTS routines_next_change()",
+]
+
+
+def _add_block_event_ids(cursor, use_postgres):
+    # Idempotency key for block events sent more than once (see block_events.py).
+    # NULLs don't collide, so events from clients without keys still insert.
+    if "event_id" not in _table_columns(cursor, "block_logs", use_postgres):
+        cursor.execute("ALTER TABLE block_logs ADD COLUMN event_id TEXT")
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_block_logs_event_id ON block_logs (event_id)"
+    )
+
+
+def _shared_tables(id_column):
+    # Tables that backend_api.py (weekly routines) and the desktop
+    # monitor (cloud sync high-water marks) used to create on their own
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS recurring_routines (
+            id {id_column},
+            user_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            time TEXT NOT NULL,
+            days TEXT NOT NULL,
+            active INTEGER DEFAULT 1,
+            created_at TEXT NOT NULL
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS routine_completions (
+            id {id_column},
+            routine_id INTEGER NOT NULL,
+            completed_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            value BIGINT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_recurring_routines_user_active "
+        "ON recurring_routines (user_id, active, time)",
+        "CREATE INDEX IF NOT EXISTS idx_routine_completions_routine "
+        "ON routine_completions (routine_id, completed_at)",
+    ]
+
+
+def _unique_keys(cursor, table):
+    cursor.execute(f"PRAGMA index_list({table})")
+    indexes = [row[1] for row in cursor.fetchall() if row[2]]
+    keys = []
+    for index in indexes:
+        cursor.execute(f"PRAGMA index_info({index})")
+        keys.append(tuple(row[2] for row in cursor.fetchall()))
+    return keys
+
+
+def _unify_monitor_tables(cursor, use_postgres):
+    # Postgres tables were only ever created by migration 1
+    if use_postgres:
+        return
+    # The desktop monitor created block_stats with UNIQUE(date, category),
+    # which breaks every ON CONFLICT (user_id, date, category) upsert.
+    # Rebuild it with the real key and recount the rollups from it (the
+    # monitor never kept those in step).
+    if ("date", "category") in _unique_keys(cursor, "block_stats"):
+        for statement in [
+            """
+            CREATE TABLE block_stats_unified (
+                id INTEGER PRIMARY KEY,
+                user_id TEXT,
+                date TEXT NOT NULL,
+                category TEXT NOT NULL,
+                blocks_count INTEGER DEFAULT 0,
+                UNIQUE(user_id, date, category)
+            )
+            """,
+            """
+            INSERT INTO block_stats_unified (user_id, date, category, blocks_count)
+            SELECT COALESCE(user_id, 'default'), date, category, SUM(blocks_count)
+            FROM block_stats GROUP BY COALESCE(user_id, 'default'), date, category
+            """,
+            "DROP TABLE block_stats",
+            "ALTER TABLE block_stats_unified RENAME TO block_stats",
+            "CREATE INDEX IF NOT EXISTS idx_block_stats_date ON block_stats (date)",
+            "DELETE FROM block_stats_weekly",
+            "DELETE FROM block_stats_monthly",
+        ] + _rollup_backfill(_SQLITE_WEEK):
+            cursor.execute(statement)
+        print("✅ Rebuilt block_stats with UNIQUE(user_id, date, category)")
+    # Rows the monitor logged before it set event_ids get one, so the
+    # sync agent can resend them without double counting
+    cursor.execute(
+        "UPDATE block_logs SET event_id = lower(hex(randomblob(16))) WHERE event_id IS NULL"
+    )
+
+
+def _adopt_legacy_routines(conn, cursor, use_postgres):
+    """
+    backend_api.py used to create its weekly routines as `routines`,
+    which is the name of the dated routines table here. Move them to
+    recurring_routines (ids kept, so routine_completions still match)
+    and create the real routines table in their place.
+    """
+    columns = _table_columns(cursor, "routines", use_postgres)
+    if "days" not in columns or "routine_date" in columns:
+        return
+    if _table_columns(cursor, "recurring_routines", use_postgres):
+        raise RuntimeError("both routines (old backend_api layout) and "
+                           "recurring_routines exist, merge them by hand")
+    _begin(cursor, use_postgres)
+    try:
+        cursor.execute("ALTER TABLE routines RENAME TO recurring_routines")
+        cursor.execute(_base_tables("SERIAL PRIMARY KEY" if use_postgres else "INTEGER PRIMARY KEY")[0])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print("✅ Moved backend_api routines to recurring_routines")
+
+
+def _begin(cursor, use_postgres):
+    """
+    Open the transaction a migration runs in. psycopg2 does that by
+    itself, but Python's sqlite3 only opens one before INSERT/UPDATE/
+    DELETE and autocommits CREATE/ALTER, so a migration that failed
+    halfway would leave its first columns behind. SQLite DDL is
+    transactional once it runs inside an explicit BEGIN.
+    """
+    if not use_postgres:
+        cursor.execute("BEGIN")
+
+
+# ============================================================
+# MIGRATIONS (append only)
+# ============================================================
+
+MIGRATIONS = [
+    Migration(
+        1, "base tables",
+        sqlite=_base_tables("INTEGER PRIMARY KEY"),
+        postgres=_base_tables("SERIAL PRIMARY KEY"),
+    ),
+    Migration(2, "user_id columns for pre multi-user databases",
+              apply=_add_user_id_columns),
+    Migration(3, "secondary indexes", sqlite=_INDEXES, postgres=_INDEXES),
+    Migration(
+        4, "weekly and monthly block_stats rollups",
+        sqlite=_rollup_tables("INTEGER PRIMARY KEY") + _rollup_backfill(_SQLITE_WEEK),
+        postgres=_rollup_tables("SERIAL PRIMARY KEY") + _rollup_backfill(_PG_WEEK),
+    ),
+    Migration(5, "routine change tracking (change_seq + tombstones)",
+              sqlite=_SQLITE_CHANGE_TRACKING, postgres=_PG_CHANGE_TRACKING),
+    Migration(6, "block_logs.event_id idempotency key", apply=_add_block_event_ids),
+    Migration(
+        7, "one schema for backend_api and the desktop monitor",
+        sqlite=_shared_tables("INTEGER PRIMARY KEY"),
+        postgres=_shared_tables("SERIAL PRIMARY KEY"),
+        apply=_unify_monitor_tables,
+    ),
+    # /log-block rows were still logged without a key until block_log_row
+    # started handing them out; local databases are the ones that get synced
+    Migration(8, "event_id for every block_logs row", sqlite=[
+        "UPDATE block_logs SET event_id = lower(hex(randomblob(16))) WHERE event_id IS NULL"
+    ]),
+    Migration(9, "per-user routine change counters",
+              postgres=_PG_PER_USER_CHANGE_COUNTERS),
+]
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+
+def current_version(cursor):
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    row = cursor.fetchone()
+    return row[0] or 0
+
+
+# Arbitrary constant for pg_advisory_lock so two workers booting at
+# the same time don't both run the same migration
+_PG_LOCK_KEY = 72150518
+
+
+def migrate(conn, use_postgres):
+    """Apply every migration newer than the recorded schema version."""
+    cursor = conn.cursor()
+    if use_postgres:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (_PG_LOCK_KEY,))
+    try:
+        return _migrate(conn, cursor, use_postgres)
+    finally:
+        if use_postgres:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (_PG_LOCK_KEY,))
+            conn.commit()
+
+
+def _migrate(conn, cursor, use_postgres):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+    _adopt_legacy_routines(conn, cursor, use_postgres)
+
+    version = current_version(cursor)
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version <= version:
+            continue
+        try:
+            _begin(cursor, use_postgres)
+            migration.run(cursor, use_postgres)
+            cursor.execute(
+                "INSERT INTO schema_version (version, name, applied_at) "
+                + ("VALUES (%s, %s, CURRENT_TIMESTAMP::text)" if use_postgres
+                   else "VALUES (?, ?, CURRENT_TIMESTAMP)"),
+                (migration.version, migration.name)
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Migration {migration.version} ({migration.name}) failed: {e}")
+            raise
+        print(f"✅ Applied migration {migration.version}: {migration.name}")
+        applied.append(migration.version)
+    return applied
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, field_serializer
+from pydantic import BaseModel, PrivateAttr, field_serializer, field_validator
 from datetime import date, time
-from typing import Optional
+from typing import List, Optional
+from block_events import normalize_timestamp
 
 class Routine(BaseModel):
     id: Optional[int] = None
@@ -15,6 +16,31 @@ class Routine(BaseModel):
     reminder_minutes_before: int = 10
     grace_minutes_after: int = 5
     user_id: Optional[str] = "default"  # ADD THIS LINE
+
+    # Status fields as they were last loaded from / written to the
+    # database. None means the routine was never persisted.
+    _saved_state: Optional[tuple] = PrivateAttr(default=None)
+
+    def _status_state(self):
+        return (self.status, self.reminder_sent, self.streak, self.failures)
+
+    def mark_clean(self):
+        """Remember the current status fields as the persisted ones."""
+        self._saved_state = self._status_state()
+
+    @property
+    def saved_status(self) -> Optional[str]:
+        """The status the database had when this routine was loaded."""
+        return self._saved_state[0] if self._saved_state else None
+
+    @property
+    def saved_reminder_sent(self) -> Optional[bool]:
+        """The reminder_sent flag the database had when this routine was loaded."""
+        return self._saved_state[1] if self._saved_state else None
+
+    def is_dirty(self) -> bool:
+        """True if status/reminder/streak/failures changed since mark_clean()."""
+        return self._saved_state != self._status_state()
     
     @field_serializer('routine_time')
     def serialize_time(self, t: time, _info):
@@ -22,4 +48,44 @@ class Routine(BaseModel):
     
     @field_serializer('routine_date')
     def serialize_date(self, d: date, _info):
-        return d.strftime('%Y-%m-%d')
\ No newline at end of file
+        return d.strftime('%Y-%m-%d')
+
+
+class BlockEvent(BaseModel):
+    """One block attempt as reported by a client (see block_events.py)."""
+    category: str
+    url: str = ""
+    title: str = ""
+    audio_type: str = "warning"
+    timestamp: Optional[str] = None  # client time, ISO 8601
+    user_id: Optional[str] = None    # defaults to the batch's user_id
+    event_id: Optional[str] = None   # idempotency key, resent events are skipped
+
+    @field_validator('timestamp')
+    @classmethod
+    def validate_timestamp(cls, value):
+        # Rejected with a 422 before anything is queued
+        return normalize_timestamp(value) if value is not None else None
+
+
+class BlockEventBatch(BaseModel):
+    user_id: str = "default"
+    events: List[BlockEvent]
+
+
+class RecurringRoutine(BaseModel):
+    """A weekly routine from the Flask API (recurring_routines table)."""
+    id: Optional[int] = None
+    user_id: str = "default"
+    title: str
+    description: str = ""
+    time: str                        # "14:30"
+    days: str                        # "Mon,Wed,Fri" or "Daily"
+    active: bool = True
+    created_at: Optional[str] = None
+
+
+class RoutineCompletion(BaseModel):
+    routine_id: int
+    title: str
+    completed_at: str
@@ -0,0 +1,317 @@
+"""
+Notification dispatcher.
+
+Reminders used to be spoken straight from evaluate_routine_status(),
+inside the scheduler loop, so a slow TTS call held up every other
+routine. Now callers submit() a Notification and return immediately:
+each (notification, sink) pair becomes a job on a bounded queue drained
+by a pool of worker threads. A failed delivery is retried with
+exponential backoff up to NOTIFY_MAX_RETRIES times; when the queue is
+full new jobs are dropped (and counted) instead of blocking the caller.
+
+Sinks are small objects with a name, the kinds they care about and a
+send(notification) method that raises on failure:
+- TTSSink      speaks reminders on the PC (tts.speak)
+- WebhookSink  POSTs the notification as JSON to NOTIFY_WEBHOOK_URL
+- PushSink     stand-in for a push provider (FCM/APNs): logs, with an
+               optional simulated latency (NOTIFY_PUSH_LATENCY)
+
+NOTIFY_SINKS picks them (comma separated); by default "tts" on Windows
+and "push" elsewhere, plus "webhook" when a URL is configured.
+stats() reports queue depth, delivered/failed/retried/dropped counts,
+throughput and delivery latency.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import platform
+import queue
+import threading
+import time
+import urllib.request
+from collections import deque
+from datetime import datetime
+
+NOTIFY_WORKERS = int(os.environ.get("NOTIFY_WORKERS", 4))
+NOTIFY_QUEUE_SIZE = int(os.environ.get("NOTIFY_QUEUE_SIZE", 1000))
+NOTIFY_MAX_RETRIES = int(os.environ.get("NOTIFY_MAX_RETRIES", 3))
+NOTIFY_BACKOFF = float(os.environ.get("NOTIFY_BACKOFF", 1.0))
+NOTIFY_WEBHOOK_URL = os.environ.get("NOTIFY_WEBHOOK_URL", "")
+NOTIFY_PUSH_LATENCY = float(os.environ.get("NOTIFY_PUSH_LATENCY", 0))
+
+
+class Notification:
+    def __init__(self, kind, user_id, title, text, personality="default", data=None):
+        self.kind = kind                  # "reminder", "missed", ...
+        self.user_id = user_id or "default"
+        self.title = title
+        self.text = text
+        self.personality = personality or "default"
+        self.data = data or {}
+        self.created_at = time.monotonic()
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "user_id": self.user_id,
+            "title": self.title,
+            "text": self.text,
+            "personality": self.personality,
+            "data": self.data,
+            "time": datetime.now().isoformat(),
+        }
+
+
+def reminder_text(title):
+    return f"Yo! {title} is coming up. Don't forget!"
+
+
+def routine_notification(routine, kind):
+    """Notification for a routine's reminder or miss."""
+    if kind == "reminder":
+        text = reminder_text(routine.title)
+    else:
+        text = f"You missed {routine.title}."
+    return Notification(kind, routine.user_id, routine.title, text, routine.personality,
+                        {"routine_id": routine.id})
+
+
+# ============================================================
+# SINKS
+# ============================================================
+
+class TTSSink:
+    name = "tts"
+
+    def __init__(self, kinds=("reminder",)):
+        self.kinds = set(kinds)
+
+    def send(self, notification):
+        # Queued on the shared audio service, which plays one clip at a time
+        from tts import speak
+        if not speak(notification.text, notification.personality):
+            raise RuntimeError("speech synthesis/playback failed")
+
+
+class WebhookSink:
+    name = "webhook"
+
+    def __init__(self, url=NOTIFY_WEBHOOK_URL, timeout=5.0, kinds=None):
+        self.url = url
+        self.timeout = timeout
+        self.kinds = set(kinds) if kinds else None
+
+    def send(self, notification):
+        body = json.dumps(notification.to_dict()).encode("utf-8")
+        request = urllib.request.Request(
+            self.url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        # urlopen raises HTTPError for 4xx/5xx, which triggers a retry
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class PushSink:
+    name = "push"
+
+    def __init__(self, latency=NOTIFY_PUSH_LATENCY, kinds=None):
+        self.latency = latency
+        self.kinds = set(kinds) if kinds else None
+
+    def send(self, notification):
+        if self.latency:
+            time.sleep(self.latency)
+        print(f"[PUSH] {notification.user_id}: {notification.text}")
+
+
+def default_sinks(names=None):
+    if names is None:
+        names = os.environ.get("NOTIFY_SINKS")
+    if names is None:
+        names = "tts" if platform.system() == "Windows" else "push"
+        if NOTIFY_WEBHOOK_URL:
+            names += ",webhook"
+
+    sinks = []
+    for name in (n.strip() for n in names.split(",")):
+        if name == "tts":
+            try:
+                import tts  # noqa: F401  (pygame / edge_tts present?)
+                sinks.append(TTSSink())
+            except ImportError:
+                print("⚠️  TTS not available, reminders won't be spoken")
+        elif name == "webhook":
+            if NOTIFY_WEBHOOK_URL:
+                sinks.append(WebhookSink())
+            else:
+                print("⚠️  NOTIFY_WEBHOOK_URL not set, webhook sink disabled")
+        elif name == "push":
+            sinks.append(PushSink())
+        elif name:
+            print(f"⚠️  Unknown notification sink: {name}")
+    return sinks
+
+
+# ============================================================
+# DISPATCHER
+# ============================================================
+
+class NotificationDispatcher:
+    def __init__(self, sinks=None, workers=NOTIFY_WORKERS, queue_size=NOTIFY_QUEUE_SIZE,
+                 max_retries=NOTIFY_MAX_RETRIES, backoff=NOTIFY_BACKOFF, log=print):
+        self.sinks = default_sinks() if sinks is None else list(sinks)
+        self.log = log                    # delivery warnings (drops, retries, failures)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        # Jobs are (notification, sink, attempt)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._retries = []                # heap of (due, seq, job)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._started_at = None
+
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self._latencies = deque(maxlen=1000)
+
+    def _count(self, field, amount=1):
+        with self._stats_lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping = False
+        self._started_at = time.monotonic()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"notify-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        retry_thread = threading.Thread(target=self._retry_loop, name="notify-retry", daemon=True)
+        retry_thread.start()
+        self._threads.append(retry_thread)
+
+    def submit(self, notification):
+        """Queue `notification` for every sink that wants it. Never blocks."""
+        queued = 0
+        for sink in self.sinks:
+            if sink.kinds is not None and notification.kind not in sink.kinds:
+                continue
+            try:
+                self._queue.put_nowait((notification, sink, 0))
+                queued += 1
+            except queue.Full:
+                self._count("dropped")
+                self.log(f"⚠️  Notification queue full, dropped {notification.kind} for {sink.name}")
+        self._count("submitted")
+        return queued
+
+    def _work(self):
+        # Polls so stop() never has to push into a possibly full queue
+        while not self._stopping:
+            try:
+                job = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            notification, sink, attempt = job
+            try:
+                sink.send(notification)
+                with self._stats_lock:
+                    self.delivered += 1
+                    self._latencies.append(time.monotonic() - notification.created_at)
+            except Exception as e:
+                if attempt < self.max_retries:
+                    delay = self.backoff * (2 ** attempt)
+                    self.log(f"⚠️  {sink.name} delivery failed ({e}), retry in {delay:.1f}s")
+                    self._count("retried")
+                    with self._cond:
+                        heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq),
+                                                       (notification, sink, attempt + 1)))
+                        self._cond.notify()
+                else:
+                    self.log(f"❌ {sink.name} delivery failed for good: {e}")
+                    self._count("failed")
+            finally:
+                self._queue.task_done()
+
+    def _retry_loop(self):
+        with self._cond:
+            while not self._stopping:
+                now = time.monotonic()
+                while self._retries and self._retries[0][0] <= now:
+                    _, _, job = heapq.heappop(self._retries)
+                    try:
+                        self._queue.put_nowait(job)
+                    except queue.Full:
+                        self._count("dropped")
+                timeout = self._retries[0][0] - now if self._retries else None
+                self._cond.wait(timeout)
+
+    def join(self, timeout=None):
+        """Wait until the queue and pending retries are empty (tests, benchmarks)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                idle = not self._retries and self._queue.unfinished_tasks == 0
+            if idle:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    def stop(self, timeout=5.0):
+        """Deliver what's queued (best effort) and stop the workers."""
+        self.join(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0
+            return {
+                "sinks": [sink.name for sink in self.sinks],
+                "workers": self.workers,
+                "queued": self._queue.qsize(),
+                "retry_pending": len(self._retries),
+                "submitted": self.submitted,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "retried": self.retried,
+                "dropped": self.dropped,
+                "throughput_per_sec": round(self.delivered / elapsed, 2) if elapsed else None,
+                "latency_avg_ms": round(1000 * sum(latencies) / len(latencies), 1) if latencies else None,
+                "latency_p95_ms": round(1000 * latencies[int(len(latencies) * 0.95) - 1], 1)
+                if latencies else None,
+            }
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """
+    Process-wide dispatcher. Getting it has no side effects: the app
+    start()s it once at startup and stop()s it on shutdown. Until then
+    submitted notifications just wait in the queue.
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = NotificationDispatcher()
+        return _dispatcher
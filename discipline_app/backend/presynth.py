@@ -0,0 +1,128 @@
+"""
+Pre-synthesis of upcoming reminder audio.
+
+Speaking a reminder used to mean generating it with edge-tts right at
+reminder time, so every reminder waited on the network and a flaky TTS
+service delayed or dropped it. The scheduler now hands us the routines
+it schedules; for each pending reminder we render the exact text the
+TTS sink will speak into the audio cache TTS_PRESYNTH_MINUTES before
+the reminder fires. At reminder time tts.speak() finds it on disk and
+playback starts immediately.
+
+Failed renders are retried every TTS_PRESYNTH_RETRY seconds until the
+reminder is due; after that the sink generates it itself as before.
+Renders are queued on one background thread (the synthesis itself runs
+on the audio service's loop), so the scheduler never waits for them.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+from datetime import datetime, timedelta
+
+from logic import routine_datetime_local
+from notifications import reminder_text
+
+TTS_PRESYNTH_MINUTES = float(os.environ.get("TTS_PRESYNTH_MINUTES", 30))
+TTS_PRESYNTH_RETRY = float(os.environ.get("TTS_PRESYNTH_RETRY", 30))
+
+
+class ReminderPrerenderer:
+    def __init__(self, lead_minutes=TTS_PRESYNTH_MINUTES, retry_seconds=TTS_PRESYNTH_RETRY,
+                 render=None):
+        self.lead = timedelta(minutes=lead_minutes)
+        self.retry = timedelta(seconds=retry_seconds)
+        self._render = render
+
+        # Heap entries are (render_at, seq, routine_id, job, reminder_at).
+        # job is (text, personality); an entry is stale once _jobs holds a
+        # different job for the routine (it was renamed or re-timed).
+        self._heap = []
+        self._jobs = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self.rendered = 0
+        self.failures = 0
+
+    # --------------------------------------------------------
+    # Called from the scheduler thread
+    # --------------------------------------------------------
+
+    def schedule(self, routines):
+        """Queue the reminder audio of routines whose reminder is still ahead."""
+        now = datetime.now()
+        with self._cond:
+            for routine in routines:
+                if routine.status != "pending" or routine.reminder_sent:
+                    self._jobs.pop(routine.id, None)
+                    continue
+                reminder_at = routine_datetime_local(routine) - timedelta(
+                    minutes=routine.reminder_minutes_before
+                )
+                if reminder_at <= now:
+                    continue
+                job = (reminder_text(routine.title), routine.personality)
+                if self._jobs.get(routine.id) == (job, reminder_at):
+                    continue
+                self._jobs[routine.id] = (job, reminder_at)
+                heapq.heappush(self._heap, (reminder_at - self.lead, next(self._seq),
+                                            routine.id, job, reminder_at))
+            self._cond.notify()
+
+    # --------------------------------------------------------
+    # Render thread
+    # --------------------------------------------------------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="tts-presynth", daemon=True)
+            self._thread.start()
+        return self
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                now = datetime.now()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, routine_id, job, reminder_at = heapq.heappop(self._heap)
+                    if self._jobs.get(routine_id) == (job, reminder_at):
+                        return routine_id, job, reminder_at
+                timeout = (self._heap[0][0] - now).total_seconds() if self._heap else None
+                self._cond.wait(timeout)
+
+    def _run(self):
+        if self._render is None:
+            from tts import prerender
+            self._render = prerender
+        print("🔊 Reminder pre-synthesis started")
+        while True:
+            routine_id, job, reminder_at = self._next_job()
+            text, personality = job
+            try:
+                self._render(text, personality)
+                self.rendered += 1
+                with self._cond:
+                    if self._jobs.get(routine_id) == (job, reminder_at):
+                        del self._jobs[routine_id]
+            except Exception as e:
+                self.failures += 1
+                retry_at = datetime.now() + self.retry
+                if retry_at < reminder_at:
+                    print(f"⚠️  Pre-synthesis failed ({e}), retrying in {self.retry.total_seconds():.0f}s")
+                    with self._cond:
+                        heapq.heappush(self._heap, (retry_at, next(self._seq),
+                                                    routine_id, job, reminder_at))
+                else:
+                    print(f"⚠️  Pre-synthesis failed ({e}), will generate at reminder time")
+
+    def stats(self):
+        with self._cond:
+            return {
+                "lead_minutes": self.lead.total_seconds() / 60,
+                "pending": len(self._jobs),
+                "rendered": self.rendered,
+                "failures": self.failures,
+            }
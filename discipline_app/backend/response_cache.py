@@ -0,0 +1,244 @@
+"""
+Per-user response cache for the read endpoints the apps poll
+(GET /routines, /addiction-stats, /api/stats, /api/routines/completions).
+
+Entries are keyed by (scope, user, version, query params) and expire
+after RESPONSE_CACHE_TTL seconds, which also bounds how stale an entry
+or ETag can be after a write from another process. Writes don't delete entries, they
+bump the version of the (scope, user) pair they touched, so every older
+entry simply stops being reachable and ages out. invalidate(scope) with
+no user bumps the scope-wide epoch instead (e.g. when the owner of a
+change isn't known, or for "all users" queries).
+
+Backends:
+- memory (default): bounded LRU dict, per process
+- redis: any Redis-compatible server (RESPONSE_CACHE_URL), shared by
+  every worker; needs the optional `redis` package
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+
+CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+CACHE_URL = os.environ.get("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 30))
+CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 2048))
+
+ALL_USERS = "*"
+
+
+# ============================================================
+# BACKENDS
+# ============================================================
+
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._counters = {}
+        self._lock = threading.Lock()
+        # Counters restart at 0 with the process, so ETags must not
+        # survive a restart
+        self._instance_id = uuid.uuid4().hex[:8]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+    def instance_id(self):
+        return self._instance_id
+
+
+class RedisBackend:
+    name = "redis"
+
+    def __init__(self, url=CACHE_URL, prefix="discipline:"):
+        import redis
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._redis.get(self._prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.set(self._prefix + key, json.dumps(value), px=int(ttl * 1000))
+
+    def counter(self, key):
+        raw = self._redis.get(self._prefix + "v:" + key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key):
+        return self._redis.incr(self._prefix + "v:" + key)
+
+    def size(self):
+        return None
+
+    def instance_id(self):
+        # Shared by every worker; a new one is made if Redis lost its data
+        key = self._prefix + "instance"
+        self._redis.set(key, uuid.uuid4().hex[:8], nx=True)
+        return self._redis.get(key).decode()
+
+
+def make_backend(kind=CACHE_BACKEND):
+    if kind == "redis":
+        try:
+            backend = RedisBackend()
+            backend._redis.ping()
+            return backend
+        except Exception as e:
+            print(f"⚠️  Redis response cache unavailable ({e}), using in-memory cache")
+    return MemoryBackend()
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class ResponseCache:
+    def __init__(self, backend=None, ttl=CACHE_TTL):
+        self.backend = backend or make_backend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def version(self, scope, user_id=None):
+        """Current data version of (scope, user): changes on every invalidation."""
+        user = user_id or ALL_USERS
+        epoch = self.backend.counter(f"{scope}")
+        return f"{epoch}.{self.backend.counter(f'{scope}:{user}')}"
+
+    def invalidate(self, scope, user_ids=None):
+        """Drop cached responses of `scope` for these users (or everyone)."""
+        try:
+            if user_ids is None:
+                self.backend.incr(f"{scope}")
+            else:
+                if isinstance(user_ids, str):
+                    user_ids = [user_ids]
+                # "all users" responses include theirs as well
+                for user in set(user_ids) | {ALL_USERS}:
+                    self.backend.incr(f"{scope}:{user or 'default'}")
+            self.invalidations += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️  Response cache invalidation failed: {e}")
+
+    @staticmethod
+    def _query(params):
+        return "&".join(f"{k}={params[k]}" for k in sorted(params) if params[k] is not None)
+
+    def _key(self, scope, user_id, params):
+        return f"{scope}:{user_id or ALL_USERS}:{self.version(scope, user_id)}:{self._query(params)}"
+
+    def etag(self, scope, user_id, params=None):
+        """
+        Weak ETag for a response built from (scope, user, params). Only
+        reads the version counters, so a 304 never touches the database.
+        Read it *before* building the response: a write racing with the
+        build then costs a refetch instead of a stale 304.
+        The tag also changes every `ttl` seconds: writes from other
+        processes sharing the database (backend_api.py, the desktop
+        monitor, scripts) don't bump the counters, so like a cached
+        entry a tag may be stale for at most one TTL.
+        None if the backend can't be reached (respond without an ETag).
+        """
+        query = zlib.crc32(self._query(params or {}).encode())
+        window = int(time.time() // max(self.ttl, 1))
+        try:
+            return (f'W/"{self.backend.instance_id()}-{scope}-'
+                    f'{self.version(scope, user_id)}-{window:x}-{query:08x}"')
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️  Response cache version lookup failed: {e}")
+            return None
+
+    def lookup(self, scope, user_id, params):
+        """(key, value or None). Backend errors count as misses."""
+        try:
+            key = self._key(scope, user_id, params)
+            value = self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️  Response cache lookup failed: {e}")
+            return None, None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key, value
+
+    def store(self, key, value):
+        if key is None:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️  Response cache store failed: {e}")
+
+    def get_or_compute(self, scope, user_id, params, compute):
+        """Cached value, or compute() (JSON-serializable) stored for next time."""
+        key, value = self.lookup(scope, user_id, params)
+        if value is None:
+            value = compute()
+            self.store(key, value)
+        return value
+
+    async def get_or_compute_async(self, scope, user_id, params, compute):
+        """Same as get_or_compute() for an async compute()."""
+        key, value = self.lookup(scope, user_id, params)
+        if value is None:
+            value = await compute()
+            self.store(key, value)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "entries": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
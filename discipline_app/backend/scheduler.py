@@ -0,0 +1,217 @@
+"""
+Event-driven reminder scheduler.
+
+Replaces the old "load every routine every second" watcher. We keep a
+min-heap of (deadline, routine_id) where the deadline is the next moment
+a routine needs evaluate_routine_status() - its reminder time, then its
+miss time. The thread sleeps until the earliest deadline and only loads
+the routines that are actually due.
+
+The API tells us about changes through notify_changed() /
+notify_deleted() so the heap stays consistent without polling. A full
+reload of pending routines still runs every RESYNC_INTERVAL seconds as
+a safety net for writes made by other processes.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+from datetime import datetime
+
+from database import get_pending_routines, get_routines_by_ids, update_routines
+from logic import evaluate_routine_status, next_deadline
+
+RESYNC_INTERVAL = float(os.environ.get("SCHEDULER_RESYNC_INTERVAL", 600))
+
+
+class ReminderScheduler:
+    def __init__(self, resync_interval=RESYNC_INTERVAL):
+        self.resync_interval = resync_interval
+
+        # Heap entries are (deadline, seq, routine_id). An entry is only
+        # valid while _scheduled[routine_id] still points at its seq,
+        # rescheduling just pushes a new entry (lazy deletion).
+        self._heap = []
+        self._scheduled = {}
+        self._seq = itertools.count()
+
+        self._changed = set()
+        self._resync_requested = True
+        self._last_resync = None
+        self._cond = threading.Condition()
+        self._listeners = []
+        self._schedule_listeners = []
+
+        self.evaluations = 0
+
+    # --------------------------------------------------------
+    # Notifications from the API
+    # --------------------------------------------------------
+
+    def notify_changed(self, routine_id):
+        """A routine was created or edited - reload and reschedule it."""
+        if routine_id is None:
+            return
+        with self._cond:
+            self._changed.add(routine_id)
+            self._cond.notify()
+
+    def notify_deleted(self, routine_id):
+        with self._cond:
+            self._scheduled.pop(routine_id, None)
+            self._changed.discard(routine_id)
+            self._cond.notify()
+
+    def add_listener(self, callback):
+        """callback(routines) runs after routines changed status/reminder_sent."""
+        self._listeners.append(callback)
+
+    def add_schedule_listener(self, callback):
+        """callback(routines) gets every loaded routine that is still pending."""
+        self._schedule_listeners.append(callback)
+
+    def request_resync(self):
+        with self._cond:
+            self._resync_requested = True
+            self._cond.notify()
+
+    # --------------------------------------------------------
+    # Heap bookkeeping (callers hold self._cond)
+    # --------------------------------------------------------
+
+    def _push(self, routine_id, deadline):
+        seq = next(self._seq)
+        self._scheduled[routine_id] = seq
+        heapq.heappush(self._heap, (deadline, seq, routine_id))
+
+    def _peek_deadline(self):
+        while self._heap:
+            deadline, seq, routine_id = self._heap[0]
+            if self._scheduled.get(routine_id) == seq:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_due(self, now):
+        due = set()
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, routine_id = heapq.heappop(self._heap)
+            if self._scheduled.get(routine_id) == seq:
+                del self._scheduled[routine_id]
+                due.add(routine_id)
+        return due
+
+    def _wait_timeout(self, now):
+        timeouts = []
+        deadline = self._peek_deadline()
+        if deadline is not None:
+            timeouts.append((deadline - now).total_seconds())
+        if self._last_resync is not None:
+            timeouts.append(
+                self.resync_interval - (now - self._last_resync).total_seconds()
+            )
+        return max(0.0, min(timeouts)) if timeouts else None
+
+    # --------------------------------------------------------
+    # Main loop
+    # --------------------------------------------------------
+
+    def _next_batch(self):
+        """Block until there's work, then return (full_resync, ids_to_load)."""
+        with self._cond:
+            while True:
+                now = datetime.now()
+                resync = self._resync_requested or (
+                    self._last_resync is not None
+                    and (now - self._last_resync).total_seconds() >= self.resync_interval
+                )
+                if resync:
+                    self._resync_requested = False
+                    self._changed.clear()
+                    return True, set()
+
+                ids = self._pop_due(now) | self._changed
+                self._changed = set()
+                if ids:
+                    # Loading them again replaces whatever was scheduled
+                    for routine_id in ids:
+                        self._scheduled.pop(routine_id, None)
+                    return False, ids
+
+                self._cond.wait(self._wait_timeout(now))
+
+    def _process(self, routines, full_resync):
+        now = datetime.now()
+        schedule = []
+        for routine in routines:
+            deadline = next_deadline(routine, now)
+            if deadline is not None and deadline <= now:
+                evaluate_routine_status(routine)
+                self.evaluations += 1
+                deadline = next_deadline(routine, now)
+            if deadline is not None:
+                schedule.append((routine.id, deadline))
+
+        changed = [routine for routine in routines if routine.is_dirty()]
+        written = update_routines(changed)
+        if written:
+            self._call(self._listeners, written)
+        # Someone else changed these first: reload them instead of
+        # scheduling from our rejected in-memory state
+        written_ids = {routine.id for routine in written}
+        skipped = {routine.id for routine in changed if routine.id not in written_ids}
+        pending = [routine for routine in routines
+                   if routine.status == "pending" and routine.id not in skipped]
+        if pending:
+            self._call(self._schedule_listeners, pending)
+
+        with self._cond:
+            if full_resync:
+                self._heap = []
+                self._scheduled = {}
+                self._last_resync = now
+            for routine_id, deadline in schedule:
+                if routine_id not in skipped:
+                    self._push(routine_id, deadline)
+            self._changed |= skipped
+
+    @staticmethod
+    def _call(listeners, routines):
+        for callback in listeners:
+            try:
+                callback(routines)
+            except Exception as e:
+                print(f"Scheduler listener error: {e}")
+
+    def run_once(self):
+        full_resync, ids = self._next_batch()
+        if full_resync:
+            routines = get_pending_routines()
+        else:
+            routines = get_routines_by_ids(ids)
+        self._process(routines, full_resync)
+
+    def run(self):
+        print("⏰ Reminder scheduler started")
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Watcher Error: {e}")
+                # Rebuild from the database once it's reachable again
+                with self._cond:
+                    self._resync_requested = True
+                    self._cond.wait(5)
+
+    def stats(self):
+        with self._cond:
+            deadline = self._peek_deadline()
+            return {
+                "scheduled": len(self._scheduled),
+                "next_deadline": deadline.isoformat() if deadline else None,
+                "evaluations": self.evaluations,
+            }
+
+
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,126 @@
+"""
+Custom warning MP3s decoded once and kept in memory.
+
+play_custom_audio() used to check the file and load it from disk for
+every warning. SoundBank decodes each file in CUSTOM_AUDIO_FILES into a
+pygame Sound at startup; get() is a dict lookup, so a warning starts
+playing without touching the disk.
+
+A watcher thread stats the files every SOUND_WATCH_INTERVAL seconds
+and re-decodes one when its size or mtime changed (the user swapped the
+MP3). A change is only picked up once the file looks the same on two
+checks in a row, so a file that is still being copied isn't decoded
+half-written; until then, and if decoding fails, the previous Sound
+keeps playing. A deleted file is dropped from the bank.
+"""
+
+import os
+import threading
+
+SOUND_WATCH_INTERVAL = float(os.environ.get("SOUND_WATCH_INTERVAL", 2))
+
+
+def _decode(path):
+    import pygame
+    return pygame.mixer.Sound(path)
+
+
+class SoundBank:
+    def __init__(self, directory, filenames, loader=_decode, interval=SOUND_WATCH_INTERVAL):
+        self.directory = directory
+        self.filenames = list(filenames)
+        self.loader = loader
+        self.interval = interval
+
+        self._sounds = {}      # filename -> Sound
+        self._loaded = {}      # filename -> (size, mtime) last decoded (or tried)
+        self._changed = {}     # filename -> (size, mtime) seen once, waiting to settle
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.loads = 0
+        self.failures = 0
+
+    def _stat(self, filename):
+        try:
+            st = os.stat(os.path.join(self.directory, filename))
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime)
+
+    def _load(self, filename, stat):
+        try:
+            sound = self.loader(os.path.join(self.directory, filename))
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠️  Couldn't decode {filename}: {e}")
+            return False
+        with self._lock:
+            self._sounds[filename] = sound
+            self._loaded[filename] = stat
+        self.loads += 1
+        return True
+
+    def load_all(self):
+        """Decode every file that exists. Returns how many are ready."""
+        for filename in self.filenames:
+            stat = self._stat(filename)
+            if stat and self._load(filename, stat):
+                print(f"🔊 Preloaded {filename}")
+        return len(self._sounds)
+
+    def get(self, filename):
+        """The decoded Sound, or None if the file is missing or didn't decode."""
+        return self._sounds.get(filename)
+
+    def check(self):
+        """Reload files that changed since the last check (the watcher calls this)."""
+        for filename in self.filenames:
+            stat = self._stat(filename)
+            if stat is None:
+                if filename in self._sounds:
+                    print(f"🗑️  {filename} was removed")
+                    with self._lock:
+                        self._sounds.pop(filename, None)
+                        self._loaded.pop(filename, None)
+                self._changed.pop(filename, None)
+                continue
+            if stat == self._loaded.get(filename):
+                self._changed.pop(filename, None)
+                continue
+            if self._changed.get(filename) != stat:
+                # Wait for one more check in case it's still being written
+                self._changed[filename] = stat
+                continue
+            del self._changed[filename]
+            if self._load(filename, stat):
+                print(f"🔄 Reloaded {filename}")
+            else:
+                # Don't retry until the file changes again
+                self._loaded[filename] = stat
+
+    def start_watching(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="sound-bank", daemon=True)
+            self._thread.start()
+        return self
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Sound watcher error: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def stats(self):
+        return {
+            "loaded": sorted(self._sounds),
+            "loads": self.loads,
+            "failures": self.failures,
+        }
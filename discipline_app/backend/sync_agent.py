@@ -0,0 +1,174 @@
+"""
+Local-first sync of the desktop monitor's block log to the cloud API.
+
+The monitor always logs to the local database first (no network on the
+detection path). BlockSyncAgent then ships the rows the cloud
+hasn't seen yet to CLOUD_API_URL/log-blocks in batches, from a
+background thread:
+
+- Only the monitor's own rows (user_id = MONITOR_USER_ID) are sent,
+  other users may share the local database through backend_api.
+- High-water mark: sync_state['block_logs'] is the highest local
+  block_logs id the cloud has acknowledged. Each round sends the next
+  SYNC_BATCH_SIZE rows after it and moves it forward only once the
+  cloud answered success, so nothing is skipped across restarts.
+  That needs ids to become visible in id order, which holds for SQLite
+  (one writer at a time) but not for Postgres, where a transaction
+  holding a lower id can commit after a higher one was already synced.
+  So the local store must be SQLite: the agent refuses to run on
+  DATABASE_URL. The monitor is a desktop process, the cloud API is the
+  one on Postgres.
+- Idempotency: every row carries an event_id (a random hex key set when
+  it was logged, see block_events.py) and the cloud skips keys it already has. If a response
+  is lost and the batch is sent again, nothing is counted twice.
+- Retry: a failed round is retried with exponential backoff (plus
+  jitter), from SYNC_RETRY_BASE up to SYNC_MAX_BACKOFF seconds.
+  Otherwise the agent runs every SYNC_INTERVAL seconds, or as soon as
+  nudge() says new rows were logged.
+"""
+
+import json
+import os
+import random
+import threading
+import urllib.request
+
+import database
+
+SYNC_INTERVAL = float(os.environ.get("SYNC_INTERVAL", 60))
+SYNC_BATCH_SIZE = int(os.environ.get("SYNC_BATCH_SIZE", 200))
+SYNC_RETRY_BASE = float(os.environ.get("SYNC_RETRY_BASE", 2))
+SYNC_MAX_BACKOFF = float(os.environ.get("SYNC_MAX_BACKOFF", 300))
+
+_MARK = "block_logs"
+
+
+def post_json(url, payload, timeout=10):
+    body = json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(
+        url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b"{}")
+
+
+class BlockSyncAgent:
+    def __init__(self, api_url, user_id="default", batch_size=SYNC_BATCH_SIZE,
+                 interval=SYNC_INTERVAL, retry_base=SYNC_RETRY_BASE,
+                 max_backoff=SYNC_MAX_BACKOFF, post=post_json):
+        if database.USE_POSTGRES:
+            raise RuntimeError("block log sync needs a local SQLite database "
+                               "(unset DATABASE_URL for the monitor)")
+        self.api_url = api_url.rstrip("/")
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retry_base = retry_base
+        self.max_backoff = max_backoff
+        self.post = post
+
+        self._cond = threading.Condition()
+        self._nudged = False
+        self._stopping = False
+        self._thread = None
+
+        self.sent = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_error = None
+
+    # --------------------------------------------------------
+    # Local state
+    # --------------------------------------------------------
+
+    def high_water_mark(self):
+        return database.get_sync_mark(_MARK)
+
+    def pending(self):
+        """How many local rows the cloud hasn't acknowledged yet."""
+        return database.count_block_logs_after(self.user_id, self.high_water_mark())
+
+    # --------------------------------------------------------
+    # Sync
+    # --------------------------------------------------------
+
+    def sync_once(self):
+        """Send the next batch. Returns how many rows were sent (0 = up to date)."""
+        rows = database.get_block_events_after(self.user_id, self.high_water_mark(),
+                                              self.batch_size)
+        if not rows:
+            return 0
+
+        events = [event.model_dump(exclude={"user_id"}) for _, event in rows]
+        result = self.post(f"{self.api_url}/log-blocks",
+                           {"user_id": self.user_id, "events": events})
+        if not result.get("success", True):
+            raise RuntimeError(result.get("error", "cloud rejected the batch"))
+
+        # Only now is the batch safe to skip next time
+        database.set_sync_mark(_MARK, rows[-1][0])
+
+        self.sent += len(rows)
+        self.batches += 1
+        return len(rows)
+
+    def nudge(self):
+        """New rows were logged locally; sync soon instead of at the next interval."""
+        with self._cond:
+            self._nudged = True
+            self._cond.notify()
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="block-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        print(f"☁️  Block log sync to {self.api_url} started")
+        failures = 0
+        while True:
+            delay = self.interval
+            try:
+                sent = self.sync_once()
+                failures = 0
+                self.last_error = None
+                if sent >= self.batch_size:
+                    delay = 0  # more waiting
+            except Exception as e:
+                failures += 1
+                self.failures += 1
+                self.last_error = str(e)
+                delay = min(self.max_backoff, self.retry_base * 2 ** (failures - 1))
+                delay *= random.uniform(0.5, 1.0)
+                print(f"⚠️  Block log sync failed ({e}), retry in {delay:.0f}s")
+
+            with self._cond:
+                if self._stopping:
+                    return
+                # While backing off, new rows don't cut the wait short
+                if not self._nudged or failures:
+                    self._cond.wait_for(
+                        lambda: self._stopping or (self._nudged and not failures), delay
+                    )
+                if self._stopping:
+                    return
+                self._nudged = False
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {
+            "api_url": self.api_url,
+            "sent": self.sent,
+            "batches": self.batches,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
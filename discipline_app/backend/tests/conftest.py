@@ -0,0 +1,21 @@
+import os
+import sys
+
+# The backend is a flat set of modules, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """database.py pointed at a fresh SQLite file, schema up to date."""
+    import database
+    monkeypatch.setattr(database, "USE_POSTGRES", False)
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "discipline.db"))
+    database.close_pool()
+    database._pool = None
+    database.init_db()
+    yield database
+    database.close_pool()
+    database._pool = None
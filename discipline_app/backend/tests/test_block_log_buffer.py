@@ -0,0 +1,89 @@
+"""BlockLogBuffer: spooling, bad events and a failing writer."""
+
+import json
+import sqlite3
+
+import pytest
+
+from block_log_buffer import BlockLogBuffer
+
+
+class Writer:
+    """Stand-in for database.log_blocks that can be told to fail."""
+
+    def __init__(self):
+        self.rows = []
+        self.down = False
+
+    def __call__(self, events):
+        if self.down:
+            raise sqlite3.OperationalError("database is locked")
+        for event in events:
+            if event["category"] == "poison":
+                raise sqlite3.IntegrityError("NOT NULL constraint failed")
+        self.rows.extend(events)
+
+
+@pytest.fixture
+def writer():
+    return Writer()
+
+
+@pytest.fixture
+def buffer(tmp_path, writer):
+    # No flusher thread: the tests call flush() themselves
+    return BlockLogBuffer(writer, spool_dir=str(tmp_path), max_batch=100, max_delay=60)
+
+
+def test_invalid_events_are_rejected_before_spooling(buffer, tmp_path):
+    with pytest.raises(ValueError):
+        buffer.submit({"category": "porn", "timestamp": "yesterday"})
+    with pytest.raises(ValueError):
+        buffer.submit_many([{"category": "porn"}, {"url": "no category"}])
+    assert buffer.stats()["pending"] == 0
+    spool = tmp_path / "block_events.spool"
+    assert not spool.exists() or spool.read_text() == ""
+
+
+def test_flush_writes_pending_events(buffer, writer):
+    buffer.submit_many([{"category": "porn"}, {"category": "gambling"}], "u1")
+    assert buffer.flush() == 2
+    assert [row["category"] for row in writer.rows] == ["porn", "gambling"]
+    assert {row["user_id"] for row in writer.rows} == {"u1"}
+    assert buffer.stats()["pending"] == 0
+
+
+def test_database_outage_keeps_events_for_the_next_flush(buffer, writer):
+    buffer.submit_many([{"category": "porn"}, {"category": "gambling"}])
+    writer.down = True
+    with pytest.raises(sqlite3.OperationalError):
+        buffer.flush()
+    assert buffer.stats()["pending"] == 2
+
+    writer.down = False
+    assert buffer.flush() == 2
+    assert buffer.stats()["pending"] == 0
+
+
+def test_event_failing_on_its_data_is_dead_lettered(buffer, writer, tmp_path):
+    buffer.submit_many([{"category": "porn"}, {"category": "poison"}, {"category": "gambling"}])
+    assert buffer.flush() == 2
+    assert [row["category"] for row in writer.rows] == ["porn", "gambling"]
+
+    stats = buffer.stats()
+    assert stats["pending"] == 0 and stats["dead_lettered"] == 1
+    with open(tmp_path / "block_events.dead") as f:
+        dead = [json.loads(line) for line in f]
+    assert [entry["event"]["category"] for entry in dead] == ["poison"]
+
+
+def test_unflushed_events_are_replayed_after_a_restart(tmp_path, writer):
+    first = BlockLogBuffer(writer, spool_dir=str(tmp_path))
+    first.submit({"category": "porn", "event_id": "k1"})
+    # Crash: the process dies without flushing
+    first._spool.close()
+
+    second = BlockLogBuffer(writer, spool_dir=str(tmp_path), max_delay=60)
+    second.start()
+    second.stop()
+    assert [row["event_id"] for row in writer.rows] == ["k1"]
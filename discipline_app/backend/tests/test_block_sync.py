@@ -0,0 +1,113 @@
+"""
+Desktop -> cloud block log sync: event_id de-duplication in
+database.log_blocks / log_block and the BlockSyncAgent high-water mark.
+"""
+
+from datetime import date
+
+import pytest
+
+from sync_agent import BlockSyncAgent
+
+
+def counts(database):
+    conn = database.get_connection()
+    try:
+        cursor = conn.cursor()
+        result = {}
+        for table in ("block_logs", "block_stats", "block_stats_weekly", "block_stats_monthly"):
+            column = "COUNT(*)" if table == "block_logs" else "COALESCE(SUM(blocks_count), 0)"
+            cursor.execute(f"SELECT {column} FROM {table}")
+            result[table] = cursor.fetchone()[0]
+        return result
+    finally:
+        conn.close()
+
+
+EVENTS = [
+    {"category": "porn", "timestamp": "2026-10-13T10:00:00", "event_id": "a"},
+    {"category": "porn", "timestamp": "2026-10-13T11:00:00", "event_id": "b"},
+    {"category": "gambling", "timestamp": "2026-10-14T10:00:00", "event_id": "c"},
+]
+
+
+def test_resent_batch_is_counted_once(sqlite_db):
+    assert sqlite_db.log_blocks(EVENTS, "u1") == 3
+    first = counts(sqlite_db)
+    assert first == {"block_logs": 3, "block_stats": 3, "block_stats_weekly": 3,
+                     "block_stats_monthly": 3}
+
+    assert sqlite_db.log_blocks(EVENTS, "u1") == 0
+    assert counts(sqlite_db) == first
+
+
+def test_partly_resent_batch_counts_only_new_events(sqlite_db):
+    sqlite_db.log_blocks(EVENTS[:2], "u1")
+    assert sqlite_db.log_blocks(EVENTS, "u1") == 1
+    rows, totals = sqlite_db.get_block_stats(date(2026, 10, 12), date(2026, 10, 18), "day", "u1")
+    assert totals == {"porn": 2, "gambling": 1}
+
+
+def test_duplicate_key_within_a_batch(sqlite_db):
+    assert sqlite_db.log_blocks([EVENTS[0], EVENTS[0]], "u1") == 1
+    assert counts(sqlite_db)["block_stats"] == 1
+
+
+def test_events_without_a_key_get_one(sqlite_db):
+    assert sqlite_db.log_blocks([{"category": "porn"}, {"category": "porn"}], "u1") == 2
+    sqlite_db.log_block("u1", "gambling")
+    conn = sqlite_db.get_connection()
+    try:
+        keys = [row[0] for row in conn.cursor().execute("SELECT event_id FROM block_logs")]
+    finally:
+        conn.close()
+    assert len(keys) == 3 and all(keys) and len(set(keys)) == 3
+
+
+class FakeCloud:
+    """Stands in for the cloud's /log-blocks: records what it was sent."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def post(self, url, payload):
+        if self.fail:
+            raise OSError("cloud unreachable")
+        self.batches.append(payload)
+        return {"success": True}
+
+
+def test_agent_sends_only_its_users_rows_in_batches(sqlite_db):
+    sqlite_db.log_blocks(EVENTS, "monitor")
+    sqlite_db.log_blocks([{"category": "porn", "event_id": "other"}], "someone-else")
+    cloud = FakeCloud()
+    agent = BlockSyncAgent("http://cloud", "monitor", batch_size=2, post=cloud.post)
+
+    assert agent.sync_once() == 2
+    assert agent.sync_once() == 1
+    assert agent.sync_once() == 0
+    assert [[e["event_id"] for e in b["events"]] for b in cloud.batches] == [["a", "b"], ["c"]]
+    assert {b["user_id"] for b in cloud.batches} == {"monitor"}
+    assert agent.pending() == 0
+
+
+def test_failed_round_keeps_the_mark(sqlite_db):
+    sqlite_db.log_blocks(EVENTS, "monitor")
+    cloud = FakeCloud(fail=True)
+    agent = BlockSyncAgent("http://cloud", "monitor", post=cloud.post)
+
+    with pytest.raises(OSError):
+        agent.sync_once()
+    assert agent.pending() == 3
+
+    cloud.fail = False
+    assert agent.sync_once() == 3
+    assert agent.pending() == 0
+
+
+def test_agent_refuses_a_postgres_store(sqlite_db, monkeypatch):
+    # block_logs ids can commit out of order there, the mark would skip rows
+    monkeypatch.setattr(sqlite_db, "USE_POSTGRES", True)
+    with pytest.raises(RuntimeError):
+        BlockSyncAgent("http://cloud", "monitor")
@@ -0,0 +1,62 @@
+"""ETag / If-None-Match on the cached FastAPI reads."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from models import Routine
+
+
+@pytest.fixture
+def client(sqlite_db, monkeypatch):
+    import async_database
+    import main
+    monkeypatch.setattr(async_database, "DB_NAME", sqlite_db.DB_NAME)
+    monkeypatch.setattr(async_database, "_pool", None)
+    # Not entered as a context manager, so the startup hook (scheduler,
+    # buffer and monitor threads) doesn't run
+    yield TestClient(main.app)
+    asyncio.run(async_database.close_pool())
+
+
+@pytest.fixture
+def routine_id(sqlite_db):
+    at = datetime.now() + timedelta(hours=2)
+    return sqlite_db.insert_routine(Routine(title="Gym", routine_date=at.date(),
+                                            routine_time=at.time().replace(microsecond=0),
+                                            user_id="etag-user"))
+
+
+def get_routines(client, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get("/routines", params={"user_id": "etag-user"}, headers=headers)
+
+
+def test_matching_etag_gets_304_without_a_query(client, routine_id, monkeypatch):
+    import async_database
+
+    first = get_routines(client)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    async def unreachable(*args, **kwargs):
+        raise AssertionError("a 304 must not touch the database")
+
+    monkeypatch.setattr(async_database, "get_all_routines", unreachable)
+    second = get_routines(client, etag)
+    assert second.status_code == 304
+    assert second.headers["ETag"] == etag
+    assert second.content == b""
+
+
+def test_write_changes_the_etag(client, routine_id):
+    etag = get_routines(client).headers["ETag"]
+
+    assert client.post(f"/routines/{routine_id}/complete").status_code == 200
+
+    after = get_routines(client, etag)
+    assert after.status_code == 200
+    assert after.headers["ETag"] != etag
+    assert after.json()[0]["status"] == "done"
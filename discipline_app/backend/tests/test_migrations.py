@@ -0,0 +1,169 @@
+"""migrations.migrate on fresh databases and on the layouts older code left behind."""
+
+import sqlite3
+
+import pytest
+
+from migrations import MIGRATIONS, Migration, migrate
+
+LATEST = max(m.version for m in MIGRATIONS)
+
+# block_logs / block_stats as addiction_monitor.init_addiction_db created them
+MONITOR_LAYOUT = """
+CREATE TABLE block_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, category TEXT NOT NULL, url TEXT,
+    title TEXT, timestamp TEXT NOT NULL, audio_type TEXT
+);
+CREATE TABLE block_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, category TEXT NOT NULL,
+    blocks_count INTEGER DEFAULT 0, UNIQUE(date, category)
+);
+INSERT INTO block_logs (category, url, title, timestamp, audio_type) VALUES
+    ('porn', 'u', 't', '2026-10-13T10:00:00', 'warning'),
+    ('gambling', 'u', 't', '2026-10-14T10:00:00', 'warning');
+INSERT INTO block_stats (date, category, blocks_count) VALUES
+    ('2026-10-13', 'porn', 3), ('2026-10-14', 'gambling', 2);
+"""
+
+# routines / routine_completions as backend_api.init_db created them
+FLASK_LAYOUT = """
+CREATE TABLE routines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, title TEXT NOT NULL,
+    description TEXT, time TEXT NOT NULL, days TEXT NOT NULL, active INTEGER DEFAULT 1,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE routine_completions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, routine_id INTEGER NOT NULL,
+    completed_at TEXT NOT NULL, FOREIGN KEY (routine_id) REFERENCES routines (id)
+);
+INSERT INTO routines (user_id, title, description, time, days, created_at) VALUES
+    ('u1', 'Gym', '', '07:00', 'Daily', '2026-10-01'),
+    ('u1', 'Read', '', '21:00', 'Mon,Wed', '2026-10-01');
+INSERT INTO routine_completions (routine_id, completed_at) VALUES (2, '2026-10-14T21:30:00');
+"""
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "discipline.db"))
+    yield conn
+    conn.close()
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def unique_keys(conn, table):
+    keys = []
+    for index in [row[1] for row in conn.execute(f"PRAGMA index_list({table})") if row[2]]:
+        keys.append(tuple(row[2] for row in conn.execute(f"PRAGMA index_info({index})")))
+    return keys
+
+
+def test_fresh_database_gets_every_migration_once(conn):
+    assert migrate(conn, False) == sorted(m.version for m in MIGRATIONS)
+    assert migrate(conn, False) == []
+    assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == LATEST
+
+
+def test_monitor_block_stats_gets_user_scoped_key(conn):
+    conn.executescript(MONITOR_LAYOUT)
+    migrate(conn, False)
+
+    assert ("user_id", "date", "category") in unique_keys(conn, "block_stats")
+    assert ("date", "category") not in unique_keys(conn, "block_stats")
+    assert sorted(conn.execute("SELECT user_id, date, category, blocks_count FROM block_stats")) == [
+        ("default", "2026-10-13", "porn", 3), ("default", "2026-10-14", "gambling", 2)
+    ]
+    # Rollups recounted from the rebuilt table (both days are in the week of Oct 12)
+    assert sorted(conn.execute(
+        "SELECT week_start, category, blocks_count FROM block_stats_weekly"
+    )) == [("2026-10-12", "gambling", 2), ("2026-10-12", "porn", 3)]
+    assert conn.execute("SELECT COUNT(*) FROM block_logs WHERE event_id IS NULL").fetchone()[0] == 0
+
+    # The upsert every logging path uses works now
+    conn.execute("""
+        INSERT INTO block_stats (user_id, date, category, blocks_count)
+        VALUES ('default', '2026-10-13', 'porn', 1)
+        ON CONFLICT (user_id, date, category)
+        DO UPDATE SET blocks_count = block_stats.blocks_count + 1
+    """)
+    assert conn.execute(
+        "SELECT blocks_count FROM block_stats WHERE date = '2026-10-13'"
+    ).fetchone()[0] == 4
+
+
+def test_flask_routines_move_to_recurring_routines(conn):
+    conn.executescript(FLASK_LAYOUT)
+    migrate(conn, False)
+
+    assert "routine_date" in columns(conn, "routines")
+    assert "days" in columns(conn, "recurring_routines")
+    assert list(conn.execute("SELECT id, title FROM recurring_routines ORDER BY id")) == [
+        (1, "Gym"), (2, "Read")
+    ]
+    # Ids were kept, so completions still point at the right routine
+    assert list(conn.execute("""
+        SELECT r.title FROM routine_completions rc JOIN recurring_routines r ON rc.routine_id = r.id
+    """)) == [("Read",)]
+
+
+def test_flask_database_where_migration_3_failed(conn):
+    # Migrations 1 and 2 went through on the Flask layout, then 3 failed
+    # on the missing routine_date column
+    conn.executescript(FLASK_LAYOUT + MONITOR_LAYOUT)
+    conn.execute("CREATE TABLE schema_version (version INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+                 "applied_at TEXT NOT NULL)")
+    conn.execute("INSERT INTO schema_version VALUES (1, 'base tables', '2026-10-01'), "
+                 "(2, 'user_id columns', '2026-10-01')")
+    conn.execute("ALTER TABLE block_logs ADD COLUMN user_id TEXT DEFAULT 'default'")
+    conn.execute("ALTER TABLE block_stats ADD COLUMN user_id TEXT DEFAULT 'default'")
+    conn.commit()
+
+    assert migrate(conn, False) == list(range(3, LATEST + 1))
+    assert "routine_date" in columns(conn, "routines")
+    assert conn.execute("SELECT COUNT(*) FROM recurring_routines").fetchone()[0] == 2
+
+
+def test_change_seq_triggers(conn):
+    migrate(conn, False)
+
+    def counter():
+        return conn.execute("SELECT value FROM routine_change_counter WHERE id = 1").fetchone()[0]
+
+    conn.execute("INSERT INTO routines (title, routine_date, routine_time, status, user_id) "
+                 "VALUES ('Gym', '2026-10-18', '07:00', 'pending', 'u1')")
+    routine_id = conn.execute("SELECT id FROM routines").fetchone()[0]
+    created = conn.execute("SELECT change_seq FROM routines").fetchone()[0]
+    assert created == counter() == 1
+
+    conn.execute("UPDATE routines SET status = 'done' WHERE id = ?", (routine_id,))
+    assert conn.execute("SELECT change_seq FROM routines").fetchone()[0] == counter() == 2
+
+    conn.execute("DELETE FROM routines WHERE id = ?", (routine_id,))
+    assert list(conn.execute("SELECT routine_id, user_id, change_seq FROM routine_tombstones")) == [
+        (routine_id, "u1", 3)
+    ]
+
+
+def test_failed_migration_leaves_no_partial_ddl(conn, monkeypatch):
+    import migrations
+
+    def fail(cursor, use_postgres):
+        raise RuntimeError("boom")
+
+    # Migration 5 adds change_seq and creates its triggers, then fails
+    broken = Migration(5, "routine change tracking (change_seq + tombstones)",
+                       sqlite=migrations._SQLITE_CHANGE_TRACKING, apply=fail)
+    monkeypatch.setattr(migrations, "MIGRATIONS",
+                        [broken if m.version == 5 else m for m in MIGRATIONS])
+    with pytest.raises(RuntimeError):
+        migrate(conn, False)
+
+    assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == 4
+    assert "change_seq" not in columns(conn, "routines")
+
+    # The next start applies it for real instead of hitting "duplicate column"
+    monkeypatch.setattr(migrations, "MIGRATIONS", MIGRATIONS)
+    assert migrate(conn, False) == list(range(5, LATEST + 1))
@@ -0,0 +1,85 @@
+"""NotificationDispatcher retries and the shared get_dispatcher() instance."""
+
+import threading
+
+import notifications
+from notifications import Notification, NotificationDispatcher
+
+
+class FlakySink:
+    """Fails the first `failures` sends, then succeeds."""
+    name = "flaky"
+    kinds = None
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+        self.sent = []
+
+    def send(self, notification):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise RuntimeError(f"attempt {self.attempts} failed")
+        self.sent.append(notification)
+
+
+def dispatcher(sink, max_retries=3):
+    return NotificationDispatcher([sink], workers=2, max_retries=max_retries, backoff=0.01,
+                                  log=lambda message: None)
+
+
+def reminder():
+    return Notification("reminder", "u1", "Gym", "Gym is coming up")
+
+
+def test_failed_delivery_is_retried_until_it_goes_through():
+    sink = FlakySink(failures=2)
+    d = dispatcher(sink)
+    d.start()
+    try:
+        d.submit(reminder())
+        assert d.join(timeout=5)
+    finally:
+        d.stop()
+
+    assert sink.attempts == 3
+    assert len(sink.sent) == 1
+    stats = d.stats()
+    assert (stats["delivered"], stats["retried"], stats["failed"]) == (1, 2, 0)
+
+
+def test_delivery_gives_up_after_max_retries():
+    sink = FlakySink(failures=100)
+    d = dispatcher(sink, max_retries=2)
+    d.start()
+    try:
+        d.submit(reminder())
+        assert d.join(timeout=5)
+    finally:
+        d.stop()
+
+    assert sink.attempts == 3
+    stats = d.stats()
+    assert (stats["delivered"], stats["retried"], stats["failed"]) == (0, 2, 1)
+
+
+def test_sinks_only_get_the_kinds_they_want():
+    sink = FlakySink(failures=0)
+    sink.kinds = {"reminder"}
+    d = dispatcher(sink)
+    assert d.submit(Notification("missed", "u1", "Gym", "You missed Gym.")) == 0
+    assert d.submit(reminder()) == 1
+
+
+def test_get_dispatcher_does_not_start_or_restart_workers(monkeypatch):
+    monkeypatch.setattr(notifications, "_dispatcher", NotificationDispatcher([], workers=1))
+    before = threading.active_count()
+
+    shared = notifications.get_dispatcher()
+    assert notifications.get_dispatcher() is shared
+    assert threading.active_count() == before
+
+    shared.start()
+    shared.stop()
+    notifications.get_dispatcher().stats()
+    assert shared._threads == []
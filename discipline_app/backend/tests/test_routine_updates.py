@@ -0,0 +1,43 @@
+"""database.update_routines only writes, and reports, rows nobody else changed."""
+
+from datetime import date, time
+
+from models import Routine
+
+
+def add(database, title):
+    routine = Routine(title=title, routine_date=date(2026, 10, 18), routine_time=time(9, 0))
+    routine.id = database.insert_routine(routine)
+    return routine.id
+
+
+def test_update_skips_rows_changed_by_someone_else(sqlite_db):
+    ours_id, theirs_id = add(sqlite_db, "Gym"), add(sqlite_db, "Read")
+    ours, theirs = sqlite_db.get_routine_by_id(ours_id), sqlite_db.get_routine_by_id(theirs_id)
+
+    # Another writer completes "Read" after we loaded it
+    sqlite_db.complete_routine(theirs_id)
+
+    ours.status = theirs.status = "missed"
+    written = sqlite_db.update_routines([ours, theirs])
+
+    assert written == [ours]
+    assert not ours.is_dirty()
+    assert theirs.is_dirty()
+    assert sqlite_db.get_routine_by_id(ours_id).status == "missed"
+    assert sqlite_db.get_routine_by_id(theirs_id).status == "done"
+
+
+def test_update_without_changes_writes_nothing(sqlite_db):
+    routine = sqlite_db.get_routine_by_id(add(sqlite_db, "Gym"))
+    assert sqlite_db.update_routines([routine]) == []
+
+
+def test_reminder_is_written_once(sqlite_db):
+    routine_id = add(sqlite_db, "Gym")
+    first, second = sqlite_db.get_routine_by_id(routine_id), sqlite_db.get_routine_by_id(routine_id)
+
+    first.reminder_sent = second.reminder_sent = True
+    assert sqlite_db.update_routines([first]) == [first]
+    # The second reader loaded the row before the reminder went out
+    assert sqlite_db.update_routines([second]) == []
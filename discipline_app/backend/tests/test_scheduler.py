@@ -0,0 +1,73 @@
+"""ReminderScheduler: deadlines, targeted reloads and guarded writes."""
+
+from datetime import datetime, timedelta
+
+from models import Routine
+from scheduler import ReminderScheduler
+
+
+def add(database, title, at):
+    routine = Routine(title=title, routine_date=at.date(), routine_time=at.time().replace(microsecond=0),
+                      user_id="u1")
+    return database.insert_routine(routine)
+
+
+def scheduler_with_log():
+    scheduler = ReminderScheduler(resync_interval=3600)
+    notified = []
+    scheduler.add_listener(lambda routines: notified.extend(r.id for r in routines))
+    return scheduler, notified
+
+
+def test_resync_marks_overdue_and_schedules_the_rest(sqlite_db):
+    now = datetime.now()
+    overdue = add(sqlite_db, "Gym", now - timedelta(hours=1))
+    later_at = (now + timedelta(hours=2)).replace(second=0, microsecond=0)
+    later = add(sqlite_db, "Read", later_at)
+    scheduler, notified = scheduler_with_log()
+
+    scheduler.run_once()
+
+    assert notified == [overdue]
+    assert sqlite_db.get_routine_by_id(overdue).status == "missed"
+    assert sqlite_db.get_routine_by_id(later).status == "pending"
+    # Only the pending one is waiting, for its reminder 10 minutes before
+    stats = scheduler.stats()
+    assert stats["scheduled"] == 1
+    assert stats["next_deadline"] == (later_at - timedelta(minutes=10)).isoformat()
+
+
+def test_notify_changed_reloads_only_that_routine(sqlite_db, monkeypatch):
+    import scheduler as scheduler_module
+
+    now = datetime.now()
+    first = add(sqlite_db, "Gym", now + timedelta(hours=1))
+    add(sqlite_db, "Read", now + timedelta(hours=2))
+    scheduler, _ = scheduler_with_log()
+    scheduler.run_once()
+
+    loaded = []
+    real = scheduler_module.get_routines_by_ids
+    monkeypatch.setattr(scheduler_module, "get_routines_by_ids",
+                        lambda ids: loaded.append(set(ids)) or real(ids))
+    scheduler.notify_changed(first)
+    scheduler.run_once()
+
+    assert loaded == [{first}]
+    assert scheduler.stats()["scheduled"] == 2
+
+
+def test_routine_changed_elsewhere_is_not_announced(sqlite_db):
+    routine_id = add(sqlite_db, "Gym", datetime.now() - timedelta(hours=1))
+    stale = sqlite_db.get_routine_by_id(routine_id)
+    # Completed through the API after the scheduler loaded it
+    sqlite_db.complete_routine(routine_id)
+    scheduler, notified = scheduler_with_log()
+
+    scheduler._process([stale], full_resync=True)
+
+    assert notified == []
+    assert sqlite_db.get_routine_by_id(routine_id).status == "done"
+    # Queued for a reload instead of being scheduled from the stale copy
+    assert scheduler.stats()["scheduled"] == 0
+    assert routine_id in scheduler._changed
@@ -0,0 +1,91 @@
+"""url_classifier against the substring scan it replaced."""
+
+import random
+import string
+
+import pytest
+
+import url_classifier
+from url_classifier import CATEGORY_PATTERNS, URLClassifier
+
+
+def naive_classify(lists, url):
+    """The old check_url: first pattern found anywhere in the URL wins."""
+    url = url.lower()
+    for category, patterns in lists.items():
+        for pattern in patterns:
+            if pattern in url:
+                return category
+    return None
+
+
+def random_urls(lists, count, rng):
+    blocked = [p for patterns in lists.values() for p in patterns]
+    words = ["watch", "news", "item", "video", "live", "sports", "a", "2026"]
+    urls = []
+    for i in range(count):
+        name = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+        if i % 5 == 0:
+            pattern = rng.choice(blocked)
+            name = rng.choice([f"www.{pattern}", f"{name}{pattern}", f"{pattern}-{name}"])
+        path = "/".join(rng.choice(words + blocked[:5]) for _ in range(2))
+        urls.append(f"https://{name}.com/{path}")
+    return urls
+
+
+def keyword_lists():
+    """The default lists without domain patterns, where both must agree exactly."""
+    return {category: [p for p in patterns if '.' not in p]
+            for category, patterns in CATEGORY_PATTERNS.items()}
+
+
+@pytest.fixture(params=["python", "native"])
+def automaton(request, monkeypatch):
+    if request.param == "native" and not url_classifier.NATIVE_AUTOMATON:
+        pytest.skip("pyahocorasick not installed")
+    if request.param == "python":
+        monkeypatch.setattr(url_classifier, "NATIVE_AUTOMATON", False)
+    return request.param
+
+
+def test_keywords_match_like_the_substring_scan(automaton):
+    rng = random.Random(7)
+    lists = keyword_lists()
+    classifier = URLClassifier(lists)
+    urls = random_urls(lists, 2_000, rng) + [
+        "https://example.com/sexy-casino", "https://WWW.PornHub.com/", "https://news.com/adultswim",
+        "Casino Royale - Netflix", "", "https://example.org/",
+    ]
+    for url in urls:
+        assert classifier.first(url) == naive_classify(lists, url), url
+
+
+def test_domains_are_host_aware(automaton):
+    classifier = URLClassifier()
+    # Substring matches the old scan got wrong
+    assert naive_classify(CATEGORY_PATTERNS, "https://mistake.com/") == "gambling"
+    assert classifier.first("https://mistake.com/") is None
+    assert classifier.first("https://example.com/?ref=stake.com") is None
+
+    assert classifier.first("https://stake.com/") == "gambling"
+    assert classifier.first("https://www.stake.com/sports") == "gambling"
+    assert classifier.first("stake.com") == "gambling"
+    assert classifier.first("Stake.com - Sports Betting") == "gambling"
+    assert classifier.first("Mistake.com - Chrome") is None
+
+
+def test_every_matching_category_in_priority_order(automaton):
+    classifier = URLClassifier()
+    assert classifier.classify("https://casino.example.com/porn") == ["porn", "gambling"]
+    assert classifier.classify("https://casino.example.com/porn", ["gambling"]) == ["gambling"]
+    assert classifier.classify("https://example.com/") == []
+
+
+def test_blocklist_files_add_categories(tmp_path):
+    (tmp_path / "gambling.txt").write_text("# extra\nbetfair.com\n")
+    (tmp_path / "social.txt").write_text("tiktok\n")
+    classifier = URLClassifier.with_blocklists(str(tmp_path))
+
+    assert classifier.first("https://www.betfair.com/") == "gambling"
+    assert classifier.first("https://tiktok.com/@someone") == "social"
+    assert classifier.first("https://pornhub.com/") == "porn"
@@ -1,17 +1,21 @@
 """
 FIXED TTS Module - Reliable Audio Playback
-This version uses pygame which is much more reliable than PowerShell
+Speech is generated with edge-tts and played by the shared audio
+service (audio_service.py), which owns the pygame mixer.
 """
 import asyncio
 import edge_tts
-import tempfile
-import threading
 import os
-import time
-import pygame
+from audio_cache import AudioCache
+from audio_service import audio_service, REMINDER
 
-# Initialize pygame mixer once
-pygame.mixer.init()
+# Generated speech is kept on disk by (voice, text), see audio_cache.py
+audio_cache = AudioCache()
+audio_cache.clean_partials()
+
+# Cap on edge-tts generation at speak time; on timeout the notification
+# dispatcher retries the reminder instead of the speaker hanging
+TTS_SYNTH_TIMEOUT = float(os.environ.get("TTS_SYNTH_TIMEOUT", 15))
 
 VOICE_MAP = {
     "hood": "en-US-GuyNeural",
@@ -22,112 +26,61 @@ VOICE_MAP = {
 }
 
 
-def _play_audio_pygame(audio_path):
+async def _synthesize(text: str, voice: str) -> str:
     """
-    Reliable audio playback using pygame
-    This actually works on Windows unlike the PowerShell approach
+    Path of the MP3 for (text, voice): straight from the cache when it
+    was spoken before, otherwise generated with edge-tts and cached.
     """
-    try:
-        print(f"[AUDIO] Loading: {audio_path}")
-        pygame.mixer.music.load(audio_path)
+    cached = audio_cache.get(text, voice)
+    if cached:
+        print(f"[TTS] Cache hit: {os.path.basename(cached)}")
+        return cached
 
-        print(f"[AUDIO] Playing...")
-        pygame.mixer.music.play()
+    print(f"[TTS] Generating speech: '{text}' with voice: {voice}")
+    temp_path = audio_cache.temp_path(text, voice)
+    try:
+        await edge_tts.Communicate(text, voice).save(temp_path)
+        path = audio_cache.put(temp_path, text, voice)
+        print(f"[TTS] Cached {os.path.getsize(path)} bytes as {os.path.basename(path)}")
+        return path
+    finally:
+        # Only left behind if generation failed
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
-        # Wait for the audio to finish playing
-        while pygame.mixer.music.get_busy():
-            time.sleep(0.1)
 
-        print(f"[AUDIO] Finished playing")
-        return True
-    except Exception as e:
-        print(f"[AUDIO ERROR] {e}")
-        return False
+def voice_for(personality: str) -> str:
+    return VOICE_MAP.get(personality, VOICE_MAP["default"])
 
 
-async def _generate_and_speak(text: str, personality: str):
+def prerender(text: str, personality: str = "default") -> str:
     """
-    Step 1: Generate speech with edge-tts
-    Step 2: Save to temporary file
-    Step 3: Play with pygame
+    Synthesize into the cache without playing, so speaking it later
+    starts immediately (see presynth.py). Raises if generation fails.
     """
-    voice = VOICE_MAP.get(personality, VOICE_MAP["default"])
+    return audio_service.run(_synthesize(text, voice_for(personality))).result()
 
-    print(f"[TTS] Generating speech: '{text}' with voice: {voice}")
 
-    communicate = edge_tts.Communicate(text, voice)
-
-    # Create a unique temporary file
-    temp_path = os.path.join(
-        tempfile.gettempdir(),
-        f"discipline_reminder_{int(time.time() * 1000)}.mp3"
+def speak_background(text: str, personality: str = "default", priority: int = REMINDER):
+    """
+    Queue `text` on the audio service and return right away.
+    Returns a future that resolves to True once it was played.
+    """
+    voice = voice_for(personality)
+    print(f"[TTS] Queued ({personality}): '{text}'")
+    return audio_service.play(
+        lambda: asyncio.wait_for(_synthesize(text, voice), TTS_SYNTH_TIMEOUT),
+        priority,
+        label=text,
     )
 
-    try:
-        # Generate the audio file
-        print(f"[TTS] Saving to: {temp_path}")
-        await communicate.save(temp_path)
-
-        # Small delay to ensure file is fully written
-        await asyncio.sleep(0.3)
 
-        # Verify file exists and has content
-        if not os.path.exists(temp_path):
-            print(f"[TTS ERROR] File not created: {temp_path}")
-            return
-
-        file_size = os.path.getsize(temp_path)
-        print(f"[TTS] File created successfully ({file_size} bytes)")
-
-        # Play the audio (this is blocking, which is what we want)
-        success = _play_audio_pygame(temp_path)
-
-        if success:
-            print(f"[TTS] ✅ Audio played successfully")
-        else:
-            print(f"[TTS] ❌ Audio playback failed")
-
-    except Exception as e:
-        print(f"[TTS ERROR] Exception during generation/playback: {e}")
-    finally:
-        # Clean up the temporary file
-        await asyncio.sleep(0.5)
-        try:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                print(f"[TTS] Cleaned up temp file")
-        except Exception as e:
-            print(f"[TTS] Could not delete temp file: {e}")
-
-
-def speak_background(text: str, personality: str = "default"):
+def speak(text: str, personality: str = "default", priority: int = REMINDER) -> bool:
     """
-    Main function to call from your logic.py
-    Runs TTS in a background thread so it doesn't block your main app
+    Speak `text`, blocking until playback ends (or fails).
+    Used by the notification dispatcher's worker threads.
     """
-    print(f"\n{'=' * 60}")
-    print(f"[SPEAK_BACKGROUND] Called with text: '{text}'")
-    print(f"[SPEAK_BACKGROUND] Personality: {personality}")
-    print(f"{'=' * 60}\n")
-
-    def thread_runner():
-        try:
-            # Create a new event loop for this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            # Run the async TTS function
-            loop.run_until_complete(_generate_and_speak(text, personality))
-
-            # Clean up
-            loop.close()
-        except Exception as e:
-            print(f"[THREAD ERROR] {e}")
-
-    # Start in a daemon thread (won't block app shutdown)
-    thread = threading.Thread(target=thread_runner, daemon=True)
-    thread.start()
-    print(f"[SPEAK_BACKGROUND] Thread started: {thread.name}")
+    return speak_background(text, personality, priority).result()
 
 
 # Test function
@@ -143,8 +96,7 @@ def test_audio():
 
     for text, personality in test_messages:
         print(f"\nTesting: {personality}")
-        speak_background(text, personality)
-        time.sleep(6)  # Wait for each to finish
+        speak(text, personality)
 
     print("\n✅ Audio test complete!")
 
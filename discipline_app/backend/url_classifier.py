@@ -0,0 +1,229 @@
+"""
+URL / window-title classifier shared by every blocking path
+(backend_api.check_url and addiction_monitor.check_url_category).
+
+All category pattern lists are compiled into ONE Aho-Corasick automaton,
+so a URL is scanned once no matter how many patterns there are, and every
+matching category comes back from that single pass.
+
+Two kinds of patterns:
+- keywords ("porn", "casino")   -> match anywhere in the text, like before
+- domains  ("stake.com")        -> host-aware: in a URL they must be the
+  host or a parent domain of it ("www.stake.com" yes, "mistake.com" no);
+  in plain text (window titles) they must not be glued to other letters
+
+If the optional `pyahocorasick` package is installed it's used for the
+scan, otherwise a pure Python automaton does the same job.
+
+Extra patterns can be dropped into BLOCKLIST_DIR as <category>.txt
+files (one pattern per line, '#' comments allowed).
+"""
+
+import os
+from collections import deque
+from urllib.parse import urlsplit
+
+try:
+    import ahocorasick
+    NATIVE_AUTOMATON = True
+except ImportError:
+    NATIVE_AUTOMATON = False
+
+# ============================================================================
+# DEFAULT BLOCK LISTS (in priority order: first category wins in check_url)
+# ============================================================================
+
+PORN_PATTERNS = [
+    'pornhub', 'xvideos', 'xnxx', 'redtube', 'youporn',
+    'xhamster', 'tube8', 'spankwire', 'keezmovies',
+    'porn', 'xxx', 'sex', 'adult', 'nsfw',
+    'onlyfans', 'chaturbate', 'stripchat', 'cam4',
+    'livejasmin', 'bongacams', 'myfreecams'
+]
+
+GAMBLING_PATTERNS = [
+    'casino', 'poker', 'betting', 'bet365', 'pokerstars',
+    'gamble', 'slots', 'blackjack', 'roulette',
+    'sportbet', 'bwin', '888casino', 'draftkings',
+    'fanduel', 'bovada', 'stake.com'
+]
+
+CATEGORY_PATTERNS = {
+    'porn': PORN_PATTERNS,
+    'gambling': GAMBLING_PATTERNS,
+}
+
+BLOCKLIST_DIR = os.environ.get("BLOCKLIST_DIR", "blocklists")
+
+
+# ============================================================================
+# AUTOMATON
+# ============================================================================
+
+class _PythonAutomaton:
+    """Plain Aho-Corasick: trie + failure links, outputs merged along them."""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add_word(self, word, value):
+        node = 0
+        for ch in word:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(value)
+
+    def make_automaton(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def iter(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for index, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for value in out[node]:
+                    yield index, value
+
+
+def _new_automaton():
+    return ahocorasick.Automaton() if NATIVE_AUTOMATON else _PythonAutomaton()
+
+
+# ============================================================================
+# CLASSIFIER
+# ============================================================================
+
+def _host_span(text):
+    """(start, end) of the hostname inside `text`, or None if it isn't a URL."""
+    if ' ' in text or '.' not in text:
+        return None
+    candidate = text if '://' in text else '//' + text
+    try:
+        host = urlsplit(candidate).hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    start = text.find(host)
+    if start < 0:
+        return None
+    return start, start + len(host)
+
+
+class URLClassifier:
+    def __init__(self, category_patterns=None):
+        category_patterns = category_patterns or CATEGORY_PATTERNS
+        self.categories = list(category_patterns)
+        self._priority = {c: i for i, c in enumerate(self.categories)}
+        self.pattern_count = 0
+
+        # Same pattern in several categories -> one automaton entry
+        entries = {}
+        for category, patterns in category_patterns.items():
+            for pattern in patterns:
+                pattern = pattern.strip().lower()
+                if not pattern:
+                    continue
+                entries.setdefault(pattern, set()).add(category)
+
+        self._automaton = _new_automaton()
+        for pattern, categories in entries.items():
+            is_domain = '.' in pattern
+            self._automaton.add_word(pattern, (len(pattern), is_domain, frozenset(categories)))
+            self.pattern_count += 1
+        self._automaton.make_automaton()
+
+    @classmethod
+    def with_blocklists(cls, directory=BLOCKLIST_DIR, base=None):
+        """Default lists plus any <category>.txt files found in `directory`."""
+        merged = {c: list(p) for c, p in (base or CATEGORY_PATTERNS).items()}
+        if os.path.isdir(directory):
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith('.txt'):
+                    continue
+                category = filename[:-4]
+                with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                    for line in f:
+                        line = line.split('#', 1)[0].strip()
+                        if line:
+                            merged.setdefault(category, []).append(line)
+        return cls(merged)
+
+    def _domain_ok(self, text, start, end, host):
+        if host is not None:
+            host_start, host_end = host
+            # Whole host or a parent domain of it
+            return (host_start <= start and end == host_end
+                    and (start == host_start or text[start - 1] == '.'))
+        before = text[start - 1] if start > 0 else ''
+        after = text[end] if end < len(text) else ''
+        return not (before.isalnum() or before == '-') and not (after.isalnum() or after == '-')
+
+    def classify(self, text, categories=None):
+        """
+        Every category matching `text`, in priority order ([] if clean).
+        `categories` optionally restricts which ones are reported.
+        """
+        if not text:
+            return []
+        text = text.lower()
+        host = None
+        host_checked = False
+
+        found = set()
+        for end_index, (length, is_domain, pattern_categories) in self._automaton.iter(text):
+            if pattern_categories <= found:
+                continue
+            if is_domain:
+                if not host_checked:
+                    host = _host_span(text)
+                    host_checked = True
+                start = end_index - length + 1
+                if not self._domain_ok(text, start, end_index + 1, host):
+                    continue
+            found |= pattern_categories
+
+        if categories is not None:
+            found &= set(categories)
+        return sorted(found, key=lambda c: self._priority.get(c, len(self._priority)))
+
+    def first(self, text, categories=None):
+        """Highest-priority matching category, or None."""
+        matches = self.classify(text, categories)
+        return matches[0] if matches else None
+
+
+_default = None
+
+
+def default_classifier():
+    """Classifier for the built-in lists + BLOCKLIST_DIR, built once."""
+    global _default
+    if _default is None:
+        _default = URLClassifier.with_blocklists()
+    return _default
+
+
+def classify(text, categories=None):
+    return default_classifier().classify(text, categories)
@@ -0,0 +1,350 @@
+"""
+Foreground window monitoring backends for addiction_monitor.py.
+
+The monitor used to poll get_active_window_info() every 2 seconds and
+ask psutil for the process name each time: up to 2s before a blocked
+tab was noticed, and a wake-up plus a process lookup every 2s even when
+nothing changed. A backend now calls back with window info dicts
+({'title', 'process', 'pid', 'time'}) only when the foreground window
+or its title changes, plus a heartbeat re-emit of the current window
+every `heartbeat` seconds so the warning cooldown still repeats while
+the user stays on a blocked page.
+
+Backends (MONITOR_BACKEND):
+- win32   SetWinEventHook on foreground and title (name) changes, no
+          polling; falls back to polling if the hooks can't be set
+- poll    the old get-foreground-window loop, MONITOR_POLL_INTERVAL
+- replay  replays a synthetic or recorded window event stream
+          (MONITOR_REPLAY_FILE, JSON lines) so the pipeline runs and
+          can be benchmarked on Linux; only when asked for explicitly
+
+Process names are looked up through ProcessNameCache, so a pid is only
+resolved with psutil once per PROCESS_NAME_TTL seconds.
+"""
+
+import abc
+import json
+import os
+import platform
+import random
+import threading
+import time
+from collections import OrderedDict
+
+MONITOR_BACKEND = os.environ.get("MONITOR_BACKEND", "")
+MONITOR_POLL_INTERVAL = float(os.environ.get("MONITOR_POLL_INTERVAL", 2))
+MONITOR_REPLAY_FILE = os.environ.get("MONITOR_REPLAY_FILE", "")
+PROCESS_NAME_TTL = float(os.environ.get("PROCESS_NAME_TTL", 300))
+
+# Win32 constants (winuser.h)
+EVENT_SYSTEM_FOREGROUND = 0x0003
+EVENT_OBJECT_NAMECHANGE = 0x800C
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+OBJID_WINDOW = 0
+WM_TIMER = 0x0113
+WM_QUIT = 0x0012
+
+
+# ============================================================================
+# PROCESS NAMES
+# ============================================================================
+
+def _psutil_name(pid):
+    import psutil
+    return psutil.Process(pid).name().lower()
+
+
+class ProcessNameCache:
+    """pid -> lower-case process name, LRU bounded, entries expire after `ttl`
+    (a pid can be reused by another program once its process exits)."""
+
+    def __init__(self, lookup=_psutil_name, ttl=PROCESS_NAME_TTL, max_size=512):
+        self.lookup = lookup
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def name(self, pid):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(pid)
+            if entry and now - entry[1] < self.ttl:
+                self._entries.move_to_end(pid)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        try:
+            name = self.lookup(pid)
+        except Exception:
+            # Process already gone or not accessible, don't cache that
+            return ""
+        with self._lock:
+            self._entries[pid] = (name, now)
+            self._entries.move_to_end(pid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return name
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+process_names = ProcessNameCache()
+
+
+def foreground_window(names=process_names):
+    """Info about the current foreground window (Windows), or None."""
+    try:
+        import win32gui
+        return window_info(win32gui.GetForegroundWindow(), names)
+    except Exception:
+        return None
+
+
+def window_info(hwnd, names=process_names):
+    import win32gui
+    import win32process
+    try:
+        title = win32gui.GetWindowText(hwnd)
+        _, pid = win32process.GetWindowThreadProcessId(hwnd)
+    except Exception:
+        return None
+    return {
+        'title': title,
+        'process': names.name(pid),
+        'pid': pid,
+        'time': time.monotonic(),
+    }
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+class WindowMonitor(abc.ABC):
+    name = "base"
+
+    def __init__(self, heartbeat=30.0):
+        self.heartbeat = heartbeat
+        self._stop = threading.Event()
+        self._last_key = None
+        self._last_info = None
+        self._last_emit = 0.0
+        self.events = 0
+        self.emitted = 0
+
+    @abc.abstractmethod
+    def run(self, callback):
+        """Call callback(window_info) on changes until stop(). Blocks."""
+
+    def stop(self):
+        self._stop.set()
+
+    def _emit(self, callback, info, heartbeat=False):
+        self.events += 1
+        if not info:
+            return
+        key = (info['pid'], info['title'])
+        if key == self._last_key and not heartbeat:
+            return
+        self._last_key = key
+        self._last_info = info
+        self._last_emit = time.monotonic()
+        self.emitted += 1
+        try:
+            callback(info)
+        except Exception as e:
+            print(f"Monitor error: {e}")
+
+    def _heartbeat_due(self):
+        return self._last_info is not None and time.monotonic() - self._last_emit >= self.heartbeat
+
+    def stats(self):
+        return {"backend": self.name, "events": self.events, "emitted": self.emitted}
+
+
+class PollingMonitor(WindowMonitor):
+    name = "poll"
+
+    def __init__(self, get_window=foreground_window, interval=MONITOR_POLL_INTERVAL, heartbeat=30.0):
+        super().__init__(heartbeat)
+        self.get_window = get_window
+        self.interval = interval
+
+    def run(self, callback):
+        while not self._stop.is_set():
+            self._emit(callback, self.get_window(), heartbeat=self._heartbeat_due())
+            self._stop.wait(self.interval)
+
+
+class Win32EventMonitor(WindowMonitor):
+    """
+    Out-of-context WinEvent hooks: Windows calls us on the thread that
+    registered them, from inside its GetMessage loop, whenever the
+    foreground window changes or a window title changes (browsers
+    retitle the window on every tab switch / navigation).
+    """
+    name = "win32"
+
+    def __init__(self, heartbeat=30.0, names=process_names):
+        super().__init__(heartbeat)
+        self.names = names
+        self._thread_id = None
+
+    def run(self, callback):
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+
+        WinEventProc = ctypes.WINFUNCTYPE(
+            None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+            wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD,
+        )
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        user32.SetWinEventHook.argtypes = [
+            wintypes.UINT, wintypes.UINT, wintypes.HMODULE, WinEventProc,
+            wintypes.DWORD, wintypes.DWORD, wintypes.UINT,
+        ]
+        user32.UnhookWinEvent.argtypes = [wintypes.HANDLE]
+        user32.GetForegroundWindow.restype = wintypes.HWND
+
+        def on_event(hook, event, hwnd, id_object, id_child, thread, time_ms):
+            if event == EVENT_OBJECT_NAMECHANGE and (
+                id_object != OBJID_WINDOW or hwnd != user32.GetForegroundWindow()
+            ):
+                return
+            self._emit(callback, window_info(hwnd, self.names))
+
+        # Keep a reference, Windows calls it until we unhook
+        proc = WinEventProc(on_event)
+        flags = WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS
+        hooks = [user32.SetWinEventHook(event, event, None, proc, 0, 0, flags)
+                 for event in (EVENT_SYSTEM_FOREGROUND, EVENT_OBJECT_NAMECHANGE)]
+        if not all(hooks):
+            for hook in hooks:
+                if hook:
+                    user32.UnhookWinEvent(hook)
+            print("⚠️  Window event hooks unavailable, falling back to polling")
+            fallback = PollingMonitor(heartbeat=self.heartbeat)
+            self._stop = fallback._stop
+            return fallback.run(callback)
+
+        self._thread_id = kernel32.GetCurrentThreadId()
+        timer = user32.SetTimer(None, 0, int(self.heartbeat * 1000), None)
+        try:
+            self._emit(callback, window_info(user32.GetForegroundWindow(), self.names))
+            msg = wintypes.MSG()
+            while not self._stop.is_set() and user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+                if msg.message == WM_TIMER:
+                    self._emit(callback, window_info(user32.GetForegroundWindow(), self.names),
+                               heartbeat=self._heartbeat_due())
+                    continue
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            user32.KillTimer(None, timer)
+            for hook in hooks:
+                user32.UnhookWinEvent(hook)
+
+    def stop(self):
+        super().stop()
+        if self._thread_id is not None:
+            import ctypes
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
+
+
+class ReplayMonitor(WindowMonitor):
+    """
+    Replays window events: dicts with 'at' (seconds since start),
+    'title', 'process' and 'pid'. `speed` > 1 replays faster. Each
+    emitted info's 'time' is when the switch was due, so callers can
+    measure detection latency. With `names`, process names are resolved
+    through that cache like the live backends do, instead of taken from
+    the events.
+    """
+    name = "replay"
+
+    def __init__(self, events, speed=1.0, heartbeat=30.0, names=None):
+        super().__init__(heartbeat / speed)
+        self.replay = sorted(events, key=lambda event: event['at'])
+        self.speed = speed
+        self.names = names
+
+    def run(self, callback):
+        start = time.monotonic()
+        for event in self.replay:
+            due = start + event['at'] / self.speed
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if now >= due:
+                    break
+                if self._heartbeat_due():
+                    self._emit(callback, self._last_info, heartbeat=True)
+                    continue
+                next_beat = self._last_emit + self.heartbeat if self._last_info else due
+                self._stop.wait(min(due, next_beat) - now)
+            if self._stop.is_set():
+                return
+            process = self.names.name(event['pid']) if self.names else event['process']
+            info = {'title': event['title'], 'process': process,
+                    'pid': event['pid'], 'time': due}
+            self._emit(callback, info)
+
+
+def synthetic_events(count=1000, seed=42, mean_gap=5.0):
+    """A plausible desktop session: app switches, tab switches, some blocked pages."""
+    rng = random.Random(seed)
+    apps = [("code.exe", 4100, ["main.py - App - Visual Studio Code", "README.md - App"]),
+            ("slack.exe", 4200, ["Slack | general", "Slack | random"]),
+            ("explorer.exe", 4300, ["Downloads", "Documents"])]
+    browser = ("chrome.exe", 5100)
+    safe = ["Inbox - Gmail", "Python docs", "Stack Overflow - Where Developers Learn",
+            "YouTube", "GitHub - App", "Weather forecast"]
+    blocked = ["Pornhub - Free videos", "Online Casino - Play slots", "Poker night - PokerStars",
+               "xvideos.com"]
+
+    events = []
+    at = 0.0
+    for _ in range(count):
+        at += rng.expovariate(1 / mean_gap)
+        if rng.random() < 0.6:
+            title = rng.choice(blocked) if rng.random() < 0.1 else rng.choice(safe)
+            events.append({'at': round(at, 3), 'title': f"{title} - Google Chrome",
+                           'process': browser[0], 'pid': browser[1]})
+        else:
+            process, pid, titles = rng.choice(apps)
+            events.append({'at': round(at, 3), 'title': rng.choice(titles),
+                           'process': process, 'pid': pid})
+    return events
+
+
+def load_replay(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_monitor(backend=None, heartbeat=30.0):
+    backend = backend or MONITOR_BACKEND
+    if not backend:
+        # Replay is never a default: it would log made-up detections
+        # into the real block log (and the sync agent would upload them)
+        if platform.system() != "Windows":
+            raise RuntimeError(
+                f"No window monitor for {platform.system()}. "
+                "Set MONITOR_BACKEND=replay to replay a synthetic or recorded session."
+            )
+        backend = "win32"
+    if backend == "win32":
+        return Win32EventMonitor(heartbeat)
+    if backend == "poll":
+        return PollingMonitor(heartbeat=heartbeat)
+    if backend == "replay":
+        events = load_replay(MONITOR_REPLAY_FILE) if MONITOR_REPLAY_FILE else synthetic_events()
+        return ReplayMonitor(events, heartbeat=heartbeat)
+    raise ValueError(f"Unknown MONITOR_BACKEND: {backend}")
@@ -5,6 +5,35 @@ import 'user_service.dart';
 class ApiService {
   static const String baseUrl = 'https://new-project-ur5v.onrender.com';
   
+  // Last 200 response per GET URL, so polling can send If-None-Match
+  // and reuse it when the server answers 304 Not Modified
+  static final Map<String, http.Response> _lastResponses = {};
+  
+  static Future<http.Response> _conditionalGet(String url) async {
+    final headers = {'Content-Type': 'application/json'};
+    final etag = _lastResponses[url]?.headers['etag'];
+    if (etag != null) {
+      headers['If-None-Match'] = etag;
+    }
+    
+    final response = await http
+        .get(Uri.parse(url), headers: headers)
+        .timeout(Duration(seconds: 30));
+    
+    if (response.statusCode == 304 && _lastResponses.containsKey(url)) {
+      print('♻️  Not modified, using cached response');
+      return _lastResponses[url]!;
+    }
+    if (response.statusCode == 200) {
+      if (response.headers.containsKey('etag')) {
+        _lastResponses[url] = response;
+      } else {
+        _lastResponses.remove(url);
+      }
+    }
+    return response;
+  }
+  
   static Future<bool> testConnection() async {
     try {
       // Render free tier sleeps after inactivity - waking up can take ~50s,
@@ -24,10 +53,7 @@ class ApiService {
       final userId = await UserService.getDeviceId();
       print('📡 Fetching routines from: $baseUrl/routines?user_id=$userId');
       
-      final response = await http.get(
-        Uri.parse('$baseUrl/routines?user_id=$userId'),
-        headers: {'Content-Type': 'application/json'},
-      ).timeout(Duration(seconds: 30));
+      final response = await _conditionalGet('$baseUrl/routines?user_id=$userId');
       
       print('📥 Response status: ${response.statusCode}');
       
@@ -97,10 +123,7 @@ class ApiService {
       final userId = await UserService.getDeviceId();
       print('📡 Fetching addiction stats from: $baseUrl/addiction-stats?user_id=$userId');
       
-      final response = await http.get(
-        Uri.parse('$baseUrl/addiction-stats?user_id=$userId'),
-        headers: {'Content-Type': 'application/json'},
-      ).timeout(Duration(seconds: 30));
+      final response = await _conditionalGet('$baseUrl/addiction-stats?user_id=$userId');
       
       print('📥 Response status: ${response.statusCode}');
       